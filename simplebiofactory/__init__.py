@@ -0,0 +1,33 @@
+# Shared building blocks for the simplebiofactory scripts.
+# The names below are imported from their modules on first access, so `import simplebiofactory`
+# loads nothing heavy and importing a name only loads the modules it needs.
+
+_EXPORTS = {
+    'versions': 'api', 'generate': 'api', 'therapy_rules': 'api', 'cohort_from_patients': 'api',
+    'select_therapies': 'api', 'select_therapy': 'api', 'simulate': 'api', 'simulate_to_file': 'api',
+    'report': 'api', 'analyze': 'api',
+    'Cohort': 'cohort', 'generate_cohort': 'cohort',
+    'PROFILES': 'profiles', 'generate_profile_cohort': 'profiles',
+    'compile_rules': 'rules',
+    'ManufacturingTable': 'manufacturing', 'OutcomeTable': 'manufacturing',
+    'stream': 'pipeline', 'RecordBuilder': 'records', 'write_report': 'report',
+    'simulate_parallel': 'parallel', 'save_database': 'storage', 'load_database': 'storage',
+    'PatientIndex': 'query', 'Analytics': 'analytics', 'Counts': 'analytics', 'Moments': 'analytics',
+    'QualityMonitor': 'qc',
+    'SparseGenotypes': 'genotypes', 'QuantizedGenotypes': 'genotypes', 'load_genotypes': 'genotypes',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    from importlib import import_module
+    value = getattr(import_module(f'{__name__}.{_EXPORTS[name]}'), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,92 @@
+import argparse
+import json
+import sys
+
+# Command line entry point:
+#   python -m simplebiofactory simulate 2.4 100000 --seed 1 --output patients.arrow
+#   python -m simplebiofactory simulate 2.2 100 --report brief
+#   python -m simplebiofactory simulate 2.1 10000000 --seed 1 --output patients.csv --checkpoint run1 [--resume]
+#   python -m simplebiofactory analyze 2.4 100000000 --seed 1 --workers 8
+#   python -m simplebiofactory select 2.4 < patients.jsonl     (one patient dict per line)
+#   python -m simplebiofactory versions
+
+
+def _simulate(args):
+    from simplebiofactory import api
+    if args.output:
+        written = api.simulate_to_file(args.version, args.patients, args.output, args.seed, args.chunk_size,
+                                       args.workers, args.checkpoint, args.resume, args.checkpoint_every)
+        print(f'Wrote {written} patient records to {args.output}', file=sys.stderr)
+        return 0
+    patient_database = api.simulate(args.version, args.patients, args.seed, args.chunk_size, args.workers,
+                                    args.checkpoint, args.resume, args.checkpoint_every)
+    api.report(patient_database, args.report)
+    return 0
+
+
+def _analyze(args):
+    from simplebiofactory import api
+    analytics = api.analyze(args.version, args.patients, args.seed, chunk_size=args.chunk_size, workers=args.workers)
+    sys.stdout.write(analytics.text())
+    return 0
+
+
+def _select(args):
+    from simplebiofactory import api
+    patients = [json.loads(line) for line in sys.stdin if line.strip()]
+    for patient, therapy in zip(patients, api.select_therapies(args.version, patients, args.seed)):
+        sys.stdout.write(json.dumps({'patient': patient.get('patient_id'), 'therapy': therapy}) + '\n')
+    return 0
+
+
+def _versions(args):
+    from simplebiofactory.profiles import PROFILES
+    print('\n'.join(PROFILES))
+    return 0
+
+
+def main(argv=None):
+    from simplebiofactory.profiles import PROFILES
+    parser = argparse.ArgumentParser(prog='python -m simplebiofactory',
+                                     description='Personalized biomanufacturing simulation')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    simulate = commands.add_parser('simulate', help='Simulate a cohort through a version of the pipeline')
+    simulate.add_argument('version', choices=list(PROFILES))
+    simulate.add_argument('patients', type=int)
+    simulate.add_argument('--seed', type=int)
+    simulate.add_argument('--chunk-size', type=int)
+    simulate.add_argument('--workers', type=int, default=1)
+    simulate.add_argument('--output', help='Write the records to a .csv, .arrow or .parquet file')
+    simulate.add_argument('--checkpoint', metavar='DIR', help='Checkpoint the run to a directory')
+    simulate.add_argument('--checkpoint-every', type=float, metavar='SECONDS',
+                          help='Seconds between checkpoints (default 30)')
+    simulate.add_argument('--resume', action='store_true', help='Continue the run from its last checkpoint')
+    simulate.add_argument('--report', default='summary', help='Report mode when not writing a file',
+                          choices=('detail', 'brief', 'summary', 'csv', 'jsonl', 'quiet'))
+    simulate.set_defaults(run=_simulate)
+
+    analyze = commands.add_parser('analyze', help='Summarize a simulated cohort in one pass, without keeping records')
+    analyze.add_argument('version', choices=list(PROFILES))
+    analyze.add_argument('patients', type=int)
+    analyze.add_argument('--seed', type=int)
+    analyze.add_argument('--chunk-size', type=int)
+    analyze.add_argument('--workers', type=int, default=1)
+    analyze.set_defaults(run=_analyze)
+
+    select = commands.add_parser('select', help='Select therapies for patient dicts read as JSON lines')
+    select.add_argument('version', choices=list(PROFILES))
+    select.add_argument('--seed', type=int)
+    select.set_defaults(run=_select)
+
+    commands.add_parser('versions', help='List the pipeline versions').set_defaults(run=_versions)
+
+    args = parser.parse_args(argv)
+    try:
+        return args.run(args)
+    except ValueError as error:
+        parser.exit(2, f'{parser.prog}: error: {error}\n')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
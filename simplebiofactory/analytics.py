@@ -0,0 +1,305 @@
+import numpy as np
+
+from simplebiofactory.cohort import gene_names
+from simplebiofactory.records import Vocabulary
+
+# Cohort analytics computed in one streaming pass over the pipeline's chunks, e.g.
+#   analytics = Analytics([Counts('Current_Health', 'Selected_Therapy'),
+#                          Counts(('gene', 'BRCA1', GENE_TIER_EDGES), 'Dosage_Adjustment'),
+#                          Counts('Medical_History', 'Outcome'), Moments('biomarker', 'systolic')])
+#   analytics_sink(stream('2.4', 100_000_000), analytics)
+#   analytics['Medical_History x Outcome'].rates()
+# Aggregates read the chunks' integer codes (no strings are decoded) and keep only their tables, so
+# memory does not grow with the run. Every aggregate can merge() another one built with the same
+# dimensions, so shards or chunks can be aggregated separately (see parallel.analyze_parallel).
+# Dimensions of a Counts table:
+#   'Selected_Therapy' ...           a record category column (None counts missing values)
+#   'Medical_History'                the conditions of a patient (each distinct condition counts once)
+#   ('gene', gene, edges)            tier of a gene's value: <= edges[0], (edges[0], edges[1]], ..., > edges[-1]
+#   ('biomarker', biomarker, edges)  tier of 'systolic', 'diastolic' or 'cholesterol'
+
+GENE_TIER_EDGES = (0.3, 0.6)  # The scripts' dosage thresholds (> 0.6 high, > 0.3 moderate)
+BIOMARKERS = ('systolic', 'diastolic', 'cholesterol')
+
+
+# Records of one pipeline chunk
+class ChunkSource:
+    def __init__(self, chunk):
+        self.chunk = chunk
+        self.cohort = chunk['cohort']
+
+    def __len__(self):
+        return len(self.cohort)
+
+    def category(self, column):
+        return self.chunk['columns'][column], self.chunk['vocabularies'][column]
+
+    def history(self):
+        return self.cohort.medical_history, self.cohort.conditions
+
+    def values(self, kind, name):
+        if kind == 'gene':
+            return self.cohort.gene(name)
+        return getattr(self.cohort, name)
+
+
+# Records of a patient database (see records.RecordBuilder.to_frame)
+class FrameSource:
+    def __init__(self, patient_database):
+        self.patient_database = patient_database
+
+    def __len__(self):
+        return len(self.patient_database)
+
+    def category(self, column):
+        import pandas as pd
+        categorical = pd.Categorical(self.patient_database[column])
+        return np.asarray(categorical.codes), list(categorical.categories)
+
+    def history(self):
+        from simplebiofactory.query import history_codes
+        return history_codes(self.patient_database['Medical_History'])
+
+    def values(self, kind, name):
+        if kind == 'gene':
+            from simplebiofactory.records import gene_values
+            return gene_values(self.patient_database, name)
+        if name not in self.patient_database:
+            raise KeyError(f'The patient database has no {name} column')
+        return self.patient_database[name].to_numpy()
+
+
+# Dimension over a record category column
+class ColumnDimension:
+    multi = False  # True when a record can fall under several labels
+
+    def __init__(self, column):
+        self.name = column
+        self.labels = Vocabulary()
+
+    # (rows, codes) of a source: rows is None for one code per record (-1 for a missing value)
+    def codes(self, source):
+        codes, values = source.category(self.name)
+        return None, self.labels.remap(values)[codes]
+
+
+# Dimension over the conditions in the medical history
+class ConditionDimension(ColumnDimension):
+    multi = True
+
+    def codes(self, source):
+        history, conditions = source.history()
+        codes = np.sort(self.labels.remap(conditions)[history], axis=1)
+        keep = codes >= 0
+        keep[:, 1:] &= codes[:, 1:] != codes[:, :-1]
+        return np.nonzero(keep)[0], codes[keep]
+
+
+# Dimension over tiers of a gene's or biomarker's values
+class TierDimension:
+    multi = False
+
+    def __init__(self, kind, field, edges):
+        if kind not in ('gene', 'biomarker'):
+            raise ValueError(f"Unknown tier dimension {kind!r}; expected 'gene' or 'biomarker'")
+        self.kind = kind
+        self.field = field
+        self.edges = np.array(sorted(edges), dtype=np.float64)
+        self.name = f'{field} tier'
+        labels = [f'<= {self.edges[0]:g}']
+        labels += [f'{low:g}-{high:g}' for low, high in zip(self.edges[:-1], self.edges[1:])]
+        labels.append(f'> {self.edges[-1]:g}')
+        self.labels = Vocabulary(labels)
+
+    def codes(self, source):
+        return None, np.searchsorted(self.edges, source.values(self.kind, self.field), side='left')
+
+
+# Function to make a dimension from its spec (see the module comment)
+def make_dimension(spec):
+    if isinstance(spec, tuple):
+        return TierDimension(*spec)
+    if spec == 'Medical_History':
+        return ConditionDimension(spec)
+    return ColumnDimension(spec)
+
+
+# Record counts over one or more dimensions: a histogram for one, a cross-tab for two
+class Counts:
+    def __init__(self, *dimensions, name=None):
+        self.dimensions = [make_dimension(spec) for spec in dimensions]
+        if sum(dimension.multi for dimension in self.dimensions) > 1:
+            raise ValueError('At most one dimension of a count table can be Medical_History')
+        self.name = name or ' x '.join(dimension.name for dimension in self.dimensions)
+        self.counts = np.zeros((1,) * len(self.dimensions), dtype=np.int64)  # Slot 0 of each axis is None
+
+    def _grow(self):
+        shape = tuple(len(dimension.labels) + 1 for dimension in self.dimensions)
+        if shape != self.counts.shape:
+            self.counts = np.pad(self.counts, [(0, new - old) for new, old in zip(shape, self.counts.shape)])
+
+    def update(self, source):
+        codes = [dimension.codes(source) for dimension in self.dimensions]
+        rows = next((dimension_rows for dimension_rows, _ in codes if dimension_rows is not None), None)
+        index = []
+        for dimension_rows, dimension_codes in codes:
+            if rows is not None and dimension_rows is None:
+                dimension_codes = dimension_codes[rows]
+            index.append(dimension_codes.astype(np.int64) + 1)
+        self._grow()
+        flat = np.ravel_multi_index(index, self.counts.shape)
+        self.counts += np.bincount(flat, minlength=self.counts.size).reshape(self.counts.shape)
+
+    def merge(self, other):
+        if [dimension.name for dimension in other.dimensions] != [dimension.name for dimension in self.dimensions]:
+            raise ValueError(f'Cannot merge {other.name!r} into {self.name!r}')
+        slots = [np.concatenate([[0], dimension.labels.remap(other_dimension.labels)[:-1] + 1])
+                 for dimension, other_dimension in zip(self.dimensions, other.dimensions)]
+        self._grow()
+        self.counts[np.ix_(*slots)] += other.counts
+
+    # Labels of each axis and the counts, without the None slots that stayed empty
+    def table(self):
+        counts = self.counts
+        labels = []
+        for axis, dimension in enumerate(self.dimensions):
+            axis_labels = [None] + list(dimension.labels)
+            if not np.take(counts, 0, axis=axis).any():
+                counts = np.delete(counts, 0, axis=axis)
+                axis_labels = axis_labels[1:]
+            labels.append(axis_labels)
+        return labels, counts
+
+    # Counts as a pandas Series (one dimension) or DataFrame (two; more become a MultiIndex Series)
+    def frame(self, counts=None):
+        import pandas as pd
+        labels, table = self.table()
+        if counts is not None:
+            table = counts
+        names = [dimension.name for dimension in self.dimensions]
+        if len(labels) == 1:
+            return pd.Series(table, index=pd.Index(labels[0], name=names[0]), name=self.name)
+        if len(labels) == 2:
+            return pd.DataFrame(table, index=pd.Index(labels[0], name=names[0]),
+                                columns=pd.Index(labels[1], name=names[1]))
+        return pd.Series(table.ravel(), index=pd.MultiIndex.from_product(labels, names=names), name=self.name)
+
+    # Shares along the last dimension (e.g. the outcome rates of each condition), as frame() returns them
+    def rates(self):
+        _, table = self.table()
+        totals = table.sum(axis=-1, keepdims=True)
+        return self.frame(np.divide(table, totals, out=np.zeros(table.shape), where=totals > 0))
+
+
+# Count, mean, standard deviation, minimum and maximum of a gene or biomarker.
+# Chunks are combined with Chan et al.'s pairwise update of (count, mean, M2), which merge() reuses.
+class Moments:
+    def __init__(self, kind, field, name=None):
+        self.kind = kind
+        self.field = field
+        self.name = name or field
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0  # Sum of squared deviations from the mean
+        self.minimum = np.inf
+        self.maximum = -np.inf
+
+    def _combine(self, count, mean, m2, minimum, maximum):
+        if not count:
+            return
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.count = total
+        self.minimum = min(self.minimum, minimum)
+        self.maximum = max(self.maximum, maximum)
+
+    def update(self, source):
+        values = np.asarray(source.values(self.kind, self.field), dtype=np.float64)
+        if len(values):
+            mean = values.mean()
+            self._combine(len(values), mean, float(((values - mean) ** 2).sum()), values.min(), values.max())
+
+    def merge(self, other):
+        self._combine(other.count, other.mean, other.m2, other.minimum, other.maximum)
+
+    # Population standard deviation
+    @property
+    def std(self):
+        return (self.m2 / self.count) ** 0.5 if self.count else 0.0
+
+    def frame(self):
+        import pandas as pd
+        return pd.Series({'count': self.count, 'mean': self.mean, 'std': self.std, 'min': self.minimum,
+                          'max': self.maximum}, name=self.name)
+
+
+# A named set of aggregates updated together
+class Analytics:
+    def __init__(self, aggregates):
+        self.aggregates = {aggregate.name: aggregate for aggregate in aggregates}
+        self.records = 0
+
+    def __getitem__(self, name):
+        return self.aggregates[name]
+
+    def __iter__(self):
+        return iter(self.aggregates.values())
+
+    def _update(self, source):
+        for aggregate in self.aggregates.values():
+            aggregate.update(source)
+        self.records += len(source)
+
+    # Function to add one pipeline chunk
+    def update(self, chunk):
+        self._update(ChunkSource(chunk))
+
+    # Function to add the records of a patient database
+    def update_frame(self, patient_database):
+        self._update(FrameSource(patient_database))
+
+    # Function to add the aggregates of another Analytics with the same aggregates (a shard of the run)
+    def merge(self, other):
+        if list(other.aggregates) != list(self.aggregates):
+            raise ValueError('Analytics with different aggregates cannot be merged')
+        for name, aggregate in self.aggregates.items():
+            aggregate.merge(other.aggregates[name])
+        self.records += other.records
+
+    # Every aggregate rendered as text, in order
+    def text(self):
+        parts = [f'Patients: {self.records}\n']
+        for aggregate in self:
+            parts.append(f'\n{aggregate.name}:\n{aggregate.frame().to_string()}\n')
+        return ''.join(parts)
+
+
+# Function to build the usual post-run summaries of a version profile: the therapy mix by health status,
+# the dosage tiers per tier of each dosage gene, the outcomes per condition and the biomarker moments
+# (biomarkers=False leaves those out, for patient databases, which have no biomarker columns)
+def default_aggregates(profile, biomarkers=True):
+    genes = gene_names(profile['genes'])
+    aggregates = [Counts('Current_Health', 'Selected_Therapy')]
+    dosage_genes = [entry['dosage_gene'] for entry in profile['manufacturing'] if entry.get('dosage_gene') in genes]
+    aggregates += [Counts(('gene', gene, GENE_TIER_EDGES), 'Dosage_Adjustment') for gene in dict.fromkeys(dosage_genes)]
+    if 'outcome' in profile:
+        aggregates.append(Counts('Medical_History', 'Outcome'))
+    if biomarkers:
+        aggregates += [Moments('biomarker', biomarker) for biomarker in BIOMARKERS]
+    return aggregates
+
+
+# Stage: update analytics with every chunk on its way to a sink (one pass for both)
+def observe(chunks, analytics):
+    for chunk in chunks:
+        analytics.update(chunk)
+        yield chunk
+
+
+# Sink: aggregate every chunk; returns the analytics
+def analytics_sink(chunks, analytics):
+    for chunk in chunks:
+        analytics.update(chunk)
+    return analytics
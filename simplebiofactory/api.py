@@ -0,0 +1,280 @@
+from collections.abc import Mapping
+from functools import lru_cache
+
+import numpy as np
+
+from simplebiofactory.cohort import HEALTH_STATES, Cohort, code_dtype, gene_names
+from simplebiofactory.memo import DEFAULT_CACHE_SIZE, MemoCache, TherapySignature
+from simplebiofactory.profiles import PROFILES, generate_profile_cohort
+from simplebiofactory.rules import compile_rules
+from simplebiofactory.screening import Screening
+
+# Library entry points. Importing this module only loads NumPy and the rule tables: pandas (and
+# pyarrow) are imported by the functions that build DataFrames or files, when they are first called,
+# so a worker that only selects therapies starts without them.
+
+BIOMARKER_LIMITS = (np.iinfo(np.int16).min, np.iinfo(np.int16).max)  # Biomarkers are stored as int16
+
+
+def versions():
+    return list(PROFILES)
+
+
+def _profile(version):
+    try:
+        return PROFILES[version]
+    except KeyError:
+        raise ValueError(f'Unknown version {version!r}; expected one of {list(PROFILES)}') from None
+
+
+# Compiled therapy rules of a version (compiled once per process)
+@lru_cache(maxsize=None)
+def therapy_rules(version):
+    return compile_rules(_profile(version))
+
+
+# Compiled drug interaction and blocker screening of a version (None when the version has none)
+@lru_cache(maxsize=None)
+def therapy_screening(version):
+    profile = _profile(version)
+    if 'screening' not in profile:
+        return None
+    return Screening(profile['screening'], therapy_rules(version).therapies, gene_names(profile['genes']))
+
+
+# Function to recompile the rules and screening of every version after their tables (in profiles) were
+# edited; therapy caches see the new rules on their next lookup and drop their results
+def reload_rules():
+    therapy_rules.cache_clear()
+    therapy_screening.cache_clear()
+
+
+# Function to make a result cache for select_therapies(), keyed on memo.TherapySignature (None for versions
+# whose selection draws random values: gene_impact rules and random blocker tests)
+def therapy_cache(version, maxsize=DEFAULT_CACHE_SIZE):
+    screening = therapy_screening(version)
+    if therapy_rules(version).random or (screening is not None and screening.blocker_rules):
+        return None
+    return MemoCache(maxsize, source=lambda: therapy_rules(version))
+
+
+# Therapy names for a Cohort: rules, then screening (interaction warnings and blocker adjustments)
+def _select_names(version, cohort, rng):
+    codes = therapy_rules(version).select(cohort, rng)
+    screening = therapy_screening(version)
+    if screening is None:
+        return np.array(therapy_rules(version).therapies, dtype=object)[codes]
+    return screening.names(screening.screen(cohort, codes, rng))
+
+
+# Function to generate a cohort shaped like the patients of one version
+def generate(version, num_patients, seed=None):
+    _profile(version)
+    return generate_profile_cohort(version, num_patients, np.random.default_rng(seed))
+
+
+# Name -> column lookups of a version's genes, conditions and allergies (built once per process)
+@lru_cache(maxsize=None)
+def _schema(version):
+    profile = _profile(version)
+    genes = gene_names(profile['genes'])
+    conditions = list(profile['conditions'])
+    allergy_names = list(profile.get('allergies', ()))
+    return (genes, {gene: i for i, gene in enumerate(genes)}, conditions,
+            {condition: i for i, condition in enumerate(conditions)}, allergy_names,
+            {allergy: i for i, allergy in enumerate(allergy_names)})
+
+
+# Genetics of a patient dict as one float32 row: a dict keyed by gene name (missing genes count as 0.0)
+# or a sequence (list or ndarray) with one value per gene of the version, in gene order
+def _genetics_row(genetics, genes, gene_index):
+    row = np.zeros(len(genes), dtype=np.float32)
+    try:
+        if isinstance(genetics, Mapping):
+            for gene, value in genetics.items():
+                if gene in gene_index:
+                    row[gene_index[gene]] = value
+            return row
+        values = None if isinstance(genetics, (str, bytes)) else np.asarray(genetics, dtype=np.float32)
+    except (TypeError, ValueError):
+        raise ValueError('genetics values must be numbers') from None
+    if values is None or values.shape != row.shape:
+        raise ValueError(f'genetics must be a dict keyed by gene or a sequence of {len(genes)} values')
+    row[:] = values
+    return row
+
+
+def _biomarker(value, name):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{name} must be a number, not {value!r}') from None
+    if not BIOMARKER_LIMITS[0] <= value <= BIOMARKER_LIMITS[1]:
+        raise ValueError(f'{name} {value} is out of range')
+    return value
+
+
+# Function to check one patient dict (as returned by generate_patient_data) and convert it to the codes of
+# a cohort row: (genetics, history codes, health code, systolic, diastolic, cholesterol, allergy codes).
+# Raises ValueError for a malformed patient.
+def patient_row(version, patient):
+    genes, gene_index, _, condition_index, _, allergy_index = _schema(version)
+    if not isinstance(patient, Mapping):
+        raise ValueError(f'A patient must be a dict, not {type(patient).__name__}')
+    if 'medical_history' not in patient:
+        raise ValueError('The patient has no medical_history')
+    genetics = _genetics_row(patient.get('genetics', {}), genes, gene_index)
+    try:
+        history = [condition_index[condition] for condition in patient['medical_history']]
+        allergies = [allergy_index[allergy] for allergy in patient.get('allergies', ())]
+    except KeyError as error:
+        raise ValueError(f'{error.args[0]!r} is not a condition or allergy of version {version}') from None
+    except TypeError:
+        raise ValueError('medical_history and allergies must be lists of names') from None
+    health = patient.get('current_health', 'Good')
+    if health not in HEALTH_STATES:
+        raise ValueError(f'current_health must be one of {HEALTH_STATES}, not {health!r}')
+    biomarkers = patient.get('biomarkers', {})
+    blood_pressure = biomarkers.get('blood_pressure', {}) if isinstance(biomarkers, Mapping) else None
+    if not isinstance(blood_pressure, Mapping):
+        raise ValueError('biomarkers must be a dict with a blood_pressure dict')
+    return (genetics, history, HEALTH_STATES.index(health), _biomarker(blood_pressure.get('systolic', 0), 'systolic'),
+            _biomarker(blood_pressure.get('diastolic', 0), 'diastolic'),
+            _biomarker(biomarkers.get('cholesterol_level', 0), 'cholesterol_level'), allergies)
+
+
+# Function to build a Cohort of one version from patient_row() rows with histories (and allergy lists) of one length
+def cohort_from_rows(version, rows):
+    genes, _, conditions, _, allergy_names, _ = _schema(version)
+    rows = list(rows)
+    if len({len(row[1]) for row in rows}) > 1:
+        raise ValueError('All patients of a cohort need medical histories of the same length')
+    genetics = np.array([row[0] for row in rows], dtype=np.float32).reshape(len(rows), len(genes))
+    medical_history = np.array([row[1] for row in rows], dtype=code_dtype(len(conditions))).reshape(len(rows), -1)
+    current_health = np.array([row[2] for row in rows], dtype=np.uint8)
+    systolic, diastolic, cholesterol = (np.array([row[column] for row in rows], dtype=np.int16) for column in (3, 4, 5))
+    allergy_codes = None
+    if allergy_names:
+        if len({len(row[6]) for row in rows}) > 1:
+            raise ValueError('All patients of a cohort need the same number of allergies')
+        allergy_codes = np.array([row[6] for row in rows], dtype=code_dtype(len(allergy_names))).reshape(len(rows), -1)
+    return Cohort(genes, genetics, conditions, medical_history, current_health, systolic, diastolic, cholesterol,
+                  allergy_names, allergy_codes)
+
+
+# Function to convert patient dicts (as returned by generate_patient_data) into a Cohort of one version.
+# All patients need medical histories of the same length; genetics are mapped as in patient_row().
+def cohort_from_patients(version, patients):
+    return cohort_from_rows(version, [patient_row(version, patient) for patient in patients])
+
+
+# Row indices grouped by (history length, allergy count), the patients that can share one Cohort
+def group_rows(rows):
+    groups = {}
+    for index, row in enumerate(rows):
+        groups.setdefault((len(row[1]), len(row[6])), []).append(index)
+    return groups.values()
+
+
+# Therapy names for patient_row() rows (grouped by history length into Cohorts)
+def _select_rows(version, rows, rng):
+    selected = np.empty(len(rows), dtype=object)
+    for indices in group_rows(rows):
+        cohort = cohort_from_rows(version, [rows[index] for index in indices])
+        selected[indices] = _select_names(version, cohort, rng)
+    return selected
+
+
+# Function to select therapies for a Cohort, or for patient dicts (grouped by history length); returns names.
+# cache (see therapy_cache()) reuses the therapies of patients with the same signature.
+def select_therapies(version, patients, seed=None, rng=None, cache=None):
+    if rng is None:
+        rng = np.random.default_rng(seed)
+    if isinstance(patients, Cohort):
+        return _select_names(version, patients, rng)
+
+    rows = [patient_row(version, patient) for patient in patients]
+    if cache is None:
+        return _select_rows(version, rows, rng)
+    signature = TherapySignature(therapy_rules(version))
+    selected = np.empty(len(rows), dtype=object)
+    selected[:] = cache.get_many([signature(row) for row in rows],
+                                 lambda missed: _select_rows(version, [rows[index] for index in missed], rng))
+    return selected
+
+
+# Function to select the therapy for a single patient dict
+def select_therapy(version, patient, seed=None, rng=None, cache=None):
+    return select_therapies(version, [patient], seed, rng, cache)[0]
+
+
+# Chunk stream of a single-process run (one chunk per shard, seeded as parallel.simulate_parallel seeds its
+# shards), checkpointed to a directory when checkpoint is set
+def _stream(version, num_patients, seed, chunk_size, workers, checkpoint, resume, checkpoint_every):
+    from simplebiofactory.parallel import DEFAULT_SHARD_SIZE, shard_stream
+    chunk_size = chunk_size or DEFAULT_SHARD_SIZE
+    if checkpoint is None:
+        if resume:
+            raise ValueError('Resuming needs a checkpoint directory')
+        return shard_stream(version, num_patients, seed, chunk_size)
+    if workers != 1:
+        raise ValueError('Checkpoints are only supported with one worker')
+    from simplebiofactory.checkpoint import DEFAULT_EVERY, checkpointed_stream
+    return checkpointed_stream(version, num_patients, checkpoint, chunk_size, seed,
+                               checkpoint_every or DEFAULT_EVERY, resume)
+
+
+# Function to simulate a version's whole pipeline; returns the patient database (needs pandas).
+# The run is split into shards of chunk_size patients (default parallel.DEFAULT_SHARD_SIZE), each with
+# its own Generator spawned from the seed, so the records for a seed and chunk size are the same for any
+# number of workers; workers other than 1 run the shards on processes (see parallel.simulate_parallel).
+# checkpoint names a directory to checkpoint the run to every checkpoint_every seconds; resume=True
+# continues the run from its last checkpoint there (see checkpoint.py).
+def simulate(version, num_patients, seed=None, chunk_size=None, workers=1, checkpoint=None, resume=False,
+             checkpoint_every=None):
+    _profile(version)
+    if checkpoint is None and not resume:
+        from simplebiofactory.parallel import DEFAULT_SHARD_SIZE, simulate_parallel
+        return simulate_parallel(version, num_patients, seed, workers, chunk_size or DEFAULT_SHARD_SIZE)
+    from simplebiofactory.pipeline import collect_sink, record_columns
+    profile = _profile(version)
+    chunks = _stream(version, num_patients, seed, chunk_size, workers, checkpoint, resume, checkpoint_every)
+    return collect_sink(chunks, num_patients, gene_names(profile['genes']), record_columns(profile))
+
+
+# Function to simulate a version straight into a file: .csv is streamed chunk by chunk,
+# .arrow/.feather/.parquet are written through storage.save_database. Returns the number of records.
+def simulate_to_file(version, num_patients, path, seed=None, chunk_size=None, workers=1, checkpoint=None,
+                     resume=False, checkpoint_every=None):
+    if str(path).endswith('.csv') and workers == 1:
+        from simplebiofactory.pipeline import csv_sink
+        _profile(version)
+        return csv_sink(_stream(version, num_patients, seed, chunk_size, workers, checkpoint, resume,
+                                checkpoint_every), path)
+    patient_database = simulate(version, num_patients, seed, chunk_size, workers, checkpoint, resume,
+                                checkpoint_every)
+    if str(path).endswith('.csv'):
+        with open(path, 'w', newline='') as out:
+            report(patient_database, 'csv', out)
+    else:
+        from simplebiofactory.storage import save_database
+        save_database(patient_database, path)
+    return len(patient_database)
+
+
+# Function to compute cohort analytics of a simulated run in one streaming pass, without keeping the
+# records. aggregates default to analytics.default_aggregates(); returns an analytics.Analytics.
+# Shards and seeds as in simulate(); workers other than 1 aggregate the shards on processes and merge
+# them (see parallel.analyze_parallel).
+def analyze(version, num_patients, seed=None, aggregates=None, chunk_size=None, workers=1):
+    from simplebiofactory.analytics import Analytics, default_aggregates
+    from simplebiofactory.parallel import DEFAULT_SHARD_SIZE, analyze_parallel
+    profile = _profile(version)
+    analytics = Analytics(default_aggregates(profile) if aggregates is None else aggregates)
+    return analyze_parallel(version, num_patients, seed, analytics, workers, chunk_size or DEFAULT_SHARD_SIZE)
+
+
+# Function to write the report of a patient database (see report.REPORT_MODES)
+def report(patient_database, mode='summary', out=None):
+    from simplebiofactory.report import write_report
+    write_report(patient_database, mode, out)
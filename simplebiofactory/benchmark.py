@@ -0,0 +1,236 @@
+import argparse
+import contextlib
+import functools
+import importlib.util
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from simplebiofactory.cohort import HEALTH_STATES, gene_names
+from simplebiofactory.manufacturing import ManufacturingTable, OutcomeTable
+from simplebiofactory.profiles import PROFILES, generate_profile_cohort
+from simplebiofactory.records import RecordBuilder
+from simplebiofactory.report import write_report
+from simplebiofactory.rules import compile_rules
+from simplebiofactory.screening import Screening
+
+# Benchmark harness for the pipelines of every version.
+# Each stage is timed (median of repeat runs) and its peak memory recorded, for every version at every
+# cohort size. Memory is traced in one extra run so the tracing overhead does not skew the timings.
+# The 'script' stage runs the version's script (simplebiofactory<version>.py) end to end, printing to
+# os.devnull, for sizes up to the script size limit (the scripts loop over patients one by one).
+# Results are written as JSON and can be compared against a saved baseline: a stage that got slower
+# than the baseline by more than the tolerance, or whose peak memory grew by more than the memory
+# tolerance, is reported as a regression.
+#   python -m simplebiofactory.benchmark --sizes 100 10000 1000000 --output results.json
+#   python -m simplebiofactory.benchmark --baseline baseline.json
+
+STAGES = ('generation', 'ai_workflow', 'biomanufacturing', 'screening', 'outcome', 'records', 'report', 'script')
+DEFAULT_SIZES = (10 ** 2, 10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6)
+ALL_SIZES = DEFAULT_SIZES + (10 ** 7,)
+DEFAULT_REPEAT = 5
+DEFAULT_TOLERANCE = 0.5  # Allowed slowdown against the baseline (0.5 = 50%; run to run noise reaches 1.4x)
+DEFAULT_MEMORY_TOLERANCE = 0.1  # Allowed peak memory growth against the baseline (traced peaks barely vary)
+MIN_SECONDS = 0.005  # Stages faster than this in the baseline are too noisy to flag
+MIN_BYTES = 2 ** 20  # Peaks smaller than this in the baseline are not compared
+SCRIPT_MAX_SIZE = 10 ** 3  # Largest cohort the scripts are run for by default
+SCRIPT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# Time one call: (seconds, peak traced bytes or None when not tracing, result)
+def _measure(trace, function, *args):
+    if trace:
+        tracemalloc.start()
+    started = time.perf_counter()
+    result = function(*args)
+    seconds = time.perf_counter() - started
+    peak = None
+    if trace:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return seconds, peak, result
+
+
+def _build_records(cohort, genes, columns, vocabularies):
+    builder = RecordBuilder(len(cohort), genes, columns=list(columns))
+    categories = {column: (codes, vocabularies[column]) for column, codes in columns.items()}
+    builder.extend(np.arange(1, len(cohort) + 1), cohort.genetics, (cohort.medical_history, cohort.conditions),
+                   categories)
+    return builder.to_frame()
+
+
+# Function to run every stage of one version once; returns {stage: (seconds, peak bytes or None)}
+def run_stages(version, num_patients, seed=0, report_mode='csv', trace=False):
+    profile = PROFILES[version]
+    genes = gene_names(profile['genes'])
+    rng = np.random.default_rng(seed)
+    timings = {}
+
+    seconds, peak, cohort = _measure(trace, generate_profile_cohort, version, num_patients, rng)
+    timings['generation'] = (seconds, peak)
+    rules = compile_rules(profile)
+    seconds, peak, therapy = _measure(trace, rules.select, cohort, rng)
+    timings['ai_workflow'] = (seconds, peak)
+
+    table = ManufacturingTable(profile['manufacturing'], rules.therapies, genes)
+    seconds, peak, (microorganism, process, dosage) = _measure(trace, table.apply, cohort, therapy)
+    timings['biomanufacturing'] = (seconds, peak)
+    columns = {'Current_Health': cohort.current_health, 'Selected_Therapy': therapy,
+               'Engineered_Microorganism': microorganism, 'Bioreactor_Process': process, 'Dosage_Adjustment': dosage}
+    vocabularies = {'Current_Health': list(HEALTH_STATES), 'Selected_Therapy': rules.therapies,
+                    'Engineered_Microorganism': table.microorganisms, 'Bioreactor_Process': table.processes,
+                    'Dosage_Adjustment': table.dosages}
+
+    if 'screening' in profile:
+        screening = Screening(profile['screening'], rules.therapies, genes)
+        seconds, peak, result = _measure(trace, screening.screen, cohort, therapy, rng)
+        timings['screening'] = (seconds, peak)
+        vocabularies['Selected_Therapy'] = screening.output_names()
+        columns['Selected_Therapy'] = screening.output_codes(result)
+
+    if 'outcome' in profile:
+        outcome_table = OutcomeTable(profile['outcome'], genes)
+        seconds, peak, columns['Outcome'] = _measure(trace, outcome_table.apply, cohort, rng)
+        vocabularies['Outcome'] = outcome_table.outcomes
+        timings['outcome'] = (seconds, peak)
+
+    seconds, peak, patient_database = _measure(trace, _build_records, cohort, genes, columns, vocabularies)
+    timings['records'] = (seconds, peak)
+    with open(os.devnull, 'w') as out:
+        seconds, peak, _ = _measure(trace, write_report, patient_database, report_mode, out)
+    timings['report'] = (seconds, peak)
+    return timings
+
+
+# Function to load the script of a version (simplebiofactory<version>.py next to the package), or None
+def load_script(version):
+    path = os.path.join(SCRIPT_DIRECTORY, f'simplebiofactory{version}.py')
+    if not os.path.exists(path):
+        return None
+    spec = importlib.util.spec_from_file_location(f'simplebiofactory_script_{version.replace(".", "_")}', path)
+    script = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(script)
+    return script
+
+
+# Function to time a version's script end to end once, printing to os.devnull; returns
+# {'script': (seconds, peak bytes or None)}. Scripts without a NUM_PATIENTS constant (1, 1.2) simulate one patient.
+def run_script(script, num_patients, seed=0, trace=False):
+    np.random.seed(seed)
+    if hasattr(script, 'NUM_PATIENTS'):
+        script.NUM_PATIENTS = num_patients
+    with open(os.devnull, 'w') as out, contextlib.redirect_stdout(out):
+        seconds, peak, _ = _measure(trace, script.main)
+    return {'script': (seconds, peak)}
+
+
+# Result rows of one version and size: the median time of repeat calls of run_once(seed, trace=False) and
+# the peak memory of one more, traced call
+def _benchmark(version, size, run_once, repeat, log):
+    times = {}
+    for run in range(repeat):
+        for stage, (seconds, _) in run_once(run, trace=False).items():
+            times.setdefault(stage, []).append(seconds)
+    peaks = {stage: peak for stage, (_, peak) in run_once(0, trace=True).items()}
+    rows = []
+    for stage in STAGES:
+        if stage in times:
+            seconds, peak = float(np.median(times[stage])), peaks[stage]
+            rows.append({'version': version, 'size': size, 'stage': stage, 'seconds': seconds, 'peak_bytes': peak})
+            if log:
+                log.write(f'{version:>4} {size:>10} {stage:<17} {seconds:10.4f} s {peak / 2 ** 20:10.1f} MiB\n')
+    return rows
+
+
+# Function to benchmark versions at sizes; returns the list of result rows (median time of repeat runs).
+# The scripts run at the sizes up to script_max_size (the single-patient scripts once, at size 1).
+def run_benchmarks(versions, sizes, repeat=DEFAULT_REPEAT, report_mode='csv', log=None,
+                   script_max_size=SCRIPT_MAX_SIZE):
+    results = []
+    for version in versions:
+        for size in sizes:
+            stages = functools.partial(run_stages, version, size, report_mode=report_mode)
+            results.extend(_benchmark(version, size, stages, repeat, log))
+        script = load_script(version) if script_max_size else None
+        if script is None:
+            continue
+        script_sizes = [size for size in sizes if size <= script_max_size] if hasattr(script, 'NUM_PATIENTS') else [1]
+        for size in script_sizes:
+            results.extend(_benchmark(version, size, functools.partial(run_script, script, size), repeat, log))
+    return results
+
+
+def environment():
+    return {'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine(),
+            'processor': platform.processor(), 'cpus': os.cpu_count(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+
+# Function to compare results against baseline results; returns the rows that got slower or whose peak
+# memory grew, each with the metric ('seconds' or 'peak_bytes'), its baseline value and the ratio
+def find_regressions(results, baseline, tolerance=DEFAULT_TOLERANCE, min_seconds=MIN_SECONDS,
+                     memory_tolerance=DEFAULT_MEMORY_TOLERANCE, min_bytes=MIN_BYTES):
+    before = {(row['version'], row['size'], row['stage']): row for row in baseline}
+    limits = (('seconds', tolerance, min_seconds), ('peak_bytes', memory_tolerance, min_bytes))
+    regressions = []
+    for row in results:
+        previous = before.get((row['version'], row['size'], row['stage']))
+        if previous is None:
+            continue
+        for metric, allowed, minimum in limits:
+            value, baseline_value = row.get(metric), previous.get(metric)
+            if value is None or baseline_value is None or baseline_value < minimum:
+                continue
+            if value > baseline_value * (1 + allowed):
+                regressions.append(dict(row, metric=metric, baseline=baseline_value, ratio=value / baseline_value))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m simplebiofactory.benchmark',
+                                     description='Time every pipeline stage of every version')
+    parser.add_argument('--versions', nargs='+', default=list(PROFILES), choices=list(PROFILES))
+    parser.add_argument('--sizes', nargs='+', type=int, default=list(DEFAULT_SIZES),
+                        help='Cohort sizes (default 10^2 to 10^6; --all adds 10^7)')
+    parser.add_argument('--all', action='store_true', help='Run every size from 10^2 to 10^7')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    parser.add_argument('--report-mode', default='csv')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    parser.add_argument('--baseline', help='Compare against the results in this JSON file')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument('--memory-tolerance', type=float, default=DEFAULT_MEMORY_TOLERANCE)
+    parser.add_argument('--script-max-size', type=int, default=SCRIPT_MAX_SIZE,
+                        help='Largest cohort to run the version scripts for (0 skips them)')
+    args = parser.parse_args(argv)
+
+    sizes = list(ALL_SIZES) if args.all else args.sizes
+    results = run_benchmarks(args.versions, sizes, args.repeat, args.report_mode, log=sys.stderr,
+                             script_max_size=args.script_max_size)
+    document = {'environment': environment(), 'results': results}
+    if args.output:
+        with open(args.output, 'w') as out:
+            json.dump(document, out, indent=1)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)['results']
+        regressions = find_regressions(results, baseline, args.tolerance, memory_tolerance=args.memory_tolerance)
+        for row in regressions:
+            if row['metric'] == 'seconds':
+                change = f"{row['seconds']:.4f} s vs {row['baseline']:.4f} s"
+            else:
+                change = f"peak {row['peak_bytes'] / 2 ** 20:.1f} MiB vs {row['baseline'] / 2 ** 20:.1f} MiB"
+            print(f"Regression: {row['version']} {row['stage']} at {row['size']} patients "
+                  f"{change} ({row['ratio']:.2f}x)")
+        if regressions:
+            return 1
+        print('No regressions against', args.baseline)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,56 @@
+import numpy as np
+
+# Fixed-width bitsets over a vocabulary (medical history conditions, allergies, genes).
+# Each patient gets one row of uint64 words; bit i of the row is set when vocabulary entry i is present,
+# so duplicate draws collapse for free and membership tests become bitwise operations.
+
+WORD_BITS = 64
+
+
+# Number of uint64 words needed for a vocabulary of the given size
+def num_words(size):
+    return max(1, -(-size // WORD_BITS))
+
+
+# Function to encode a patients x draws array of vocabulary codes as a patients x words bitset
+def encode_codes(codes, size):
+    codes = np.asarray(codes)
+    words = np.zeros((len(codes), num_words(size)), dtype=np.uint64)
+    if codes.shape[1] == 0:
+        return words
+    word_index = codes // WORD_BITS
+    bits = np.left_shift(np.uint64(1), (codes % WORD_BITS).astype(np.uint64))
+    for word in range(words.shape[1]):
+        words[:, word] = np.bitwise_or.reduce(np.where(word_index == word, bits, np.uint64(0)), axis=1)
+    return words
+
+
+# Query mask (one row of words) with the bits of the given names set
+def names_mask(vocabulary, names):
+    vocabulary = list(vocabulary)
+    mask = np.zeros(num_words(len(vocabulary)), dtype=np.uint64)
+    for name in names:
+        code = vocabulary.index(name)  # ValueError for names outside the vocabulary
+        mask[code // WORD_BITS] |= np.uint64(1) << np.uint64(code % WORD_BITS)
+    return mask
+
+
+# Rows that contain at least one of the mask's entries
+def has_any(bitset, mask):
+    return (bitset & mask).any(axis=1)
+
+
+# Rows that contain every one of the mask's entries
+def has_all(bitset, mask):
+    return ((bitset & mask) == mask).all(axis=1)
+
+
+# Number of distinct entries in each row
+def count_members(bitset):
+    return np.bitwise_count(bitset).sum(axis=1)
+
+
+# Function to decode one bitset row back into the names it contains (in vocabulary order)
+def decode_row(row, vocabulary):
+    return [name for code, name in enumerate(vocabulary)
+            if row[code // WORD_BITS] >> np.uint64(code % WORD_BITS) & np.uint64(1)]
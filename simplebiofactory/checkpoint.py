@@ -0,0 +1,126 @@
+import json
+import os
+import time
+
+import numpy as np
+
+from simplebiofactory.cohort import Cohort, gene_names
+from simplebiofactory.parallel import DEFAULT_SHARD_SIZE, shard_stream
+from simplebiofactory.pipeline import record_vocabularies
+from simplebiofactory.profiles import PROFILES
+from simplebiofactory.screening import ScreeningResult
+
+# Checkpoint and resume for long pipeline runs.
+# checkpointed_stream() wraps parallel.shard_stream(): every finished chunk (one shard) is written to the
+# checkpoint directory as chunk-<index>.npz (cohort arrays and record codes), and every `every` seconds the
+# chunk files are flushed to disk and state.json records the progress cursor, the entropy the shards are
+# seeded from and the shared vocabularies. Both are written to a temporary file and renamed into place,
+# so a crash leaves either the previous or the new checkpoint, never a torn one.
+# With resume=True the stream first replays the checkpointed chunks from disk, then continues at the cursor
+# with the next shard's Generator. The chunks are the same as in an uninterrupted (or sharded) run with the
+# same seed and chunk size, so sinks write bit-identical output.
+
+STATE_FILE = 'state.json'
+DEFAULT_EVERY = 30.0  # Seconds between checkpoints
+
+COHORT_ARRAYS = ('genetics', 'medical_history', 'current_health', 'systolic', 'diastolic', 'cholesterol',
+                 'allergies')
+SCREENING_ARRAYS = ('therapy', 'interaction', 'blocker')
+
+
+def _chunk_path(directory, index):
+    return os.path.join(directory, f'chunk-{index:06d}.npz')
+
+
+def _fsync(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+# Function to write a file atomically: write(file object) fills a temporary file that replaces path
+def atomic_write(path, write, mode='wb', sync=True):
+    temporary = f'{path}.tmp'
+    with open(temporary, mode) as out:
+        write(out)
+        if sync:
+            out.flush()
+            os.fsync(out.fileno())
+    os.replace(temporary, path)
+
+
+# Function to read the checkpoint state of a directory (None when there is no checkpoint)
+def load_state(directory):
+    path = os.path.join(directory, STATE_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as state_file:
+        return json.load(state_file)
+
+
+def _save_chunk(directory, index, chunk):
+    cohort = chunk['cohort']
+    arrays = {name: getattr(cohort, name) for name in COHORT_ARRAYS}
+    arrays.update({f'column_{column}': codes for column, codes in chunk['columns'].items()})
+    if 'screening' in chunk:
+        arrays.update({f'screening_{name}': getattr(chunk['screening'], name) for name in SCREENING_ARRAYS})
+    # Not synced here: _save_state syncs every chunk file it covers before recording it
+    atomic_write(_chunk_path(directory, index), lambda out: np.savez(out, start=chunk['start'], **arrays), sync=False)
+
+
+def _load_chunk(directory, index, profile, vocabularies):
+    with np.load(_chunk_path(directory, index)) as data:
+        cohort = Cohort(gene_names(profile['genes']), data['genetics'], profile['conditions'],
+                        *(data[name] for name in COHORT_ARRAYS[1:6]), profile.get('allergies', ()), data['allergies'])
+        columns = {name[len('column_'):]: data[name] for name in data.files if name.startswith('column_')}
+        chunk = {'start': int(data['start']), 'cohort': cohort, 'columns': columns, 'vocabularies': vocabularies}
+        if 'screening_therapy' in data.files:
+            chunk['screening'] = ScreeningResult(*(data[f'screening_{name}'] for name in SCREENING_ARRAYS))
+        return chunk
+
+
+def _save_state(directory, state, synced, chunks):
+    for index in range(synced, chunks):
+        _fsync(_chunk_path(directory, index))
+    atomic_write(os.path.join(directory, STATE_FILE), lambda out: out.write(json.dumps(state).encode()))
+
+
+# Function to stream a version's pipeline with checkpoints in directory (see the module comment).
+# chunk_size is the shard size; a fresh run (resume=False) clears the directory's previous checkpoint.
+def checkpointed_stream(version, num_patients, directory, chunk_size=DEFAULT_SHARD_SIZE, seed=None,
+                        every=DEFAULT_EVERY, resume=False):
+    os.makedirs(directory, exist_ok=True)
+    settings = {'version': version, 'num_patients': num_patients, 'chunk_size': chunk_size}
+    state = load_state(directory) if resume else None
+    # The entropy of SeedSequence(None) is fresh, so it is kept for resuming an unseeded run
+    entropy = np.random.SeedSequence(seed).entropy
+    vocabularies = record_vocabularies()
+    chunks = 0
+    if state is not None:
+        if state['settings'] != settings:
+            raise ValueError(f'The checkpoint in {directory} is for {state["settings"]}, not {settings}')
+        entropy, chunks = state['entropy'], state['chunks']
+        for column, values in state['vocabularies'].items():
+            vocabularies[column].remap(values)
+        for index in range(chunks):
+            yield _load_chunk(directory, index, PROFILES[version], vocabularies)
+    else:
+        for name in os.listdir(directory):
+            if name.startswith((STATE_FILE, 'chunk-')):
+                os.remove(os.path.join(directory, name))
+
+    synced = chunks
+    last = time.monotonic()
+    for chunk in shard_stream(version, num_patients, entropy, chunk_size, vocabularies, first_shard=chunks):
+        _save_chunk(directory, chunks, chunk)
+        chunks += 1
+        start = chunk['start'] + len(chunk['cohort'])
+        if time.monotonic() - last >= every or start >= num_patients:
+            state = {'settings': settings, 'chunks': chunks, 'cursor': start, 'entropy': entropy,
+                     'vocabularies': {column: list(vocabulary) for column, vocabulary in vocabularies.items()}}
+            _save_state(directory, state, synced, chunks)
+            synced = chunks
+            last = time.monotonic()
+        yield chunk
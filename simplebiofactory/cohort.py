@@ -0,0 +1,228 @@
+from collections.abc import Mapping
+
+import numpy as np
+
+from simplebiofactory import bitsets
+
+# Health states in code order (code 0 is 'Poor')
+HEALTH_STATES = ('Poor', 'Fair', 'Good')
+
+# Biomarker ranges used by the scripts that simulate biomarkers (upper bound exclusive)
+SYSTOLIC_RANGE = (90, 170)
+DIASTOLIC_RANGE = (60, 100)
+CHOLESTEROL_RANGE = (120, 240)
+
+
+# Gene names from a list of names, a dict keyed by name (like GENES) or a count of unnamed genes
+def gene_names(genes):
+    if isinstance(genes, int):
+        return [f'Gene{i}' for i in range(1, genes + 1)]
+    return list(genes)
+
+
+# Smallest unsigned dtype able to hold codes for a vocabulary of the given size
+def code_dtype(size):
+    return np.uint8 if size <= 256 else np.uint16
+
+
+# A whole cohort of simulated patients stored as arrays (one row per patient).
+# genetics is a float32 patients x genes matrix or a genotypes store (genotypes.SparseGenotypes or
+# QuantizedGenotypes) for large panels; the rule engine reads it through gene_values(), genetics_at()
+# and genetics_mean(), which decode only the columns they touch.
+class Cohort:
+    def __init__(self, genes, genetics, conditions, medical_history, current_health,
+                 systolic, diastolic, cholesterol, allergy_names=(), allergies=None):
+        self.genes = tuple(genes)
+        self.genotypes = None if isinstance(genetics, np.ndarray) else genetics
+        self._genetics = genetics if self.genotypes is None else None
+        self.conditions = tuple(conditions)
+        self.medical_history = medical_history  # condition codes, patients x history size
+        self.current_health = current_health  # codes into HEALTH_STATES
+        self.systolic = systolic
+        self.diastolic = diastolic
+        self.cholesterol = cholesterol
+        self.allergy_names = tuple(allergy_names)
+        if allergies is None:
+            allergies = np.zeros((len(current_health), 0), dtype=np.uint8)
+        self.allergies = allergies  # allergy codes, patients x allergy count
+
+        self.gene_index = {gene: i for i, gene in enumerate(self.genes)}
+        self._condition_array = np.array(self.conditions, dtype=object)
+        self._allergy_array = np.array(self.allergy_names, dtype=object)
+        self._history_bits = None
+        self._allergy_bits = None
+
+    def __len__(self):
+        return len(self.current_health)
+
+    # Genetics as a dense patients x genes matrix (decodes every gene of a genotypes store)
+    @property
+    def genetics(self):
+        if self._genetics is None:
+            return self.genotypes.dense()
+        return self._genetics
+
+    # Values of one gene column (by index), for all patients or the given rows
+    def gene_values(self, column, rows=None):
+        if self.genotypes is not None:
+            return self.genotypes.column(column, rows)
+        if rows is None:
+            return self._genetics[:, column]
+        return self._genetics[rows, column]
+
+    # Values at (rows[i], columns[i]) pairs
+    def genetics_at(self, rows, columns):
+        if self.genotypes is not None:
+            return self.genotypes.values_at(rows, columns)
+        return self._genetics[rows, columns]
+
+    # Mean genetic value of each patient
+    def genetics_mean(self):
+        if self.genotypes is not None:
+            return self.genotypes.row_means()
+        return self._genetics.mean(axis=1)
+
+    # Medical history as a patients x words uint64 bitset over self.conditions (encoded on first use)
+    @property
+    def history_bits(self):
+        if self._history_bits is None:
+            self._history_bits = bitsets.encode_codes(self.medical_history, len(self.conditions))
+        return self._history_bits
+
+    # Allergies as a patients x words uint64 bitset over self.allergy_names (encoded on first use)
+    @property
+    def allergy_bits(self):
+        if self._allergy_bits is None:
+            self._allergy_bits = bitsets.encode_codes(self.allergies, len(self.allergy_names))
+        return self._allergy_bits
+
+    # Patients whose medical history contains any of the given conditions
+    def has_any_condition(self, conditions):
+        return bitsets.has_any(self.history_bits, bitsets.names_mask(self.conditions, conditions))
+
+    # Patients whose medical history contains all of the given conditions
+    def has_all_conditions(self, conditions):
+        return bitsets.has_all(self.history_bits, bitsets.names_mask(self.conditions, conditions))
+
+    # Column of genetic values for one gene (a view, not a copy, for a dense matrix)
+    def gene(self, gene):
+        return self.gene_values(self.gene_index[gene])
+
+    # Per-patient dict-like view over one row, for code written against generate_patient_data()
+    def patient(self, index):
+        return PatientView(self, index)
+
+    # Medical history as a patients x history size array of condition names
+    def history_names(self):
+        return self._condition_array[self.medical_history]
+
+    # Medical history of each patient joined into one string, e.g. 'Allergy, Diabetes'
+    def history_text(self):
+        names = self.history_names()
+        if names.shape[1] == 0:
+            return np.full(len(self), '', dtype=object)
+        text = names[:, 0]
+        for column in range(1, names.shape[1]):
+            text = text + ', ' + names[:, column]
+        return text
+
+    def patients(self):
+        for index in range(len(self)):
+            yield PatientView(self, index)
+
+    # Cohort restricted to a slice or index array of patients
+    def take(self, rows):
+        genetics = self._genetics[rows] if self.genotypes is None else self.genotypes.take(rows)
+        taken = Cohort(self.genes, genetics, self.conditions, self.medical_history[rows],
+                       self.current_health[rows], self.systolic[rows], self.diastolic[rows],
+                       self.cholesterol[rows], self.allergy_names, self.allergies[rows])
+        if self._history_bits is not None:
+            taken._history_bits = self._history_bits[rows]
+        if self._allergy_bits is not None:
+            taken._allergy_bits = self._allergy_bits[rows]
+        return taken
+
+
+# Read-only mapping of gene name -> value over one row of the genetics matrix
+class GeneticsView(Mapping):
+    def __init__(self, cohort, index):
+        if cohort.genotypes is None:
+            self._row = cohort.genetics[index]
+        else:
+            self._row = cohort.genotypes.values_at(index, np.arange(len(cohort.genes)))
+        self._gene_index = cohort.gene_index
+
+    def __getitem__(self, gene):
+        return self._row[self._gene_index[gene]]
+
+    def __iter__(self):
+        return iter(self._gene_index)
+
+    def __len__(self):
+        return len(self._gene_index)
+
+    def __contains__(self, gene):
+        return gene in self._gene_index
+
+
+# Read-only view with the same keys as the dict returned by generate_patient_data()
+class PatientView(Mapping):
+    _KEYS = ('genetics', 'medical_history', 'current_health', 'biomarkers', 'allergies')
+
+    def __init__(self, cohort, index):
+        self._cohort = cohort
+        self._index = index
+
+    def __getitem__(self, key):
+        cohort, index = self._cohort, self._index
+        if key == 'genetics':
+            return GeneticsView(cohort, index)
+        if key == 'medical_history':
+            return cohort._condition_array[cohort.medical_history[index]]
+        if key == 'current_health':
+            return HEALTH_STATES[cohort.current_health[index]]
+        if key == 'biomarkers':
+            return {
+                'cholesterol_level': int(cohort.cholesterol[index]),
+                'blood_pressure': {'systolic': int(cohort.systolic[index]),
+                                   'diastolic': int(cohort.diastolic[index])},
+            }
+        if key == 'allergies':
+            return cohort._allergy_array[cohort.allergies[index]]
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self._KEYS)
+
+    def __len__(self):
+        return len(self._KEYS)
+
+
+# Function to generate a whole cohort of simulated patients in one call (genes as for gene_names()).
+# genotypes (a genotypes store of num_patients patients) replaces the simulated genetics and its genes the given ones.
+def generate_cohort(num_patients, genes, conditions, history_size=2, allergy_names=(),
+                    allergy_size=2, rng=None, genotypes=None):
+    if rng is None:
+        rng = np.random.default_rng()
+    conditions = list(conditions)
+
+    if genotypes is None:
+        genes = gene_names(genes)
+        genetics = rng.random((num_patients, len(genes)), dtype=np.float32)
+    elif len(genotypes) != num_patients:
+        raise ValueError(f'The genotypes hold {len(genotypes)} patients, not {num_patients}')
+    else:
+        genes, genetics = genotypes.genes, genotypes
+    medical_history = rng.integers(0, len(conditions), (num_patients, history_size),
+                                   dtype=code_dtype(len(conditions)))
+    current_health = rng.integers(0, len(HEALTH_STATES), num_patients, dtype=np.uint8)
+    systolic = rng.integers(*SYSTOLIC_RANGE, num_patients, dtype=np.int16)
+    diastolic = rng.integers(*DIASTOLIC_RANGE, num_patients, dtype=np.int16)
+    cholesterol = rng.integers(*CHOLESTEROL_RANGE, num_patients, dtype=np.int16)
+    allergies = None
+    if allergy_names:
+        allergies = rng.integers(0, len(allergy_names), (num_patients, allergy_size),
+                                 dtype=code_dtype(len(allergy_names)))
+
+    return Cohort(genes, genetics, conditions, medical_history, current_health,
+                  systolic, diastolic, cholesterol, allergy_names, allergies)
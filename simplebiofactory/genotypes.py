@@ -0,0 +1,274 @@
+import numpy as np
+
+from simplebiofactory.cohort import gene_names
+
+# Compact genotype stores for large variant panels (tens of thousands of genes per patient).
+# Both stores quantize values in [0, 1] to `bits`-bit codes (value = code / (2 ** bits - 1), so 8 bits
+# match records.quantize_genetics) and are variant-major, so one gene's column is a contiguous read:
+#   QuantizedGenotypes  dense codes packed 8 // bits to a byte (2 bits: 1M patients x 20k variants = 5 GB)
+#   SparseGenotypes     CSC arrays holding only the values that differ from a reference baseline
+#                       (1M x 20k at 1% non-baseline = 200M entries, 1 GB as uint32 rows + uint8 codes)
+# A Cohort built over a store (generate_cohort(..., genotypes=store)) hands the rule engine single
+# columns or (patient, gene) values on demand, so only the genes the rules reference are decoded;
+# referenced_genes() lists them for a profile and select() narrows a store to them. Manufacturing and
+# screening tables address genes by position, so build them over the cohort's genes (the store's).
+
+BITS = (2, 4, 8)
+
+
+def _check_bits(bits):
+    if bits not in BITS:
+        raise ValueError(f'Genotype codes must have one of {BITS} bits, not {bits}')
+    return (1 << bits) - 1
+
+
+# Function to quantize values in [0, 1] to codes of the given width
+def quantize(values, bits=8):
+    scale = _check_bits(bits)
+    return np.rint(np.clip(values, 0.0, 1.0) * scale).astype(np.uint8)
+
+
+# Gene names a profile reads genetic values of: the gene_impact genes, the manufacturing dosage genes,
+# the screening blocker genes and the outcome gene. None when the rules read every gene
+# (mean genetics in a chain, or an outcome gene drawn at random per patient).
+def referenced_genes(profile):
+    if any(predicate[0] == 'mean_genetics_above'
+           for _, predicates in profile.get('chain', ()) for predicate in predicates):
+        return None
+    if 'outcome' in profile and profile['outcome']['gene'] is None:
+        return None
+    genes = list(profile.get('gene_impact', ()))
+    genes += [entry['dosage_gene'] for entry in profile['manufacturing'] if entry.get('dosage_gene')]
+    genes += [entry['gene'] for entry in profile.get('screening', {}).get('blockers', ()) if 'gene' in entry]
+    if 'outcome' in profile:
+        genes.append(profile['outcome']['gene'])
+    return list(dict.fromkeys(genes))
+
+
+# Base class of the stores: subclasses decode codes with _column_codes() and _codes_at()
+class GenotypeStore:
+    def __init__(self, genes, num_patients, bits):
+        self.genes = tuple(genes)
+        self.gene_index = {gene: i for i, gene in enumerate(self.genes)}
+        self.num_patients = num_patients
+        self.bits = bits
+        self.scale = _check_bits(bits)
+
+    def __len__(self):
+        return self.num_patients
+
+    def _values(self, codes):
+        return codes.astype(np.float32) / np.float32(self.scale)
+
+    # Values of one gene column (by index) for all patients or the given rows
+    def column(self, column, rows=None):
+        return self._values(self._column_codes(column, rows))
+
+    # Values at (rows[i], columns[i]) pairs
+    def values_at(self, rows, columns):
+        rows, columns = np.broadcast_arrays(np.asarray(rows), np.asarray(columns))
+        return self._values(self._codes_at(rows.ravel(), columns.ravel())).reshape(rows.shape)
+
+    # Mean over all genes of each patient, decoded one column at a time
+    def row_means(self):
+        total = np.zeros(self.num_patients, dtype=np.float64)
+        for column in range(len(self.genes)):
+            total += self._column_codes(column, None)
+        return (total / (self.scale * len(self.genes))).astype(np.float32)
+
+    # Patients x genes float32 matrix (all genes by default; only sensible for small panels)
+    def dense(self, columns=None):
+        if columns is None:
+            columns = range(len(self.genes))
+        out = np.empty((self.num_patients, len(columns)), dtype=np.float32)
+        for j, column in enumerate(columns):
+            out[:, j] = self.column(column)
+        return out
+
+
+class QuantizedGenotypes(GenotypeStore):
+    # packed: variants x bytes uint8, patient p of variant v in byte p // per_byte at bit (p % per_byte) * bits
+    def __init__(self, packed, genes, num_patients, bits=8):
+        super().__init__(genes, num_patients, bits)
+        self.per_byte = 8 // bits
+        self.packed = packed
+
+    @classmethod
+    def from_codes(cls, codes, genes, bits=8):
+        codes = np.asarray(codes, dtype=np.uint8)  # patients x genes
+        per_byte = 8 // bits
+        num_patients = len(codes)
+        padded = np.zeros((codes.shape[1], -(-num_patients // per_byte) * per_byte), dtype=np.uint8)
+        padded[:, :num_patients] = codes.T
+        padded = padded.reshape(len(padded), -1, per_byte)
+        packed = np.zeros(padded.shape[:2], dtype=np.uint8)
+        for slot in range(per_byte):
+            packed |= padded[:, :, slot] << np.uint8(slot * bits)
+        return cls(packed, genes, num_patients, bits)
+
+    @classmethod
+    def from_dense(cls, genetics, genes=None, bits=8):
+        genetics = np.asarray(genetics)
+        return cls.from_codes(quantize(genetics, bits), gene_names(genes or genetics.shape[1]), bits)
+
+    @property
+    def nbytes(self):
+        return self.packed.nbytes
+
+    def _column_codes(self, column, rows):
+        if rows is None:
+            shifts = np.arange(0, 8, self.bits, dtype=np.uint8)
+            codes = (self.packed[column][:, None] >> shifts) & np.uint8(self.scale)
+            return codes.ravel()[:self.num_patients]
+        rows = np.asarray(rows)
+        return self._codes_at(rows, np.full(len(rows), column))
+
+    def _codes_at(self, rows, columns):
+        if self.bits == 8:
+            return self.packed[columns, rows]
+        shift = ((rows % self.per_byte) * self.bits).astype(np.uint8)
+        return (self.packed[columns, rows // self.per_byte] >> shift) & np.uint8(self.scale)
+
+    # Store restricted to some genes (names), sharing no codes with this one
+    def select(self, genes):
+        columns = [self.gene_index[gene] for gene in genes]
+        return QuantizedGenotypes(self.packed[columns], genes, self.num_patients, self.bits)
+
+    # Store restricted to some patients
+    def take(self, rows):
+        rows = np.arange(self.num_patients)[rows]
+        codes = np.zeros((len(rows), len(self.genes)), dtype=np.uint8)
+        for column in range(len(self.genes)):
+            codes[:, column] = self._column_codes(column, rows)
+        return QuantizedGenotypes.from_codes(codes, self.genes, self.bits)
+
+
+class SparseGenotypes(GenotypeStore):
+    # CSC layout: the entries of variant v are rows[indptr[v]:indptr[v + 1]] (ascending patients)
+    # with codes at the same positions; every other patient has the baseline code
+    def __init__(self, indptr, rows, codes, genes, num_patients, baseline=0, bits=8):
+        super().__init__(genes, num_patients, bits)
+        self.indptr = indptr
+        self.rows = rows
+        self.codes = codes
+        self.baseline = baseline
+
+    @classmethod
+    def from_dense(cls, genetics, genes=None, baseline=0.0, bits=8):
+        genetics = np.asarray(genetics)
+        codes = quantize(genetics, bits).T  # variants x patients
+        baseline = int(quantize(baseline, bits))
+        variant, rows = np.nonzero(codes != baseline)
+        indptr = np.zeros(len(codes) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(variant, minlength=len(codes)), out=indptr[1:])
+        return cls(indptr, rows.astype(np.uint32), codes[variant, rows], gene_names(genes or genetics.shape[1]),
+                   genetics.shape[0], baseline, bits)
+
+    @property
+    def nbytes(self):
+        return self.indptr.nbytes + self.rows.nbytes + self.codes.nbytes
+
+    # Number of stored (non-baseline) values
+    @property
+    def nnz(self):
+        return len(self.rows)
+
+    def _column_codes(self, column, rows):
+        entries = slice(self.indptr[column], self.indptr[column + 1])
+        if rows is None:
+            out = np.full(self.num_patients, self.baseline, dtype=np.uint8)
+            out[self.rows[entries]] = self.codes[entries]
+            return out
+        return self._lookup(self.rows[entries], self.codes[entries], np.asarray(rows))
+
+    def _lookup(self, entry_rows, entry_codes, rows):
+        out = np.full(len(rows), self.baseline, dtype=np.uint8)
+        if len(entry_rows):
+            position = np.minimum(np.searchsorted(entry_rows, rows), len(entry_rows) - 1)
+            found = entry_rows[position] == rows
+            out[found] = entry_codes[position[found]]
+        return out
+
+    # One binary search per pair, grouped by column
+    def _codes_at(self, rows, columns):
+        out = np.empty(len(rows), dtype=np.uint8)
+        order = np.argsort(columns, kind='stable')
+        bounds = np.flatnonzero(np.diff(columns[order])) + 1
+        for group in np.split(order, bounds):
+            if len(group):
+                entries = slice(self.indptr[columns[group[0]]], self.indptr[columns[group[0]] + 1])
+                out[group] = self._lookup(self.rows[entries], self.codes[entries], rows[group])
+        return out
+
+    # Sum of the stored deviations per patient (block genes at a time) plus the baseline for every gene
+    def row_means(self, block=256):
+        total = np.full(self.num_patients, float(self.baseline) * len(self.genes))
+        for start in range(0, len(self.genes), block):
+            entries = slice(self.indptr[start], self.indptr[min(start + block, len(self.genes))])
+            total += np.bincount(self.rows[entries], weights=self.codes[entries].astype(np.float64) - self.baseline,
+                                 minlength=self.num_patients)
+        return (total / (self.scale * len(self.genes))).astype(np.float32)
+
+    def select(self, genes):
+        columns = [self.gene_index[gene] for gene in genes]
+        lengths = np.diff(self.indptr)[columns]
+        entries = np.concatenate([np.arange(self.indptr[column], self.indptr[column + 1]) for column in columns]
+                                 or [np.zeros(0, dtype=np.int64)])
+        indptr = np.zeros(len(columns) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        return SparseGenotypes(indptr, self.rows[entries], self.codes[entries], genes, self.num_patients,
+                               self.baseline, self.bits)
+
+    def take(self, rows):
+        rows = np.arange(self.num_patients)[rows]
+        indptr, kept_rows, kept_codes = [0], [], []
+        for column in range(len(self.genes)):
+            codes = self._column_codes(column, rows)
+            kept = np.flatnonzero(codes != self.baseline)
+            kept_rows.append(kept.astype(np.uint32))
+            kept_codes.append(codes[kept])
+            indptr.append(indptr[-1] + len(kept))
+        return SparseGenotypes(np.array(indptr, dtype=np.int64), np.concatenate(kept_rows),
+                               np.concatenate(kept_codes), self.genes, len(rows), self.baseline, self.bits)
+
+
+# Function to simulate a sparse panel: each value differs from the baseline code with probability density,
+# taking a uniformly drawn non-baseline code. Built column by column, never as a dense matrix.
+def random_panel(num_patients, genes, density=0.01, baseline=0.0, bits=8, rng=None):
+    if rng is None:
+        rng = np.random.default_rng()
+    genes = gene_names(genes)
+    scale = _check_bits(bits)
+    baseline = int(quantize(baseline, bits))
+    counts = rng.binomial(num_patients, density, len(genes))
+    indptr = np.zeros(len(genes) + 1, dtype=np.int64)
+    rows = np.empty(counts.sum(), dtype=np.uint32)
+    for column, count in enumerate(counts):
+        # Draws with replacement, deduplicated: the few collisions only lower the density slightly
+        drawn = np.unique(rng.integers(0, num_patients, count, dtype=np.uint32))
+        rows[indptr[column]:indptr[column] + len(drawn)] = drawn
+        indptr[column + 1] = indptr[column] + len(drawn)
+    rows = rows[:indptr[-1]]
+    codes = rng.integers(0, scale, len(rows), dtype=np.uint8)
+    codes += codes >= baseline  # Skip the baseline code
+    return SparseGenotypes(indptr, rows, codes, genes, num_patients, baseline, bits)
+
+
+# Function to save a store to an .npz file
+def save_genotypes(store, path):
+    arrays = {'genes': np.array(store.genes), 'num_patients': store.num_patients, 'bits': store.bits}
+    if isinstance(store, SparseGenotypes):
+        arrays.update(indptr=store.indptr, rows=store.rows, codes=store.codes, baseline=store.baseline)
+    else:
+        arrays.update(packed=store.packed)
+    np.savez(path, **arrays)
+
+
+# Function to load a store saved by save_genotypes()
+def load_genotypes(path):
+    with np.load(path) as data:
+        genes, num_patients, bits = data['genes'].tolist(), int(data['num_patients']), int(data['bits'])
+        if 'packed' in data.files:
+            return QuantizedGenotypes(data['packed'], genes, num_patients, bits)
+        return SparseGenotypes(data['indptr'], data['rows'], data['codes'], genes, num_patients,
+                               int(data['baseline']), bits)
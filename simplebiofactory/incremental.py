@@ -0,0 +1,315 @@
+import json
+
+import numpy as np
+
+from simplebiofactory.cohort import HEALTH_STATES, Cohort, code_dtype, gene_names
+from simplebiofactory.manufacturing import ManufacturingTable, intern
+from simplebiofactory.profiles import PROFILES
+from simplebiofactory.records import CODE_DTYPE, RecordBuilder
+from simplebiofactory.rules import KEEP, GeneImpactRules, TherapyTableRules, compile_rules
+from simplebiofactory.screening import Screening
+
+# Incremental re-evaluation of an evaluated cohort after an edit of its rule tables.
+# The engine keeps the cohort, the genes drawn by gene_impact rules and the values drawn for random drug
+# blocker tests (so a re-evaluation replays the same draws) and every rule column as codes. Draws come from
+# one Generator seeded by seed, and its state is saved with the engine.
+# Each rule entry has a key, and a DependencyIndex maps keys to the patients whose result depends on them:
+#   gene_impact[gene][condition]   key gene x condition   patients that drew gene for condition
+#   THERAPIES (2.3)                key condition          patients with condition in their history
+#   biomanufacturing entries       key therapy            patients whose selected therapy it is
+# Selected_Therapy holds the screened therapy (see screening.Screening); the therapy the rules selected,
+# which biomanufacturing works from, is kept in self.therapy.
+# An edit compiles the new tables, compares them with the old ones entry by entry and evaluates only
+# the patients behind the changed keys again. The returned ChangeSet lists the records that changed,
+# which patch_frame() writes into a stored patient database.
+# The draws behind a database only exist in its engine: a database from the pipeline (api.simulate) or
+# storage.save_database cannot be re-evaluated. Build the engine from the cohort, store its to_frame(),
+# keep the engine with save() and apply later edits to IncrementalEngine.load(path).
+
+RULE_COLUMNS = ('Selected_Therapy', 'Engineered_Microorganism', 'Bioreactor_Process', 'Dosage_Adjustment')
+
+
+# Inverted index from small integer keys to rows (CSR layout: rows sorted by key, offsets per key).
+# keys is a rows x slots array; negative keys are skipped.
+class DependencyIndex:
+    def __init__(self, keys, num_keys):
+        keys = np.asarray(keys).reshape(len(keys), -1)
+        flat = keys.ravel()
+        valid = flat >= 0
+        # Keys that fit in 16 bits sort with NumPy's stable radix sort (linear time); missing keys sort last
+        sort_keys = np.where(valid, flat, num_keys).astype(np.uint16 if num_keys < 1 << 16 else np.int64)
+        order = np.argsort(sort_keys, kind='stable')[:np.count_nonzero(valid)]
+        # Positions in the flattened array divide back into rows, which avoids a random gather
+        self.rows = (order // keys.shape[1]).astype(np.int32 if len(keys) < 1 << 31 else np.int64)
+        flat = flat[valid] if not valid.all() else flat
+        self.offsets = np.zeros(num_keys + 1, dtype=np.int64)
+        np.cumsum(np.bincount(flat, minlength=num_keys), out=self.offsets[1:])
+
+    # Sorted unique rows that depend on any of the keys
+    def rows_for(self, keys):
+        keys = [key for key in np.asarray(keys, dtype=np.int64).tolist() if 0 <= key < len(self.offsets) - 1]
+        if not keys:
+            return np.zeros(0, dtype=np.int64)
+        return np.unique(np.concatenate([self.rows[self.offsets[key]:self.offsets[key + 1]] for key in keys]))
+
+
+# The records changed by one edit: their rows and the codes of every rule column before and after
+class ChangeSet:
+    def __init__(self, rows, evaluated, before, after, vocabularies):
+        self.rows = rows  # Row indices (0-based) of the records that changed
+        self.evaluated = evaluated  # Number of rows evaluated again to find them
+        self.before = before  # column -> codes of the changed rows
+        self.after = after
+        self.vocabularies = vocabularies  # column -> names the codes index
+
+    def __len__(self):
+        return len(self.rows)
+
+    # Names of a column's values after (or before) the edit, None for missing values
+    def values(self, column, before=False):
+        codes = (self.before if before else self.after)[column]
+        return np.array(list(self.vocabularies[column]) + [None], dtype=object)[codes]
+
+    # DataFrame of the changed records: Patient_ID, then '<column>_Before' and '<column>' per changed column
+    def frame(self):
+        import pandas as pd
+        columns = {'Patient_ID': self.rows + 1}
+        for column in RULE_COLUMNS:
+            if (self.before[column] != self.after[column]).any():
+                columns[f'{column}_Before'] = self.values(column, before=True)
+                columns[column] = self.values(column)
+        return pd.DataFrame(columns)
+
+
+class IncrementalEngine:
+    def __init__(self, version, cohort, seed=None, overrides=None, drawn_genes=None, blocker_draws=None, therapy=None,
+                 columns=None, vocabularies=None):
+        self.version = version
+        self.overrides = dict(overrides or {})  # Edited profile entries, e.g. {'gene_impact': {...}}
+        self.profile = dict(PROFILES[version], **self.overrides)
+        self.cohort = cohort
+        self.rng = np.random.default_rng(seed)
+        self.genes = gene_names(self.profile['genes'])
+        self.vocabularies = vocabularies or {column: [] for column in RULE_COLUMNS}
+        self.rules = compile_rules(self.profile)
+        self.drawn_genes = drawn_genes
+        if isinstance(self.rules, GeneImpactRules) and drawn_genes is None:
+            self.drawn_genes = self.rules.draw(cohort, self.rng).astype(code_dtype(len(self.rules.genes)))
+        self.blocker_draws = blocker_draws
+        self.table = self._manufacturing_table()
+        self.screening = self._screening()
+        self._indexes = {}
+        if columns is None:
+            rows = np.arange(len(cohort))
+            therapy = self._select(rows)
+            columns = {'Selected_Therapy': self._render(rows, therapy)}
+            columns.update(self._manufacture(rows, therapy))
+        self.therapy = therapy
+        self.columns = columns
+
+    # Remap array from a rules or table vocabulary to the engine's vocabulary of a column (extra -1 for missing)
+    def _remap(self, column, vocabulary):
+        return np.array([intern(self.vocabularies[column], value) for value in vocabulary] + [-1],
+                        dtype=CODE_DTYPE)
+
+    # Biomanufacturing over the engine's therapy vocabulary, so stored therapy codes index it directly
+    def _manufacturing_table(self):
+        self._remap('Selected_Therapy', self.rules.therapies)
+        return ManufacturingTable(self.profile['manufacturing'], self.vocabularies['Selected_Therapy'], self.genes)
+
+    def _screening(self):
+        if 'screening' not in self.profile:
+            return None
+        return Screening(self.profile['screening'], self.vocabularies['Selected_Therapy'], self.genes)
+
+    # Therapy codes for rows, replaying the stored gene draws
+    def _select(self, rows):
+        cohort = self.cohort.take(rows)
+        if isinstance(self.rules, GeneImpactRules):
+            codes = self.rules.select(cohort, drawn_genes=self.drawn_genes[rows])
+        else:
+            codes = self.rules.select(cohort)
+        return self._remap('Selected_Therapy', self.rules.therapies)[codes]
+
+    # Screened (output) therapy codes for rows with the given therapy codes, replaying the stored blocker draws
+    def _render(self, rows, therapy):
+        if self.screening is None:
+            return therapy
+        if self.blocker_draws is None:
+            self.blocker_draws = self.screening.draw(len(self.cohort), self.rng)
+        result = self.screening.screen(self.cohort.take(rows), therapy, draws=self.blocker_draws[rows])
+        return self._remap('Selected_Therapy', self.screening.output_names())[self.screening.output_codes(result)]
+
+    # Microorganism, process and dosage codes for rows with the given therapy codes
+    def _manufacture(self, rows, therapy):
+        codes = self.table.apply(self.cohort.take(rows), therapy)
+        vocabularies = (self.table.microorganisms, self.table.processes, self.table.dosages)
+        return {column: self._remap(column, vocabulary)[column_codes]
+                for column, column_codes, vocabulary in zip(RULE_COLUMNS[1:], codes, vocabularies)}
+
+    def _index(self, name):
+        if name not in self._indexes:
+            history = self.cohort.medical_history
+            if name == 'gene_condition':
+                keys = self.drawn_genes.astype(np.int64) * len(self.cohort.conditions) + history
+                index = DependencyIndex(keys, len(self.rules.genes) * len(self.cohort.conditions))
+            elif name == 'condition':
+                index = DependencyIndex(history, len(self.cohort.conditions))
+            else:
+                index = DependencyIndex(self.therapy, len(self.vocabularies['Selected_Therapy']))
+            self._indexes[name] = index
+        return self._indexes[name]
+
+    # Table of therapy codes (engine vocabulary, -1 for KEEP) of compiled table rules
+    def _rule_table(self, rules):
+        return np.where(rules.table == KEEP, -1, self._remap('Selected_Therapy', rules.therapies)[rules.table])
+
+    # Rows whose selected therapy can change between two compiled rule sets
+    def _affected_by_rules(self, old, new):
+        if old.therapies[old.default_code] != new.therapies[new.default_code]:
+            return np.arange(len(self.cohort))
+        changed = self._rule_table(old) != self._rule_table(new)
+        if isinstance(new, GeneImpactRules):
+            genes, conditions = np.nonzero(changed)
+            return self._index('gene_condition').rows_for(genes * len(self.cohort.conditions) + conditions)
+        return self._index('condition').rows_for(np.flatnonzero(changed))
+
+    # Rows whose biomanufacturing can change between two tables
+    def _affected_by_table(self, old, new):
+        changed = [code for code in range(len(new.therapies))
+                   if _table_signature(old, code) != _table_signature(new, code)]
+        return self._index('therapy').rows_for(changed)
+
+    # Function to apply an edit of the version's tables. Keyword arguments replace profile entries
+    # (gene_impact=..., missing_gene=..., therapies=..., manufacturing=..., screening=...); returns the ChangeSet.
+    def update(self, **tables):
+        profile = dict(self.profile, **tables)
+        rules = self.rules
+        if any(name not in ('manufacturing', 'screening') for name in tables):
+            rules = compile_rules(profile)
+            if not isinstance(rules, (GeneImpactRules, TherapyTableRules)):
+                raise ValueError(f'Version {self.version} selects therapies with an if/elif chain, '
+                                 'which has no per-entry dependencies; simulate the cohort again instead')
+            if isinstance(rules, GeneImpactRules) and rules.genes != self.rules.genes:
+                raise ValueError('The edit changes the genes drawn from; simulate the cohort again instead')
+        self.overrides.update(tables)
+        self.profile = profile
+        old_rules, old_table = self.rules, self.table
+        self.rules = rules
+        self.table = self._manufacturing_table()
+        self.screening = self._screening()
+
+        reselect = np.zeros(0, dtype=np.int64)
+        if rules is not old_rules:
+            reselect = self._affected_by_rules(old_rules, rules)
+        rerender = np.arange(len(self.cohort)) if 'screening' in tables else reselect
+        rows = np.union1d(rerender, self._affected_by_table(old_table, self.table)).astype(np.int64)
+
+        before = {column: self.columns[column][rows] for column in RULE_COLUMNS}
+        therapy = self.therapy[rows]
+        if len(reselect):
+            therapy[np.searchsorted(rows, reselect)] = self._select(reselect)
+        # Rows only affected by biomanufacturing keep their screened therapy
+        after = {'Selected_Therapy': before['Selected_Therapy'].copy()}
+        if len(rerender):
+            positions = np.searchsorted(rows, rerender)
+            after['Selected_Therapy'][positions] = self._render(rerender, therapy[positions])
+        after.update(self._manufacture(rows, therapy))
+
+        changed = np.zeros(len(rows), dtype=bool)
+        for column in RULE_COLUMNS:
+            changed |= before[column] != after[column]
+            self.columns[column][rows] = after[column]
+        if (self.therapy[rows] != therapy).any():
+            self.therapy[rows] = therapy
+            self._indexes.pop('therapy', None)
+        return ChangeSet(rows[changed], len(rows),
+                         {column: codes[changed] for column, codes in before.items()},
+                         {column: codes[changed] for column, codes in after.items()},
+                         {column: list(vocabulary) for column, vocabulary in self.vocabularies.items()})
+
+    # Function to write the changed records of a ChangeSet into a patient database built from this engine's
+    # to_frame() (in the row order of the cohort, e.g. saved with storage.save_database and loaded again).
+    # Raises ValueError when the changed records do not hold the values the engine had before the edit.
+    def patch_frame(self, patient_database, changes):
+        import pandas as pd
+        if len(patient_database) != len(self.cohort):
+            raise ValueError(f'The patient database has {len(patient_database)} records, the engine '
+                             f'{len(self.cohort)}')
+        if not len(changes):
+            return patient_database
+        for column in RULE_COLUMNS:
+            if column not in patient_database:
+                continue
+            stored = patient_database[column].to_numpy(dtype=object)[changes.rows]
+            for value, before in zip(stored.tolist(), changes.values(column, before=True).tolist()):
+                if value != before and not (before is None and pd.isna(value)):
+                    raise ValueError(f'{column} of the patient database does not match the engine; only a database '
+                                     'from its to_frame(), patched with every earlier ChangeSet, can be patched')
+        for column in RULE_COLUMNS:
+            if column not in patient_database:
+                continue
+            values = changes.values(column)
+            series = patient_database[column]
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                new = [value for value in dict.fromkeys(values.tolist())
+                       if value is not None and value not in series.cat.categories]
+                if new:
+                    patient_database[column] = series.cat.add_categories(new)
+            patient_database.loc[patient_database.index[changes.rows], column] = values
+        return patient_database
+
+    # The patient database of the rule columns as currently evaluated (Outcome is not rule-dependent)
+    def to_frame(self):
+        categories = {column: (codes, self.vocabularies[column]) for column, codes in self.columns.items()}
+        categories['Current_Health'] = (self.cohort.current_health, list(HEALTH_STATES))
+        builder = RecordBuilder(len(self.cohort), self.genes, columns=list(categories))
+        builder.extend(np.arange(1, len(self.cohort) + 1), self.cohort.genetics,
+                       (self.cohort.medical_history, self.cohort.conditions), categories)
+        return builder.to_frame()
+
+    # Function to save the engine (cohort, gene and blocker draws, rule columns, edits and rng state)
+    # to an .npz file
+    def save(self, path):
+        cohort = self.cohort
+        state = {'version': self.version, 'overrides': self.overrides, 'vocabularies': self.vocabularies,
+                 'genes': list(cohort.genes), 'conditions': list(cohort.conditions),
+                 'allergy_names': list(cohort.allergy_names), 'rng': self.rng.bit_generator.state}
+        arrays = {f'column_{column}': codes for column, codes in self.columns.items()}
+        arrays['therapy'] = self.therapy
+        if self.drawn_genes is not None:
+            arrays['drawn_genes'] = self.drawn_genes
+        if self.blocker_draws is not None:
+            arrays['blocker_draws'] = self.blocker_draws
+        np.savez(path, state=np.array(json.dumps(state)), genetics=cohort.genetics,
+                 medical_history=cohort.medical_history, current_health=cohort.current_health,
+                 systolic=cohort.systolic, diastolic=cohort.diastolic, cholesterol=cohort.cholesterol,
+                 allergies=cohort.allergies, **arrays)
+
+    # Function to load an engine saved with save()
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            state = json.loads(str(data['state']))
+            cohort = Cohort(state['genes'], data['genetics'], state['conditions'], data['medical_history'],
+                            data['current_health'], data['systolic'], data['diastolic'], data['cholesterol'],
+                            state['allergy_names'], data['allergies'])
+            columns = {column: data[f'column_{column}'] for column in RULE_COLUMNS}
+            drawn_genes = data['drawn_genes'] if 'drawn_genes' in data else None
+            blocker_draws = data['blocker_draws'] if 'blocker_draws' in data else None
+            therapy = data['therapy']
+        rng = np.random.Generator(getattr(np.random, state['rng']['bit_generator'])())
+        rng.bit_generator.state = state['rng']
+        return cls(state['version'], cohort, rng, overrides=state['overrides'], drawn_genes=drawn_genes,
+                   blocker_draws=blocker_draws, therapy=therapy, columns=columns, vocabularies=state['vocabularies'])
+
+
+# Everything a biomanufacturing table decides for one therapy code, in a comparable form
+def _table_signature(table, code):
+    if code >= len(table.therapies):
+        return None
+    microorganism = table.microorganism_codes[code]
+    dosage_rules = [(gene, tiers.levels, tiers.labels[0]) for rule_code, gene, tiers, _ in table.dosage_rules
+                    if rule_code == code]
+    return (table.microorganisms[microorganism] if microorganism >= 0 else None,
+            table.processes[table.process_codes[code]], table.dosages[table.dosage_codes[code]], dosage_rules)
@@ -0,0 +1,165 @@
+import numpy as np
+
+from simplebiofactory.manufacturing import IDLE_PROCESS
+
+# Fed-batch bioreactor kinetics for many reactors at once.
+# Every reactor is one element of the state arrays (biomass, substrate, product, volume), and all
+# reactors advance together with explicit Euler steps:
+#   growth    mu = mu_max * S / (ks + S) * (1 - X / x_max)       Monod, capped by a logistic carrying capacity
+#   biomass   dX/dt = mu * X - D * X                             D = feed_rate / V (dilution by the feed)
+#   substrate dS/dt = -mu * X / yield_xs - maintenance * X + D * (s_feed - S)
+#   product   dP/dt = alpha * mu * X + beta * X - D * P          Luedeking-Piret
+#   volume    dV/dt = feed_rate while V < max_volume
+# A batch is harvested after batch_hours: its product (P * V) is added to the reactor's harvest and the
+# reactor is refilled with the initial state after turnaround_hours.
+# Units: hours, litres and grams per litre.
+
+DEFAULT_DT = 0.25  # Hours per step
+HOURS_PER_MONTH = 30 * 24
+
+DEFAULT_KINETICS = {
+    'mu_max': 0.4, 'ks': 0.5, 'x_max': 60.0, 'yield_xs': 0.5, 'maintenance': 0.01,
+    'alpha': 0.05, 'beta': 0.002, 's_feed': 400.0, 'feed_rate': 0.02, 'max_volume': 10.0,
+    'biomass': 0.1, 'substrate': 20.0, 'volume': 5.0, 'batch_hours': 72.0, 'turnaround_hours': 8.0,
+}
+
+# Processes that differ from DEFAULT_KINETICS (keyed by the bioreactor process of profiles.MANUFACTURING_*)
+PROCESS_KINETICS = {
+    'Bioreactor producing insulin': {'mu_max': 0.55, 'alpha': 0.08, 'batch_hours': 48.0},
+    'Bioreactor producing insulin and cholesterol medication': {'mu_max': 0.5, 'alpha': 0.07, 'batch_hours': 56.0},
+    'Bioreactor producing antihypertensive drug': {'alpha': 0.04, 'beta': 0.004},
+    'Bioreactor producing antihistamine': {'mu_max': 0.6, 'batch_hours': 40.0},
+    'Bioreactor producing oral diabetes medication': {'alpha': 0.06, 'batch_hours': 60.0},
+    'Bioreactor producing genetic therapy': {'mu_max': 0.15, 'x_max': 20.0, 'alpha': 0.01, 'beta': 0.01,
+                                            'batch_hours': 168.0, 'turnaround_hours': 24.0},
+    'Bioreactor producing EGFR inhibitor': {'mu_max': 0.3, 'alpha': 0.03, 'beta': 0.006, 'batch_hours': 96.0},
+}
+
+# Processes that never run a reactor
+IDLE_PROCESSES = (IDLE_PROCESS, 'No bioreactor needed')
+
+
+# Function to build per-process parameter arrays: parameter -> array indexed by process code
+def kinetics_table(processes, kinetics=PROCESS_KINETICS, default=DEFAULT_KINETICS):
+    table = {name: np.empty(len(processes)) for name in default}
+    for code, process in enumerate(processes):
+        parameters = dict(default, **kinetics.get(process, {}))
+        for name in default:
+            table[name][code] = parameters[name]
+    return table
+
+
+# A bank of reactors stepped together; reactor i runs processes[process_codes[i]]
+class Bioreactors:
+    def __init__(self, process_codes, processes, kinetics=PROCESS_KINETICS, default=DEFAULT_KINETICS):
+        self.processes = list(processes)
+        self.process_codes = np.asarray(process_codes)
+        if len(self.process_codes) and self.process_codes.min() < 0:
+            raise ValueError('Every reactor needs a bioreactor process (found a missing process code)')
+        table = kinetics_table(self.processes, kinetics, default)
+        self.parameters = {name: values[self.process_codes] for name, values in table.items()}
+        self.running = ~np.isin(np.array(self.processes, dtype=object), IDLE_PROCESSES)[self.process_codes]
+
+        size = len(self.process_codes)
+        self.biomass = np.zeros(size)
+        self.substrate = np.zeros(size)
+        self.product = np.zeros(size)
+        self.volume = np.zeros(size)
+        self.batch_age = np.zeros(size)  # Hours since the current batch was started (negative while turning around)
+        self.harvested = np.zeros(size)  # Grams of product harvested so far
+        self.batches = np.zeros(size, dtype=np.int64)
+        self.hours = 0.0
+        self._growth = np.empty(size)
+        self._scratch = np.empty(size)
+        self._dilution = np.empty(size)
+        self._refill(np.flatnonzero(self.running))
+
+    def __len__(self):
+        return len(self.process_codes)
+
+    # Reset reactors (an array of indices) to the initial state of a new batch
+    def _refill(self, reactors):
+        p = self.parameters
+        self.biomass[reactors] = p['biomass'][reactors]
+        self.substrate[reactors] = p['substrate'][reactors]
+        self.product[reactors] = 0.0
+        self.volume[reactors] = p['volume'][reactors]
+
+    # Harvest finished batches and start their turnaround
+    def _harvest(self):
+        reactors = np.flatnonzero(self.running & (self.batch_age >= self.parameters['batch_hours']))
+        if len(reactors) == 0:
+            return
+        self.harvested[reactors] += self.product[reactors] * self.volume[reactors]
+        self.batches[reactors] += 1
+        self.batch_age[reactors] = -self.parameters['turnaround_hours'][reactors]
+        self._refill(reactors)
+
+    # Advance every reactor by dt hours
+    def step(self, dt=DEFAULT_DT):
+        p = self.parameters
+        growing = self.running & (self.batch_age >= 0)
+        growth, scratch, dilution = self._growth, self._scratch, self._dilution
+
+        # Specific growth rate (Monod with logistic cap) times biomass, computed in place
+        np.add(p['ks'], self.substrate, out=scratch)
+        np.divide(self.substrate, scratch, out=growth)
+        np.multiply(growth, p['mu_max'], out=growth)
+        np.divide(self.biomass, p['x_max'], out=scratch)
+        np.subtract(1.0, scratch, out=scratch)
+        np.maximum(scratch, 0.0, out=scratch)
+        np.multiply(growth, scratch, out=growth)
+        np.multiply(growth, self.biomass, out=growth)
+        growth *= growing
+
+        # Feed until the reactor is full
+        np.multiply(p['feed_rate'], growing & (self.volume < p['max_volume']), out=dilution)
+        self.volume += dilution * dt
+        np.divide(dilution, self.volume, out=dilution, where=self.volume > 0)
+
+        # Substrate: consumption for growth and maintenance, dilution towards the feed concentration
+        np.subtract(p['s_feed'], self.substrate, out=scratch)
+        scratch *= dilution
+        scratch -= growth / p['yield_xs']
+        scratch -= p['maintenance'] * self.biomass * growing
+        self.substrate += scratch * dt
+        np.maximum(self.substrate, 0.0, out=self.substrate)
+
+        # Product (growth- and biomass-associated) and biomass, both diluted by the feed
+        self.product += (p['alpha'] * growth + p['beta'] * self.biomass * growing - dilution * self.product) * dt
+        self.biomass += (growth - dilution * self.biomass) * dt
+
+        self.batch_age[self.running] += dt
+        self.hours += dt
+        self._harvest()
+
+    # Function to run the reactors for a number of hours; with record_every, returns the product titer
+    # of every reactor sampled every record_every hours (rows are samples)
+    def run(self, hours, dt=DEFAULT_DT, record_every=None):
+        steps = int(round(hours / dt))
+        samples = []
+        sample_steps = int(round(record_every / dt)) if record_every else 0
+        for step in range(steps):
+            self.step(dt)
+            if sample_steps and (step + 1) % sample_steps == 0:
+                samples.append(self.product.copy())
+        return np.array(samples) if record_every else None
+
+    # Grams of product harvested per process (including the product in reactors still running)
+    def production(self, include_running=True):
+        total = self.harvested + (self.product * self.volume * (self.batch_age >= 0) if include_running else 0)
+        return dict(zip(self.processes, np.bincount(self.process_codes, weights=total,
+                                                    minlength=len(self.processes)).tolist()))
+
+    # Status text per reactor, as returned by bioreactor_automation()
+    def status(self):
+        processes = np.array(self.processes, dtype=object)[self.process_codes]
+        return np.where(self.running, processes, IDLE_PROCESS)
+
+
+# Function to plan production: one reactor for each of reactors_per_process per process, run for hours
+def simulate_production(processes, reactors_per_process=1, hours=HOURS_PER_MONTH, dt=DEFAULT_DT):
+    process_codes = np.repeat(np.arange(len(processes)), reactors_per_process)
+    reactors = Bioreactors(process_codes, processes)
+    reactors.run(hours, dt)
+    return reactors
@@ -0,0 +1,113 @@
+import numpy as np
+
+from simplebiofactory.tiers import Tiers
+
+IDLE_PROCESS = 'Bioreactor idle'
+STANDARD_DOSAGE = 'Standard dosage'
+NO_OUTCOME = 'No outcome data available'
+
+
+# Code of a value in a vocabulary list, appending it on first use (None is always -1, a missing value)
+def intern(vocabulary, value):
+    if value is None:
+        return -1
+    if value not in vocabulary:
+        vocabulary.append(value)
+    return vocabulary.index(value)
+
+
+# Function to check whether a biomanufacturing entry (see profiles.MANUFACTURING_*) applies to a therapy
+def entry_matches(entry, therapy):
+    if 'equals' in entry:
+        return therapy == entry['equals']
+    if 'contains' in entry:
+        return entry['contains'] in therapy
+    return entry['contains_lower'] in therapy.lower()
+
+
+# Compiled biomanufacturing: each therapy code maps to microorganism, process and dosage codes,
+# so the substring tests on the therapy name run once per therapy instead of once per patient
+class ManufacturingTable:
+    def __init__(self, entries, therapies, genes):
+        self.entries = list(entries)
+        self.therapies = list(therapies)
+        self.genes = list(genes)
+        self.microorganisms = []
+        self.processes = [IDLE_PROCESS]
+        self.dosages = [STANDARD_DOSAGE]
+        self._compiled = {}  # therapy name -> (microorganism, process, dosage codes, dosage gene, Tiers, remap)
+
+        compiled = [self._compile(therapy) for therapy in self.therapies]
+        self.microorganism_codes = np.array([codes[0] for codes in compiled], dtype=np.int16)
+        self.process_codes = np.array([codes[1] for codes in compiled], dtype=np.int16)
+        self.dosage_codes = np.array([codes[2] for codes in compiled], dtype=np.int16)
+        # (therapy code, dosage gene column, Tiers, tier code -> dosage code)
+        self.dosage_rules = [(code, self.genes.index(gene), tiers, remap)
+                             for code, (_, _, _, gene, tiers, remap) in enumerate(compiled) if tiers is not None]
+
+    # Codes and dosage tiers of one therapy name, from the first entry that applies to it
+    def _compile(self, therapy):
+        if therapy in self._compiled:
+            return self._compiled[therapy]
+        entry = next((entry for entry in self.entries if entry_matches(entry, therapy)), None)
+        compiled = (-1, 0, 0, None, None, None)
+        if entry is not None:
+            codes = (intern(self.microorganisms, entry.get('microorganism')),
+                     intern(self.processes, entry.get('process', IDLE_PROCESS)),
+                     intern(self.dosages, entry.get('dosage', STANDARD_DOSAGE)))
+            compiled = codes + (None, None, None)
+            dosage_gene = entry.get('dosage_gene')
+            if dosage_gene:
+                if dosage_gene not in self.genes:
+                    raise ValueError(f'Dosage gene {dosage_gene} for {therapy} is not in the genetic data')
+                tiers = Tiers(entry['dosage_levels'], entry.get('dosage', STANDARD_DOSAGE))
+                remap = np.array([intern(self.dosages, label) for label in tiers.labels], dtype=np.int16)
+                compiled = codes + (dosage_gene, tiers, remap)
+        self._compiled[therapy] = compiled
+        return compiled
+
+    # Microorganism, process and dosage names for one therapy name and one patient's genetics (a mapping
+    # of gene -> value, like a PatientView's); therapies outside self.therapies are compiled on first use
+    def lookup(self, therapy, genetics):
+        microorganism, process, dosage, gene, tiers, _ = self._compile(therapy)
+        return (self.microorganisms[microorganism] if microorganism >= 0 else None, self.processes[process],
+                tiers.label(genetics[gene]) if tiers is not None else self.dosages[dosage])
+
+    # Microorganism, process and dosage codes for a cohort and its selected therapy codes
+    def apply(self, cohort, therapy_codes):
+        microorganism = self.microorganism_codes[therapy_codes]
+        process = self.process_codes[therapy_codes]
+        dosage = self.dosage_codes[therapy_codes]
+        for code, gene, tiers, remap in self.dosage_rules:
+            rows = np.flatnonzero(therapy_codes == code)
+            if len(rows):
+                dosage[rows] = remap[tiers.assign(cohort.gene_values(gene, rows))]
+        return microorganism, process, dosage
+
+    # Microorganism, process and dosage names of apply()'s codes (None where no microorganism is engineered)
+    def names(self, codes):
+        microorganism, process, dosage = codes
+        # Code -1 indexes the trailing None
+        return (np.array(self.microorganisms + [None], dtype=object)[microorganism],
+                np.array(self.processes, dtype=object)[process], np.array(self.dosages, dtype=object)[dosage])
+
+
+# Compiled therapy outcome simulation (see profiles.OUTCOME_*)
+class OutcomeTable:
+    def __init__(self, outcome, genes):
+        self.genes = list(genes)
+        self.gene = outcome['gene']
+        self.tiers = Tiers(outcome['levels'], outcome.get('default', NO_OUTCOME))
+        self.outcomes = list(self.tiers.labels)
+        self.missing_code = intern(self.outcomes, outcome.get('missing', NO_OUTCOME))
+
+    def apply(self, cohort, rng=None):
+        if self.gene is None:
+            # A random outcome gene for each patient
+            if rng is None:
+                rng = np.random.default_rng()
+            drawn = rng.integers(0, len(cohort.genes), len(cohort))
+            return self.tiers.assign(cohort.genetics_at(np.arange(len(cohort)), drawn))
+        if self.gene not in cohort.gene_index:
+            return np.full(len(cohort), self.missing_code, dtype=np.int16)
+        return self.tiers.assign(cohort.gene(self.gene))
@@ -0,0 +1,140 @@
+from bisect import bisect_left
+from collections import OrderedDict
+
+DEFAULT_CACHE_SIZE = 65_536  # Results kept before the least recently used one is evicted
+
+# Opt-in result cache for therapy selection (see api.therapy_cache and api.select_therapies).
+# Results are keyed on a canonical patient signature (see TherapySignature): only the inputs the compiled
+# rules read, with every number replaced by its tier between the rules' thresholds. Two patients with the
+# same signature get the same therapy from those rules, so only rules without random draws may be cached.
+# The cache watches a source, a function returning the object its results derive from (the compiled
+# rules): every lookup compares the source's current object with the one the results came from, which
+# costs one identity test, and invalidates the cache when it changed (e.g. after api.reload_rules()).
+# Every invalidation empties the cache, bumps its version and calls on_invalidate.
+
+
+# Tier of a value between sorted thresholds: even codes lie between thresholds, odd codes on one,
+# so values with the same tier compare the same way (<, <=, >, >=) against every threshold
+def gene_tier(value, thresholds):
+    position = bisect_left(thresholds, value)
+    return 2 * position + int(position < len(thresholds) and thresholds[position] == value)
+
+
+# Key of therapy selection for one patient row (see api.patient_row) under compiled rules without random
+# draws. Chain rules read the history and allergies as sets, the health status and the tiers of the
+# biomarkers and the genetics mean between their thresholds (rules.ChainRules.thresholds); therapy tables
+# read only the history, in order (the last matching condition wins).
+class TherapySignature:
+    def __init__(self, rules):
+        if rules.random:
+            raise ValueError('Rules with random draws cannot be cached')
+        self.thresholds = getattr(rules, 'thresholds', None)
+
+    def __call__(self, row):
+        genetics, history, health, systolic, diastolic, cholesterol, allergies = row
+        if self.thresholds is None:
+            return tuple(history)
+        values = {'systolic': systolic, 'diastolic': diastolic, 'cholesterol': cholesterol,
+                  'mean_genetics': genetics.mean()}
+        return (tuple(sorted(set(history))), tuple(sorted(set(allergies))), health,
+                tuple(gene_tier(values[name], thresholds) for name, thresholds in self.thresholds.items()))
+
+
+# Bounded LRU cache with hit/miss counts, invalidated when its source changes
+class MemoCache:
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE, source=None, on_invalidate=None):
+        if maxsize < 1:
+            raise ValueError('Cache size must be at least 1')
+        self.maxsize = maxsize
+        self.source = source
+        self.on_invalidate = on_invalidate
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.version = 0  # Bumped by every invalidation
+        self._origin = source() if source is not None else None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def clear(self):
+        self.entries.clear()
+
+    # Function to drop every result (calls on_invalidate before the next lookup can miss)
+    def invalidate(self):
+        self.clear()
+        self.invalidations += 1
+        self.version += 1
+        if self.source is not None:
+            self._origin = self.source()
+        if self.on_invalidate is not None:
+            self.on_invalidate()
+
+    # Function to invalidate the cache if its source changed since the results were computed; returns True when it did
+    def validate(self):
+        if self.source is None or self.source() is self._origin:
+            return False
+        self.invalidate()
+        return True
+
+    def _store(self, key, result):
+        self.entries[key] = result
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    # Cached result for key, computing (and storing) it with compute() on a miss
+    def get(self, key, compute):
+        self.validate()
+        try:
+            result = self.entries[key]
+        except KeyError:
+            self.misses += 1
+            result = compute()
+            self._store(key, result)
+            return result
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return result
+
+    # Cached results for a batch of keys: compute(indices) gets the index of the first occurrence of
+    # every missed key and returns their results in one batch (repeats of a missed key count as hits)
+    def get_many(self, keys, compute):
+        self.validate()
+        results = [None] * len(keys)
+        missed = {}
+        for index, key in enumerate(keys):
+            if key in self.entries:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                results[index] = self.entries[key]
+            elif key in missed:
+                self.hits += 1
+                missed[key].append(index)
+            else:
+                self.misses += 1
+                missed[key] = [index]
+        if missed:
+            for indices, result in zip(missed.values(), compute([indices[0] for indices in missed.values()])):
+                self._store(keys[indices[0]], result)
+                for index in indices:
+                    results[index] = result
+        return results
+
+    # Function to wrap a function so calls with the same key(*args) share one result
+    def wrap(self, function, key):
+        def cached(*args):
+            return self.get(key(*args), lambda: function(*args))
+        cached.cache = self
+        return cached
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        return {'size': len(self.entries), 'maxsize': self.maxsize, 'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hit_rate, 'evictions': self.evictions, 'invalidations': self.invalidations}
@@ -0,0 +1,101 @@
+import copy
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from simplebiofactory.cohort import gene_names
+from simplebiofactory.pipeline import record_columns, record_vocabularies, stream
+from simplebiofactory.profiles import PROFILES
+from simplebiofactory.records import CATEGORY_COLUMNS, RecordBuilder
+
+DEFAULT_SHARD_SIZE = 250_000  # Patients per shard (fixed, so results do not depend on the worker count)
+
+
+# Function to split a run into (start, stop) patient ranges of shard_size
+def shard_bounds(num_patients, shard_size=DEFAULT_SHARD_SIZE):
+    return [(start, min(start + shard_size, num_patients)) for start in range(0, num_patients, shard_size)]
+
+
+# Function to stream a version's pipeline in this process, one chunk per shard, every shard with the Generator
+# it gets in simulate_parallel(): the chunks hold the records of a sharded run with the same seed and shard size.
+# The chunks share vocabularies; shards before first_shard are skipped (see checkpoint.py).
+def shard_stream(version, num_patients, seed, shard_size=DEFAULT_SHARD_SIZE, vocabularies=None, first_shard=0):
+    bounds = shard_bounds(num_patients, shard_size)
+    seed_sequences = np.random.SeedSequence(seed).spawn(len(bounds))
+    if vocabularies is None:
+        vocabularies = record_vocabularies()
+    for (start, stop), seed_sequence in zip(bounds[first_shard:], seed_sequences[first_shard:]):
+        yield from stream(version, stop, stop - start, np.random.default_rng(seed_sequence), start, vocabularies)
+
+
+# Worker: simulate one shard with its own random stream and return its columns as plain arrays
+def run_shard(version, start, stop, seed_sequence):
+    rng = np.random.default_rng(seed_sequence)
+    chunk = next(stream(version, stop - start, chunk_size=stop - start, rng=rng))
+    cohort = chunk['cohort']
+    return {
+        'start': start,
+        'genetics': cohort.genetics,
+        'medical_history': cohort.medical_history,
+        'conditions': cohort.conditions,
+        'columns': chunk['columns'],
+        'vocabularies': chunk['vocabularies'],
+    }
+
+
+# Function to merge shard results (in shard order) into the patient database with the category columns given
+def merge_shards(shards, num_patients, genes, columns=CATEGORY_COLUMNS):
+    builder = RecordBuilder(num_patients, genes, columns=columns)
+    for shard in shards:
+        size = len(shard['genetics'])
+        patient_ids = np.arange(shard['start'] + 1, shard['start'] + size + 1)
+        categories = {column: (codes, shard['vocabularies'][column]) for column, codes in shard['columns'].items()}
+        builder.extend(patient_ids, shard['genetics'], (shard['medical_history'], shard['conditions']), categories)
+    return builder.to_frame()
+
+
+# Function to simulate a version's pipeline on a process pool.
+# Every shard gets an independent Generator spawned from SeedSequence(seed), so the output for a given
+# seed is identical for any number of workers (workers=1 runs in this process).
+def simulate_parallel(version, num_patients, seed, workers=None, shard_size=DEFAULT_SHARD_SIZE):
+    bounds = shard_bounds(num_patients, shard_size)
+    seed_sequences = np.random.SeedSequence(seed).spawn(len(bounds))
+    genes = gene_names(PROFILES[version]['genes'])
+    columns = record_columns(PROFILES[version])
+    args = ([version] * len(bounds), [start for start, _ in bounds], [stop for _, stop in bounds], seed_sequences)
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers == 1 or len(bounds) <= 1:
+        return merge_shards(map(run_shard, *args), num_patients, genes, columns)
+    with ProcessPoolExecutor(max_workers=min(workers, len(bounds))) as executor:
+        # map() yields results in shard order while later shards are still running
+        return merge_shards(executor.map(run_shard, *args), num_patients, genes, columns)
+
+
+# Worker: aggregate one shard into a copy of the (empty) analytics
+def run_analytics_shard(version, start, stop, seed_sequence, analytics):
+    from simplebiofactory.analytics import analytics_sink
+    rng = np.random.default_rng(seed_sequence)
+    return analytics_sink(stream(version, stop - start, chunk_size=stop - start, rng=rng), copy.deepcopy(analytics))
+
+
+# Function to aggregate a version's pipeline on a process pool (shards as for simulate_parallel).
+# analytics (an empty analytics.Analytics) is filled by merging the shards' aggregates in shard order.
+def analyze_parallel(version, num_patients, seed, analytics, workers=None, shard_size=DEFAULT_SHARD_SIZE):
+    bounds = shard_bounds(num_patients, shard_size)
+    seed_sequences = np.random.SeedSequence(seed).spawn(len(bounds))
+    args = ([version] * len(bounds), [start for start, _ in bounds], [stop for _, stop in bounds], seed_sequences,
+            [copy.deepcopy(analytics)] * len(bounds))
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers == 1 or len(bounds) <= 1:
+        for shard in map(run_analytics_shard, *args):
+            analytics.merge(shard)
+        return analytics
+    with ProcessPoolExecutor(max_workers=min(workers, len(bounds))) as executor:
+        for shard in executor.map(run_analytics_shard, *args):
+            analytics.merge(shard)
+    return analytics
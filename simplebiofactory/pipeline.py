@@ -0,0 +1,172 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from simplebiofactory.cohort import HEALTH_STATES, gene_names, generate_cohort
+from simplebiofactory.manufacturing import ManufacturingTable, OutcomeTable
+from simplebiofactory.profiles import PROFILES
+from simplebiofactory.profiling import get_profiler
+from simplebiofactory.records import CATEGORY_COLUMNS, RecordBuilder, Vocabulary
+from simplebiofactory.rules import compile_rules
+from simplebiofactory.screening import Screening
+
+DEFAULT_CHUNK_SIZE = 100_000  # Patients per chunk; memory use is proportional to this, not to the run size
+
+# Streaming pipeline: generate -> ai_workflow -> biomanufacturing -> screening -> outcome -> sink.
+# Every stage is a generator over fixed-size chunks, so only a few chunks are alive at any time.
+# A chunk is a dict:
+#   'start'         index of the chunk's first patient in the whole run
+#   'cohort'        Cohort with the chunk's patients
+#   'columns'       record column -> integer codes (-1 is a missing value)
+#   'vocabularies'  record column -> Vocabulary the codes index, shared by all chunks of a run
+#   'screening'     screening.ScreeningResult (versions with drug interactions or blockers)
+# Stages translate their tables' codes into the shared vocabularies once per chunk (a lookup array of a
+# few entries), so records carry only int16 codes and strings are decoded by the sinks.
+
+
+# Function to create the shared vocabularies of a run (Current_Health codes are HEALTH_STATES indices)
+def record_vocabularies():
+    vocabularies = {column: Vocabulary() for column in CATEGORY_COLUMNS}
+    vocabularies['Current_Health'] = Vocabulary(HEALTH_STATES)
+    return vocabularies
+
+
+# Function to list the record category columns a version's pipeline produces (Outcome needs outcome tiers)
+def record_columns(profile):
+    return [column for column in CATEGORY_COLUMNS if column != 'Outcome' or 'outcome' in profile]
+
+
+# Stage: generate the cohort chunk by chunk, from patient start on (later than 0 when resuming a run)
+def generate_stage(profile, num_patients, chunk_size=DEFAULT_CHUNK_SIZE, rng=None, vocabularies=None, start=0):
+    profiler = get_profiler()
+    if vocabularies is None:
+        vocabularies = record_vocabularies()
+    for start in range(start, num_patients, chunk_size):
+        with profiler.span('generate_patient_data'):
+            cohort = generate_cohort(min(chunk_size, num_patients - start), profile['genes'], profile['conditions'],
+                                     history_size=profile['history_size'],
+                                     allergy_names=profile.get('allergies', ()), rng=rng)
+        profiler.count('patients', len(cohort))
+        yield {
+            'start': start,
+            'cohort': cohort,
+            'columns': {'Current_Health': cohort.current_health},
+            'vocabularies': vocabularies,
+        }
+
+
+# Stage: therapy selection with compiled rules (the vectorized ai_workflow)
+def therapy_stage(chunks, rules, rng=None):
+    profiler = get_profiler()
+    for chunk in chunks:
+        vocabulary = chunk['vocabularies']['Selected_Therapy']
+        with profiler.span('ai_workflow'):
+            chunk['columns']['Selected_Therapy'] = vocabulary.remap(rules.therapies)[rules.select(chunk['cohort'], rng)]
+        profiler.count_codes('therapy', chunk['columns']['Selected_Therapy'], vocabulary)
+        yield chunk
+
+
+# Stage: biomanufacturing (microorganism, bioreactor process and dosage adjustment).
+# The table must be built over the shared therapy vocabulary, so the therapy codes index it directly.
+def manufacturing_stage(chunks, table):
+    profiler = get_profiler()
+    for chunk in chunks:
+        vocabularies = chunk['vocabularies']
+        with profiler.span('biomanufacturing'):
+            codes = table.apply(chunk['cohort'], chunk['columns']['Selected_Therapy'])
+            for column, column_codes, table_vocabulary in zip(
+                    ('Engineered_Microorganism', 'Bioreactor_Process', 'Dosage_Adjustment'), codes,
+                    (table.microorganisms, table.processes, table.dosages)):
+                chunk['columns'][column] = vocabularies[column].remap(table_vocabulary)[column_codes]
+        yield chunk
+
+
+# Stage: drug interaction and blocker screening. Selected_Therapy becomes the rendered therapy
+# (with its interaction warning, or adjusted for a blocker); the flags stay in chunk['screening'].
+def screening_stage(chunks, screening, rng=None):
+    profiler = get_profiler()
+    for chunk in chunks:
+        with profiler.span('screening'):
+            result = screening.screen(chunk['cohort'], chunk['columns']['Selected_Therapy'], rng)
+            chunk['columns']['Selected_Therapy'] = screening.render(result, chunk['vocabularies']['Selected_Therapy'])
+        profiler.count('interactions', int(result.interacts().sum()))
+        profiler.count('blocked', int(result.blocked().sum()))
+        chunk['screening'] = result
+        yield chunk
+
+
+# Stage: therapy outcome simulation
+def outcome_stage(chunks, table, rng=None):
+    profiler = get_profiler()
+    for chunk in chunks:
+        with profiler.span('outcome'):
+            chunk['columns']['Outcome'] = chunk['vocabularies']['Outcome'].remap(table.outcomes)[
+                table.apply(chunk['cohort'], rng)]
+        yield chunk
+
+
+# Function to chain all stages of a version's pipeline; returns the generator of finished chunks.
+# start and vocabularies continue an earlier run from its first unfinished patient (see checkpoint.py);
+# rng must then be in the state the earlier run left it in.
+def stream(version, num_patients, chunk_size=DEFAULT_CHUNK_SIZE, rng=None, start=0, vocabularies=None):
+    if rng is None:
+        rng = np.random.default_rng()
+    profile = PROFILES[version]
+    genes = gene_names(profile['genes'])
+    rules = compile_rules(profile)
+    if vocabularies is None:
+        vocabularies = record_vocabularies()
+    vocabularies['Selected_Therapy'].remap(rules.therapies)
+
+    chunks = generate_stage(profile, num_patients, chunk_size, rng, vocabularies, start)
+    chunks = therapy_stage(chunks, rules, rng)
+    table = ManufacturingTable(profile['manufacturing'], vocabularies['Selected_Therapy'], genes)
+    chunks = manufacturing_stage(chunks, table)
+    if 'screening' in profile:
+        chunks = screening_stage(chunks, Screening(profile['screening'], vocabularies['Selected_Therapy'], genes), rng)
+    if 'outcome' in profile:
+        chunks = outcome_stage(chunks, OutcomeTable(profile['outcome'], genes), rng)
+    return chunks
+
+
+# DataFrame with the record columns of one chunk (Medical_History joined into text, for writing out)
+def chunk_frame(chunk):
+    cohort = chunk['cohort']
+    columns = {'Patient_ID': np.arange(chunk['start'] + 1, chunk['start'] + len(cohort) + 1)}
+    for gene in cohort.genes:
+        columns[gene] = cohort.gene(gene)
+    columns['Medical_History'] = cohort.history_text()
+    for column in CATEGORY_COLUMNS:
+        if column in chunk['columns']:
+            columns[column] = pd.Categorical.from_codes(chunk['columns'][column], list(chunk['vocabularies'][column]))
+    return pd.DataFrame(columns, copy=False)
+
+
+# Sink: append every chunk to a CSV file as it arrives; returns the number of records written
+def csv_sink(chunks, path):
+    written = 0
+    if os.path.exists(path):
+        os.remove(path)
+    profiler = get_profiler()
+    for chunk in chunks:
+        with profiler.span('csv_sink'):
+            frame = chunk_frame(chunk)
+            frame.to_csv(path, mode='a', header=written == 0, index=False)
+        written += len(frame)
+    return written
+
+
+# Sink: collect all chunks into the patient database (memory grows with the run, unlike csv_sink);
+# columns are the category columns of the records (see record_columns())
+def collect_sink(chunks, num_patients, genes, columns=CATEGORY_COLUMNS):
+    profiler = get_profiler()
+    builder = RecordBuilder(num_patients, genes, columns=columns)
+    for chunk in chunks:
+        cohort = chunk['cohort']
+        with profiler.span('records'):
+            patient_ids = np.arange(chunk['start'] + 1, chunk['start'] + len(cohort) + 1)
+            categories = {column: (codes, chunk['vocabularies'][column]) for column, codes in chunk['columns'].items()}
+            builder.extend(patient_ids, cohort.genetics, (cohort.medical_history, cohort.conditions), categories)
+    with profiler.span('records'):
+        return builder.to_frame()
@@ -0,0 +1,351 @@
+from simplebiofactory.cohort import generate_cohort
+
+# Genes, medical history conditions and therapy rules for each simplebiofactory version.
+# The scripts import their tables from here so the rule compiler and the scripts share one copy.
+
+NO_RECOMMENDATION = 'No specific recommendation'
+DEFAULT_THERAPY = 'Default therapy for missing gene'
+
+# Version 1: a single rule on medical history
+CONDITIONS_1 = ['Allergy', 'Hypertension']
+
+CHAIN_1 = [
+    ('Anti-hypertensive drug', [('history', 'Hypertension')]),
+]
+
+# Version 1.2: if/elif chain over history, allergies, blood pressure, genetics and drug blockers
+CONDITIONS_1_2 = ['Allergy', 'Hypertension']
+ALLERGIES_1_2 = ['Pollen', 'Penicillin']
+
+CHAIN_1_2 = [
+    ('Prescription antihypertensive drug', [('history', 'Hypertension'), ('above', 'systolic', 160)]),
+    ('Lifestyle modification for hypertension', [('history', 'Hypertension'), ('at_most', 'systolic', 160)]),
+    ('Allergy medication (antihistamine)', [('history', 'Allergy'), ('allergy', 'Pollen')]),
+    ('Allergy medication (non-penicillin-based)', [('history', 'Allergy'), ('allergy', 'Penicillin')]),
+    ('Genetic-based therapy', [('mean_genetics_above', 0.5)]),
+    ('Hospitalization and specialized treatment', [('health', 'Poor')]),
+]
+
+# Drug blockers (see screening.Screening): simulated genetic testing of 10 genes, where any value
+# above 0.7 indicates a drug blocker
+SCREENING_1_2 = {
+    'blockers': [
+        {'equals': 'Genetic-based therapy', 'random_genes': 10, 'threshold': 0.7,
+         'blocked': 'Genetic-based therapy (adjusted for drug blockers)'},
+    ],
+}
+
+# Version 2.1: if/elif chain with diabetes rules and drug interaction warnings
+CONDITIONS_2_1 = ['Allergy', 'Hypertension', 'Diabetes']
+ALLERGIES_2_1 = ['Pollen', 'Penicillin', 'Dust', 'Peanuts']
+
+DRUG_INTERACTIONS_2_1 = {
+    'Prescription antihypertensive drug': ['Drug A', 'Drug B'],
+    'Insulin therapy and cholesterol-lowering medication': ['Drug C', 'Drug D'],
+    'Oral diabetes medication': ['Drug E', 'Drug F'],
+}
+
+CHAIN_2_1 = [
+    ('Prescription antihypertensive drug', [('history', 'Hypertension'), ('above', 'systolic', 160)]),
+    ('Lifestyle modification for hypertension', [('history', 'Hypertension'), ('at_most', 'systolic', 160)]),
+    ('Insulin therapy and cholesterol-lowering medication',
+     [('history', 'Diabetes'), ('above', 'cholesterol', 200)]),
+    ('Oral diabetes medication', [('history', 'Diabetes'), ('at_most', 'cholesterol', 200)]),
+    ('Allergy medication (antihistamine)', [('history', 'Allergy'), ('allergy', 'Pollen')]),
+    ('Allergy medication (non-penicillin-based)', [('history', 'Allergy'), ('allergy', 'Penicillin')]),
+    ('Genetic-based therapy', [('mean_genetics_above', 0.5)]),
+    ('Hospitalization and specialized treatment', [('health', 'Poor')]),
+]
+
+# Interaction warnings are attached to the selected therapy by the screening stage
+SCREENING_2_1 = {'interactions': DRUG_INTERACTIONS_2_1}
+
+# Version 2.2: gene_impact lookup with a gene drawn from Gene1..Gene50 for each condition
+GENES_2_2 = ['Gene1', 'Gene2']  # Add more genes here...
+CONDITIONS_2_2 = ['Allergy', 'Hypertension', 'Diabetes']
+IMPACT_GENES_2_2 = [f'Gene{i}' for i in range(1, 50 + 1)]
+
+GENE_IMPACT_2_2 = {
+    'Gene1': {
+        'Hypertension': 'Prescription antihypertensive drug (Moderate genetic risk)',
+        'Diabetes': 'Oral diabetes medication (Low genetic risk)',
+        'Allergy': 'Allergy medication (antihistamine)',
+    },
+    'Gene2': {
+        'Hypertension': 'Lifestyle modification for hypertension',
+        'Diabetes': 'Insulin therapy (Moderate genetic risk)',
+        'Allergy': 'Allergy medication (antihistamine)',
+    },
+    # Define impacts for more genes and conditions...
+}
+
+# Version 2.3: therapy options with their genetic dependencies
+GENES_2_3 = {
+    'Gene1': {'function': 'Drug Metabolism'},
+    'Gene2': {'function': 'Hormone Regulation'},
+    'Gene3': {'function': 'Immune Response'},
+    # Add more genes with functions...
+}
+CONDITIONS_2_3 = ['Allergy', 'Hypertension', 'Diabetes', 'Asthma', 'Cancer']
+
+THERAPIES_2_3 = {
+    'Antihypertensive': {
+        'genes_required': ['Gene1'],
+        'dosage_gene': 'Gene1',
+        'dosage_levels': {
+            'Low genetic risk': {'min': 0.0, 'max': 0.2},
+            'Moderate genetic risk': {'min': 0.2, 'max': 0.7},
+            'High genetic risk': {'min': 0.7, 'max': 1.0}
+        },
+        'bioreactor_process': 'Bioreactor producing antihypertensive drug',
+    },
+    'Insulin Therapy': {
+        'genes_required': ['Gene2'],
+        'dosage_gene': 'Gene2',
+        'dosage_levels': {
+            'Low genetic risk': {'min': 0.0, 'max': 0.2},
+            'Moderate genetic risk': {'min': 0.2, 'max': 0.7},
+            'High genetic risk': {'min': 0.7, 'max': 1.0}
+        },
+        'bioreactor_process': 'Bioreactor producing insulin',
+    },
+    'Oral Diabetes Medication': {
+        'genes_required': [],
+        'bioreactor_process': 'Bioreactor producing oral diabetes medication',
+    },
+    'Allergy Medication': {
+        'genes_required': [],
+        'bioreactor_process': 'Bioreactor producing allergy medication',
+    },
+    # Add more therapy options...
+}
+
+# Version 2.4: gene_impact lookup over named genes
+GENES_2_4 = ['BRCA1', 'APOE', 'TP53']  # Add more genes here...
+CONDITIONS_2_4 = ['Allergy', 'Hypertension', 'Diabetes']
+
+GENE_IMPACT_2_4 = {
+    'BRCA1': {
+        'Hypertension': 'Prescription antihypertensive drug (Moderate genetic risk)',
+        'Diabetes': 'Oral diabetes medication (Low genetic risk)',
+        'Allergy': 'Allergy medication (antihistamine)',
+    },
+    'APOE': {
+        'Hypertension': 'Lifestyle modification for hypertension',
+        'Diabetes': 'Insulin therapy (Moderate genetic risk)',
+        'Allergy': 'Allergy medication (antihistamine)',
+    },
+    'TP53': {
+        'Hypertension': 'Prescription antihypertensive drug (Low genetic risk)',
+        'Diabetes': 'Oral diabetes medication (High genetic risk)',
+        'Allergy': 'Allergy medication (Moderate genetic risk)',
+    },
+    # Define impacts for more genes and conditions...
+}
+
+# Version 3.1: oncology genes and a long medical history
+GENES_3_1 = ['BRCA1', 'BRCA2', 'TP53', 'EGFR', 'KRAS']  # Add more genes here...
+CONDITIONS_3_1 = [
+    'Allergy', 'Hypertension', 'Diabetes', 'Asthma', 'Depression', 'Arthritis', 'COPD', 'Obesity',
+    'Hyperthyroidism', 'Migraine', 'Osteoporosis', 'Alzheimer\'s', 'Parkinson\'s', 'Schizophrenia',
+    'Bipolar Disorder', 'Epilepsy', 'Multiple Sclerosis', 'Crohn\'s Disease', 'Ulcerative Colitis',
+    'Rheumatoid Arthritis', 'Fibromyalgia', 'Celiac Disease', 'Lupus', 'Psoriasis', 'Endometriosis',
+    'PCOS', 'Sickle Cell Anemia', 'HIV/AIDS',
+    # Add more conditions here...
+]
+
+GENE_IMPACT_3_1 = {
+    'BRCA1': {
+        'Cancer': 'Prophylactic surgery (High genetic risk)',
+    },
+    'BRCA2': {
+        'Cancer': 'Prophylactic surgery (High genetic risk)',
+    },
+    'TP53': {
+        'Cancer': 'Aggressive treatment and monitoring (High genetic risk)',
+    },
+    'EGFR': {
+        'Lung Cancer': 'EGFR inhibitor therapy (Specific genetic mutation)',
+    },
+    'KRAS': {
+        'Lung Cancer': 'Immunotherapy (Specific genetic mutation)',
+    },
+    # Continue defining impacts for more genes and conditions...
+}
+
+# Biomanufacturing for each version, one entry per branch of its biomanufacturing() function.
+# The first entry whose 'equals', 'contains' or 'contains_lower' test matches the therapy name applies;
+# unmatched therapies get no microorganism, 'Bioreactor idle' and 'Standard dosage'.
+# 'dosage_levels' are (label, low, high, closed) ranges on the dosage gene, first match wins,
+# with closed one of 'both', 'left', 'right' or 'neither'.
+INF = float('inf')
+
+MANUFACTURING_1 = [
+    {'equals': 'Anti-hypertensive drug', 'microorganism': 'Engineered microorganism for drug production',
+     'process': 'Bioreactor producing therapy'},
+    # Any other therapy still yields a (truthy) microorganism string, so the bioreactor runs
+    {'contains': '', 'microorganism': 'No specific bioactive compound engineered',
+     'process': 'Bioreactor producing therapy'},
+]
+
+MANUFACTURING_1_2 = [
+    {'contains_lower': 'antihypertensive',
+     'microorganism': 'Engineered microorganism for drug production (antihypertensive)',
+     'process': 'Bioreactor producing antihypertensive drug'},
+    {'contains_lower': 'allergy medication',
+     'microorganism': 'Engineered microorganism for drug production (antihistamine)',
+     'process': 'Bioreactor producing antihistamine'},
+    {'contains': 'Genetic-based therapy', 'microorganism': 'Engineered microorganism for genetic therapy',
+     'process': 'Bioreactor producing genetic therapy'},
+]
+
+MANUFACTURING_2_1 = [
+    {'contains_lower': 'antihypertensive',
+     'microorganism': 'Engineered microorganism for antihypertensive drug production',
+     'process': 'Bioreactor producing antihypertensive drug'},
+    {'contains': 'Insulin therapy and cholesterol-lowering medication',
+     'microorganism': 'Engineered microorganism for insulin and cholesterol medication production',
+     'process': 'Bioreactor producing insulin and cholesterol medication'},
+    {'contains': 'Oral diabetes medication',
+     'microorganism': 'Engineered microorganism for oral diabetes medication production',
+     'process': 'Bioreactor producing oral diabetes medication'},
+    {'contains': 'Genetic-based therapy',
+     'microorganism': 'Engineered microorganism for genetic therapy production',
+     'process': 'Bioreactor producing genetic therapy'},
+]
+
+
+# Dosage ranges of the 2.2/2.4/3.1 scripts: above 0.6 is high, above 0.3 moderate, otherwise standard
+def above_threshold_levels(moderate, higher):
+    return [(moderate, 0.3, 0.6, 'right'), (higher, 0.6, INF, 'right')]
+
+
+MANUFACTURING_2_2 = [
+    {'contains_lower': 'antihypertensive',
+     'microorganism': 'Engineered microorganism for antihypertensive drug production',
+     'process': 'Bioreactor producing antihypertensive drug', 'dosage_gene': 'Gene1',
+     'dosage_levels': above_threshold_levels('Moderate dosage (Moderate genetic risk)',
+                                             'Higher dosage (High genetic risk)')},
+    {'contains': 'Insulin therapy', 'microorganism': 'Engineered microorganism for insulin production',
+     'process': 'Bioreactor producing insulin', 'dosage_gene': 'Gene2',
+     'dosage_levels': above_threshold_levels('Moderate insulin dosage (Moderate genetic risk)',
+                                             'Higher insulin dosage (High genetic risk)')},
+    {'contains': 'Oral diabetes medication',
+     'microorganism': 'Engineered microorganism for oral diabetes medication production'},
+    {'contains': 'Allergy medication', 'microorganism': 'Engineered microorganism for allergy medication production'},
+]
+
+# 2.3 derives biomanufacturing from THERAPIES: exact therapy names, dosage_levels as inclusive ranges
+def therapy_table_manufacturing(therapies):
+    return [
+        {'equals': therapy, 'microorganism': f'Engineered microorganism for {therapy} production',
+         'process': therapy_info['bioreactor_process'], 'dosage_gene': therapy_info.get('dosage_gene'),
+         'dosage_levels': [(level, level_range['min'], level_range['max'], 'both')
+                           for level, level_range in therapy_info.get('dosage_levels', {}).items()]}
+        for therapy, therapy_info in therapies.items() if 'bioreactor_process' in therapy_info
+    ]
+
+
+MANUFACTURING_2_3 = therapy_table_manufacturing(THERAPIES_2_3)
+
+MANUFACTURING_2_4 = [
+    {'contains_lower': 'antihypertensive',
+     'microorganism': 'Engineered microorganism for antihypertensive drug production',
+     'process': 'Bioreactor producing antihypertensive drug', 'dosage_gene': 'BRCA1',
+     'dosage_levels': above_threshold_levels('Moderate dosage (Moderate genetic risk)',
+                                             'Higher dosage (High genetic risk)')},
+    {'contains': 'Insulin therapy', 'microorganism': 'Engineered microorganism for insulin production',
+     'process': 'Bioreactor producing insulin', 'dosage_gene': 'APOE',
+     'dosage_levels': above_threshold_levels('Moderate insulin dosage (Moderate genetic risk)',
+                                             'Higher insulin dosage (High genetic risk)')},
+    {'contains': 'Oral diabetes medication',
+     'microorganism': 'Engineered microorganism for oral diabetes medication production'},
+    {'contains': 'Allergy medication', 'microorganism': 'Engineered microorganism for allergy medication production'},
+]
+
+# TP53 drug blockers of 2.4's allergy medications: above 0.6 blocked, above 0.3 partially blocked
+SCREENING_2_4 = {
+    'blockers': [
+        {'contains': 'Allergy medication', 'gene': 'TP53',
+         'levels': above_threshold_levels('Allergy medication (Moderate genetic risk) - Drug partially blocked',
+                                          'Allergy medication (High genetic risk) - Drug blocked')},
+    ],
+}
+
+MANUFACTURING_3_1 = [
+    {'contains_lower': 'surgery', 'microorganism': 'No engineered microorganism needed',
+     'process': 'No bioreactor needed', 'dosage': 'No dosage adjustment needed'},
+    {'contains': 'EGFR inhibitor therapy', 'microorganism': 'Engineered microorganism for EGFR inhibitor production',
+     'process': 'Bioreactor producing EGFR inhibitor', 'dosage_gene': 'EGFR',
+     'dosage_levels': above_threshold_levels('Moderate dosage (Moderate genetic risk)',
+                                             'Higher dosage (High genetic risk)')},
+]
+
+# Therapy outcome simulation: levels on the outcome gene (None draws a random gene per patient),
+# 'default' when no level matches and 'missing' when the gene is not in the genetic data
+OUTCOME_LEVELS = [
+    ('Standard outcome (Low genetic risk)', -INF, 0.3, 'right'),
+    ('Moderate outcome (Moderate genetic risk)', 0.3, 0.6, 'right'),
+    ('Favorable outcome (High genetic risk)', 0.6, INF, 'right'),
+]
+
+OUTCOME_2_2 = {'gene': 'Gene3', 'levels': OUTCOME_LEVELS, 'missing': 'Gene not found in genetic data'}
+
+OUTCOME_2_3 = {
+    'gene': None,
+    'levels': [
+        ('Standard outcome (Low genetic risk)', 0.0, 0.3, 'left'),
+        ('Moderate outcome (Moderate genetic risk)', 0.3, 0.7, 'left'),
+        ('Favorable outcome (High genetic risk)', 0.7, 1.0, 'both'),
+    ],
+    'default': 'No outcome data available',
+}
+
+OUTCOME_2_4 = {'gene': 'BRCA1', 'levels': OUTCOME_LEVELS, 'missing': 'Gene not found in genetic data'}
+
+OUTCOME_3_1 = {'gene': 'EGFR', 'levels': OUTCOME_LEVELS, 'missing': 'Gene not found in genetic data'}
+
+# Everything needed to generate a cohort and run the pipeline of each version.
+# 'missing_gene' is the therapy used when the drawn gene has no gene_impact entry (None keeps the previous one).
+PROFILES = {
+    '1': {
+        'genes': 10, 'conditions': CONDITIONS_1, 'history_size': 2,
+        'chain': CHAIN_1, 'default_therapy': 'General wellness recommendation',
+        'manufacturing': MANUFACTURING_1,
+    },
+    '1.2': {
+        'genes': 10, 'conditions': CONDITIONS_1_2, 'history_size': 2, 'allergies': ALLERGIES_1_2,
+        'chain': CHAIN_1_2, 'manufacturing': MANUFACTURING_1_2, 'screening': SCREENING_1_2,
+    },
+    '2.1': {
+        'genes': 20, 'conditions': CONDITIONS_2_1, 'history_size': 2, 'allergies': ALLERGIES_2_1,
+        'chain': CHAIN_2_1, 'manufacturing': MANUFACTURING_2_1, 'screening': SCREENING_2_1,
+    },
+    '2.2': {
+        'genes': GENES_2_2, 'conditions': CONDITIONS_2_2, 'history_size': 2,
+        'gene_impact': GENE_IMPACT_2_2, 'impact_genes': IMPACT_GENES_2_2, 'missing_gene': DEFAULT_THERAPY,
+        'manufacturing': MANUFACTURING_2_2, 'outcome': OUTCOME_2_2,
+    },
+    '2.3': {
+        'genes': GENES_2_3, 'conditions': CONDITIONS_2_3, 'history_size': 2,
+        'therapies': THERAPIES_2_3, 'manufacturing': MANUFACTURING_2_3, 'outcome': OUTCOME_2_3,
+    },
+    '2.4': {
+        'genes': GENES_2_4, 'conditions': CONDITIONS_2_4, 'history_size': 2,
+        'gene_impact': GENE_IMPACT_2_4, 'missing_gene': DEFAULT_THERAPY,
+        'manufacturing': MANUFACTURING_2_4, 'screening': SCREENING_2_4, 'outcome': OUTCOME_2_4,
+    },
+    '3.1': {
+        'genes': GENES_3_1, 'conditions': CONDITIONS_3_1, 'history_size': 30,
+        'gene_impact': GENE_IMPACT_3_1, 'missing_gene': None,
+        'manufacturing': MANUFACTURING_3_1, 'outcome': OUTCOME_3_1,
+    },
+}
+
+
+# Function to generate a cohort shaped like the patients of one version (genotypes: see generate_cohort)
+def generate_profile_cohort(version, num_patients, rng=None, genotypes=None):
+    profile = PROFILES[version]
+    return generate_cohort(num_patients, profile['genes'], profile['conditions'],
+                           history_size=profile['history_size'],
+                           allergy_names=profile.get('allergies', ()), rng=rng, genotypes=genotypes)
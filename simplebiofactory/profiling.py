@@ -0,0 +1,182 @@
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+import numpy as np
+
+# Stage timers and counters for the workflow.
+# A Profiler records one event per span (a timed stage, e.g. one pipeline chunk or one patient's
+# ai_workflow) and named counters (patients, rule hits per therapy, cache hits). Spans nest, so the
+# events export both as a Chrome trace (chrome://tracing, Perfetto) and as folded stacks for flamegraph.pl.
+# A disabled profiler does no work: span() returns a shared no-op context manager, count() returns at
+# once and wrap() returns the function unchanged, so the hooks can stay in production code.
+# The shared profiler is enabled by setting SIMPLEBIOFACTORY_PROFILE to the path of the trace to write
+# (.folded writes folded stacks, anything else a Chrome trace).
+
+PROFILE_ENV = 'SIMPLEBIOFACTORY_PROFILE'
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Profiler:
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.events = []  # (name, stack, start ns, duration ns, thread id)
+        self.counters = defaultdict(int)
+        self._local = threading.local()
+        self._origin = time.perf_counter_ns()
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    @contextmanager
+    def _span(self, name):
+        stack = self._stack()
+        stack.append(name)
+        path = ';'.join(stack)
+        start = time.perf_counter_ns()
+        try:
+            yield self
+        finally:
+            self.events.append((name, path, start - self._origin, time.perf_counter_ns() - start,
+                                threading.get_ident()))
+            stack.pop()
+
+    # Context manager timing a stage
+    def span(self, name):
+        if not self.enabled:
+            return _NULL_SPAN
+        return self._span(name)
+
+    def count(self, name, amount=1):
+        if self.enabled:
+            self.counters[name] += amount
+
+    # Count the occurrences of every code in codes as '<name>:<vocabulary entry>' (e.g. rule hits per therapy)
+    def count_codes(self, name, codes, vocabulary):
+        if not self.enabled:
+            return
+        counts = np.bincount(np.asarray(codes)[np.asarray(codes) >= 0], minlength=len(vocabulary))
+        for code, amount in enumerate(counts.tolist()):
+            if amount:
+                self.counters[f'{name}:{vocabulary[code]}'] += amount
+
+    # Count the occurrences of every distinct value as '<name>:<value>'
+    def count_values(self, name, values):
+        if not self.enabled:
+            return
+        distinct, counts = np.unique(np.asarray(values, dtype=str), return_counts=True)
+        for value, amount in zip(distinct.tolist(), counts.tolist()):
+            self.counters[f'{name}:{value}'] += amount
+
+    # Copy the hit and miss counts of a memo.MemoCache into the counters
+    def count_cache(self, name, cache):
+        if self.enabled:
+            self.counters[f'{name}:hits'] += cache.hits
+            self.counters[f'{name}:misses'] += cache.misses
+
+    # Function to wrap a function in a span of its name (the function itself when disabled)
+    def wrap(self, function, name=None):
+        if not self.enabled:
+            return function
+        name = name or function.__name__
+
+        def profiled(*args, **kwargs):
+            with self._span(name):
+                return function(*args, **kwargs)
+        profiled.__wrapped__ = function
+        return profiled
+
+    # Total seconds and calls per span name, plus the counters and patients per second
+    def summary(self):
+        stages = {}
+        for name, _, _, duration, _ in self.events:
+            stage = stages.setdefault(name, {'calls': 0, 'seconds': 0.0})
+            stage['calls'] += 1
+            stage['seconds'] += duration / 1e9
+        summary = {'stages': stages, 'counters': dict(self.counters)}
+        if self.events and self.counters.get('patients'):
+            first = min(start for _, _, start, _, _ in self.events)
+            last = max(start + duration for _, _, start, duration, _ in self.events)
+            summary['patients_per_second'] = self.counters['patients'] / max((last - first) / 1e9, 1e-9)
+        return summary
+
+    def format_summary(self):
+        summary = self.summary()
+        lines = [f'{"stage":<30}{"calls":>10}{"seconds":>12}']
+        for name, stage in sorted(summary['stages'].items(), key=lambda item: -item[1]['seconds']):
+            lines.append(f'{name:<30}{stage["calls"]:>10}{stage["seconds"]:>12.4f}')
+        for name, value in sorted(summary['counters'].items()):
+            lines.append(f'{name:<40} {value:>11}')
+        if 'patients_per_second' in summary:
+            lines.append(f'{"patients per second":<40} {summary["patients_per_second"]:>11.0f}')
+        return '\n'.join(lines) + '\n'
+
+    # Chrome trace event format (complete events; timestamps in microseconds)
+    def chrome_trace(self):
+        events = [{'name': name, 'cat': 'stage', 'ph': 'X', 'ts': start / 1e3, 'dur': duration / 1e3,
+                   'pid': os.getpid(), 'tid': thread} for name, _, start, duration, thread in self.events]
+        events += [{'name': name, 'ph': 'C', 'ts': 0, 'pid': os.getpid(), 'args': {'value': value}}
+                   for name, value in self.counters.items()]
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    # Folded stacks ('outer;inner self-microseconds' per line) for flamegraph.pl and speedscope
+    def folded_stacks(self):
+        self_time = defaultdict(int)
+        for _, path, _, duration, _ in self.events:
+            self_time[path] += duration
+            parent = path.rpartition(';')[0]
+            if parent:
+                self_time[parent] -= duration
+        return ''.join(f'{path} {max(duration, 0) // 1000}\n' for path, duration in sorted(self_time.items()))
+
+    # Function to write the trace to path (.folded: folded stacks, otherwise a Chrome trace)
+    def write(self, path):
+        with open(path, 'w') as out:
+            if str(path).endswith('.folded'):
+                out.write(self.folded_stacks())
+            else:
+                json.dump(self.chrome_trace(), out)
+
+
+_profiler = None
+
+
+# Function to get the shared profiler (enabled when SIMPLEBIOFACTORY_PROFILE is set)
+def get_profiler():
+    global _profiler
+    if _profiler is None:
+        _profiler = Profiler(enabled=bool(os.environ.get(PROFILE_ENV)))
+    return _profiler
+
+
+# Function to replace the shared profiler (e.g. Profiler() to turn profiling on from code)
+def set_profiler(profiler):
+    global _profiler
+    _profiler = profiler
+    return profiler
+
+
+# Function to write the shared profiler's trace to the SIMPLEBIOFACTORY_PROFILE path, if profiling is on
+def write_profile():
+    profiler = get_profiler()
+    path = os.environ.get(PROFILE_ENV)
+    if profiler.enabled and path:
+        profiler.write(path)
+        return path
+    return None
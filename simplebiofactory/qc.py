@@ -0,0 +1,336 @@
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+# Quality control of bioreactor lots from per-reactor sensor time series.
+# Samples arrive one tick at a time as reactors x SENSORS arrays (NaN for a missing reading), and every
+# statistic is updated in O(1) per sample, vectorized across reactors, instead of recomputing windows:
+#   Welford   running count, mean and variance of the current lot
+#   EWMA      exponentially weighted mean and variance (West's incremental form), the recent behaviour
+#   spec      out-of-spec counts and the longest run of consecutive out-of-spec samples per sensor
+# Alerts raised by QualityMonitor.update():
+#   out of spec  a reading outside the sensor's (low, high) spec in SENSOR_SPECS
+#   drift        a reading more than z_limit EWMA standard deviations from the EWMA mean, once the lot
+#                has warmup samples (only for sensors with a spec; titer rises through a batch)
+# QualityMonitor.release() decides each finished lot and starts the reactor's next one:
+#   REJECTED  a run of excursion_limit or more out-of-spec samples, or a final titer below release_titer
+#   HOLD      any other out-of-spec reading or drift alert (released after review)
+#   RELEASED  otherwise
+# delivery_status() turns the decisions into the delivery text of personalized_delivery().
+#   python -m simplebiofactory.qc --reactors 5000 --seconds 600
+
+SENSORS = ('titer', 'pH', 'temperature', 'dissolved_oxygen')
+TITER = SENSORS.index('titer')
+
+# (low, high) spec of the continuously monitored sensors: pH, degrees C, % air saturation
+SENSOR_SPECS = {'pH': (6.8, 7.4), 'temperature': (36.0, 38.0), 'dissolved_oxygen': (30.0, 80.0)}
+DEFAULT_RELEASE_TITER = 1.0  # Grams per litre of product a lot needs at release
+DEFAULT_ALPHA = 0.05  # EWMA weight of the newest sample (about a 20 sample memory)
+DEFAULT_Z_LIMIT = 6.0
+DEFAULT_WARMUP = 60  # Samples before drift alerts start
+DEFAULT_EXCURSION_LIMIT = 30  # Consecutive out-of-spec samples that reject a lot (30 s at 1 Hz)
+
+# Lot decisions (codes) and the delivery status each one leads to; NO_LOT marks patients without a lot
+RELEASED, HOLD, REJECTED = 0, 1, 2
+NO_LOT = -1
+DECISIONS = ('Released', 'Hold', 'Rejected')
+DELIVERY_STATUS = {
+    RELEASED: 'Personalized drug delivery to patient',
+    HOLD: 'Delivery on hold pending quality review',
+    REJECTED: 'No therapy to deliver (lot rejected)',
+    NO_LOT: 'No therapy to deliver',
+}
+
+
+# Running statistics of streams x sensors readings, updated one sample per stream and sensor at a time
+class SensorStats:
+    def __init__(self, num_streams, num_sensors, alpha=DEFAULT_ALPHA):
+        self.alpha = alpha
+        shape = (num_streams, num_sensors)
+        self.count = np.zeros(shape, dtype=np.int64)
+        self.mean = np.zeros(shape)
+        self.m2 = np.zeros(shape)  # Sum of squared deviations from the mean (Welford)
+        self.ewma = np.zeros(shape)
+        self.ewm_variance = np.zeros(shape)
+        self.minimum = np.full(shape, np.inf)
+        self.maximum = np.full(shape, -np.inf)
+        self.last = np.full(shape, np.nan)  # Last valid reading
+        self._delta = np.empty(shape)
+
+    # Function to add one reading per stream and sensor (NaN readings leave the statistics unchanged)
+    def update(self, samples):
+        valid = ~np.isnan(samples)
+        values = np.where(valid, samples, self.mean)  # Invalid readings become zero-deviation updates
+        self.count += valid
+        first = valid & (self.count == 1)
+
+        delta = np.subtract(values, self.mean, out=self._delta)
+        self.mean += np.divide(delta, self.count, out=np.zeros_like(delta), where=valid)
+        self.m2 += delta * (values - self.mean)
+
+        difference = values - self.ewma
+        increment = np.where(valid, self.alpha * difference, 0.0)
+        self.ewma += increment
+        self.ewm_variance = np.where(valid, (1.0 - self.alpha) * (self.ewm_variance + difference * increment),
+                                     self.ewm_variance)
+        self.ewma[first] = values[first]
+        self.ewm_variance[first] = 0.0
+
+        np.fmin(self.minimum, samples, out=self.minimum)
+        np.fmax(self.maximum, samples, out=self.maximum)
+        np.copyto(self.last, samples, where=valid)
+
+    # Sample variance of each stream and sensor (0 below two readings)
+    def variance(self):
+        return np.divide(self.m2, self.count - 1, out=np.zeros_like(self.m2), where=self.count > 1)
+
+    def std(self):
+        return np.sqrt(self.variance())
+
+    def ewm_std(self):
+        return np.sqrt(self.ewm_variance)
+
+    # Function to restart the statistics of some streams (an index array or mask)
+    def reset(self, streams):
+        for array, value in ((self.count, 0), (self.mean, 0.0), (self.m2, 0.0), (self.ewma, 0.0),
+                             (self.ewm_variance, 0.0), (self.minimum, np.inf), (self.maximum, -np.inf),
+                             (self.last, np.nan)):
+            array[streams] = value
+
+
+# Alerts of one tick: reactors x sensors flags
+class Alerts:
+    def __init__(self, out_of_spec, drift):
+        self.out_of_spec = out_of_spec
+        self.drift = drift
+
+    def __len__(self):
+        return int(self.out_of_spec.sum() + self.drift.sum())
+
+    # (reactor, sensor, kind) of every alert
+    def items(self):
+        for kind, flags in (('out of spec', self.out_of_spec), ('drift', self.drift)):
+            for reactor, sensor in zip(*np.nonzero(flags)):
+                yield int(reactor), SENSORS[sensor], kind
+
+
+class QualityMonitor:
+    def __init__(self, num_reactors, specs=SENSOR_SPECS, release_titer=DEFAULT_RELEASE_TITER, alpha=DEFAULT_ALPHA,
+                 z_limit=DEFAULT_Z_LIMIT, warmup=DEFAULT_WARMUP, excursion_limit=DEFAULT_EXCURSION_LIMIT):
+        for sensor in specs:
+            if sensor not in SENSORS:
+                raise ValueError(f'Unknown sensor {sensor!r}; expected one of {SENSORS}')
+        self.low = np.array([specs[sensor][0] if sensor in specs else -np.inf for sensor in SENSORS])
+        self.high = np.array([specs[sensor][1] if sensor in specs else np.inf for sensor in SENSORS])
+        self.monitored = np.array([sensor in specs for sensor in SENSORS])
+        self.release_titer = release_titer
+        self.z_limit = z_limit
+        self.warmup = warmup
+        self.excursion_limit = excursion_limit
+
+        self.stats = SensorStats(num_reactors, len(SENSORS), alpha)
+        shape = (num_reactors, len(SENSORS))
+        self.out_of_spec = np.zeros(shape, dtype=np.int64)
+        self.excursion = np.zeros(shape, dtype=np.int64)  # Current run of consecutive out-of-spec samples
+        self.longest_excursion = np.zeros(shape, dtype=np.int64)
+        self.drift = np.zeros(shape, dtype=np.int64)
+        self.lots = np.zeros(num_reactors, dtype=np.int64)  # Lot number each reactor is producing
+
+    def __len__(self):
+        return len(self.lots)
+
+    # Function to add one tick of readings (reactors x SENSORS); returns the tick's Alerts
+    def update(self, samples):
+        samples = np.asarray(samples, dtype=np.float64)
+        stats = self.stats
+        valid = ~np.isnan(samples)
+        out_of_spec = valid & ((samples < self.low) | (samples > self.high))
+        # Drift is judged against the EWMA before this reading joins it
+        drift = (valid & self.monitored & (stats.count >= self.warmup)
+                 & (np.abs(samples - stats.ewma) > self.z_limit * stats.ewm_std()))
+        stats.update(samples)
+
+        self.out_of_spec += out_of_spec
+        self.excursion += 1
+        self.excursion *= out_of_spec
+        np.maximum(self.longest_excursion, self.excursion, out=self.longest_excursion)
+        self.drift += drift
+        return Alerts(out_of_spec, drift)
+
+    # Decision codes for the current lots of reactors (all by default), without ending them
+    def decisions(self, reactors=None):
+        if reactors is None:
+            reactors = np.arange(len(self))
+        titer = self.stats.last[reactors, TITER]
+        rejected = (self.longest_excursion[reactors] >= self.excursion_limit).any(axis=1)
+        rejected |= ~(titer >= self.release_titer)  # A lot without titer readings is rejected too
+        hold = (self.out_of_spec[reactors] > 0).any(axis=1) | (self.drift[reactors] > 0).any(axis=1)
+        return np.where(rejected, REJECTED, np.where(hold, HOLD, RELEASED)).astype(np.int8)
+
+    # Function to release the current lots of reactors: returns their decision codes and starts new lots
+    def release(self, reactors=None):
+        if reactors is None:
+            reactors = np.arange(len(self))
+        reactors = np.asarray(reactors)
+        decisions = self.decisions(reactors)
+        self.stats.reset(reactors)
+        for array in (self.out_of_spec, self.excursion, self.longest_excursion, self.drift):
+            array[reactors] = 0
+        self.lots[reactors] += 1
+        return decisions
+
+    # Per-reactor summary of the current lots: decision and statistics of every sensor
+    def summary(self, reactors=None):
+        if reactors is None:
+            reactors = np.arange(len(self))
+        decisions = self.decisions(reactors)
+        stats = self.stats
+        std = stats.std()
+        rows = []
+        for row, reactor in enumerate(reactors):
+            sensors = {sensor: {'mean': stats.mean[reactor, s], 'std': std[reactor, s],
+                                'ewma': stats.ewma[reactor, s], 'min': stats.minimum[reactor, s],
+                                'max': stats.maximum[reactor, s], 'out_of_spec': int(self.out_of_spec[reactor, s]),
+                                'drift': int(self.drift[reactor, s])} for s, sensor in enumerate(SENSORS)}
+            rows.append({'reactor': int(reactor), 'lot': int(self.lots[reactor]),
+                         'decision': DECISIONS[decisions[row]], 'sensors': sensors})
+        return rows
+
+
+# Function to give every order the decision of the lot that made it: order_runs are the scheduler's run
+# per order (scheduler.Schedule.order_runs, -1 for orders without a run) and run_decisions one code per run
+def order_decisions(order_runs, run_decisions):
+    order_runs = np.asarray(order_runs)
+    return np.where(order_runs >= 0, np.asarray(run_decisions)[np.maximum(order_runs, 0)], NO_LOT).astype(np.int8)
+
+
+# Function to turn decision codes (NO_LOT for patients without a lot) into delivery status text
+# (one text for a single code, an array of texts for an array of codes)
+def delivery_status(decisions):
+    decisions = np.asarray(decisions)
+    if not np.isin(decisions, list(DELIVERY_STATUS)).all():
+        raise ValueError(f'Unknown lot decision code; expected one of {list(DELIVERY_STATUS)}')
+    status = np.empty(decisions.shape, dtype=object)
+    for code, text in DELIVERY_STATUS.items():
+        status[decisions == code] = text
+    return status[()]
+
+
+# Simulated 1 Hz sensor readings of a bank of reactors: pH, temperature and dissolved oxygen wander
+# around their set points (AR(1) noise), the titer climbs towards each lot's final titer, and
+# faults add a slow drift to one sensor of a few reactors, single-reading spikes or dropped readings (NaN).
+# With a trajectory (titer samples x reactors, as returned by kinetics.Bioreactors.run(record_every=...))
+# the titer follows the trajectory instead, its samples spread evenly over the batch.
+class SensorStreams:
+    SET_POINTS = np.array([0.0, 7.1, 37.0, 50.0])
+    NOISE = np.array([0.02, 0.02, 0.05, 1.0])
+
+    def __init__(self, num_reactors, batch_seconds=3600, titer=4.0, fault_rate=0.01, spike_rate=2e-6,
+                 missing_rate=0.001, rng=None, trajectory=None):
+        if rng is None:
+            rng = np.random.default_rng()
+        self.rng = rng
+        self.batch_seconds = batch_seconds
+        self.fault_rate = fault_rate
+        self.spike_rate = spike_rate
+        self.missing_rate = missing_rate
+        self.final_titer = rng.normal(titer, titer * 0.2, num_reactors).clip(0.0)
+        self.trajectory = self._trajectory(trajectory, num_reactors)
+        self.noise = np.zeros((num_reactors, len(SENSORS)))
+        self.fault = np.zeros((num_reactors, len(SENSORS)))  # Drift per second added to each sensor
+        self.offset = np.zeros((num_reactors, len(SENSORS)))
+        self.seconds = 0
+        self._start_faults()
+
+    def _start_faults(self):
+        faulty = np.flatnonzero(self.rng.random(len(self.noise)) < self.fault_rate)
+        self.fault[:] = 0.0
+        self.offset[:] = 0.0
+        sensors = self.rng.integers(1, len(SENSORS), len(faulty))
+        self.fault[faulty, sensors] = self.rng.choice([-1.0, 1.0], len(faulty)) * self.NOISE[sensors] * 0.5
+
+    @staticmethod
+    def _trajectory(trajectory, num_reactors):
+        if trajectory is None:
+            return None
+        trajectory = np.asarray(trajectory, dtype=np.float64)
+        if trajectory.ndim != 2 or trajectory.shape[1] != num_reactors or not len(trajectory):
+            raise ValueError(f'Expected a titer trajectory of samples x {num_reactors} reactors, '
+                             f'got shape {trajectory.shape}')
+        return trajectory
+
+    # Function to start new lots in every reactor
+    def new_batch(self, titer=4.0, trajectory=None):
+        self.final_titer = self.rng.normal(titer, titer * 0.2, len(self.noise)).clip(0.0)
+        self.trajectory = self._trajectory(trajectory, len(self.noise))
+        self.seconds = 0
+        self._start_faults()
+
+    # Titer of every reactor at the current second, without noise
+    def titer(self):
+        if self.trajectory is None:
+            return self.final_titer * min(self.seconds / self.batch_seconds, 1.0)
+        # Latest trajectory sample taken by this second
+        sample = -(-self.seconds * len(self.trajectory) // self.batch_seconds)
+        return self.trajectory[min(max(sample, 1), len(self.trajectory)) - 1]
+
+    # Readings of the next second (reactors x SENSORS)
+    def tick(self):
+        self.seconds += 1
+        self.noise *= 0.9
+        self.noise += self.rng.standard_normal(self.noise.shape) * self.NOISE * 0.5
+        self.offset += self.fault
+        samples = self.SET_POINTS + self.noise + self.offset
+        samples[:, TITER] = self.titer() + self.noise[:, TITER]
+        if self.spike_rate:
+            spikes = self.rng.random(samples.shape) < self.spike_rate
+            spikes[:, TITER] = False
+            samples[spikes] += (self.NOISE * 20 * self.rng.choice([-1.0, 1.0], samples.shape))[spikes]
+        if self.missing_rate:
+            samples[self.rng.random(samples.shape) < self.missing_rate] = np.nan
+        return samples
+
+
+# Function to monitor num_reactors simulated streams for seconds ticks of 1 Hz readings and release the
+# lots at the end; returns the lot decision counts and the monitoring throughput
+def run_monitoring(num_reactors, seconds, seed=None, fault_rate=0.01, spike_rate=2e-6):
+    streams = SensorStreams(num_reactors, batch_seconds=seconds, fault_rate=fault_rate, spike_rate=spike_rate,
+                            rng=np.random.default_rng(seed))
+    monitor = QualityMonitor(num_reactors)
+    monitoring = 0.0
+    alerts = 0
+    for _ in range(seconds):
+        samples = streams.tick()
+        started = time.perf_counter()
+        alerts += len(monitor.update(samples))
+        monitoring += time.perf_counter() - started
+    decisions = monitor.release()
+    return {
+        'reactors': num_reactors,
+        'seconds': seconds,
+        'alerts': alerts,
+        'decisions': {name: int((decisions == code).sum()) for code, name in enumerate(DECISIONS)},
+        'ms_per_tick': round(monitoring / seconds * 1e3, 3),
+        'samples_per_second': round(num_reactors * len(SENSORS) * seconds / monitoring),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m simplebiofactory.qc',
+                                     description='Monitor simulated 1 Hz bioreactor sensor streams')
+    parser.add_argument('--reactors', type=int, default=5000)
+    parser.add_argument('--seconds', type=int, default=600)
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--fault-rate', type=float, default=0.01, help='Share of reactors with a drifting sensor')
+    parser.add_argument('--spike-rate', type=float, default=2e-6, help='Chance of a spike per reading')
+    args = parser.parse_args(argv)
+    print(json.dumps(run_monitoring(args.reactors, args.seconds, args.seed, args.fault_rate, args.spike_rate),
+                     indent=1))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,178 @@
+import numpy as np
+import pandas as pd
+
+from simplebiofactory import bitsets
+
+# Secondary indexes over a patient database for cohort lookups, e.g.
+#   index = PatientIndex(patient_database)
+#   rows = (index.eq('Selected_Therapy', 'EGFR inhibitor therapy (Specific genetic mutation)')
+#           & index.eq('Dosage_Adjustment', 'Higher dosage (High genetic risk)')
+#           & index.eq('Current_Health', 'Poor') & ~index.has('Asthma'))
+#   index.select(rows)
+# Every indexed value (a category of Selected_Therapy, Dosage_Adjustment, Current_Health, Outcome,
+# or a condition of Medical_History) gets one bitmap with a bit per record, packed 8 records to a byte.
+# Queries combine bitmaps with & | ~ -, so a query over 10M records touches a few 1.25 MB arrays
+# instead of scanning the columns.
+
+INDEX_COLUMNS = ('Selected_Therapy', 'Dosage_Adjustment', 'Current_Health', 'Outcome')
+
+
+# Set of records as a packed bitmap (bit i of the bitmap is record i, in the database's row order)
+class Bitmap:
+    def __init__(self, bits, size):
+        self.bits = bits  # uint8, one bit per record (np.packbits order)
+        self.size = size
+
+    @classmethod
+    def from_mask(cls, mask):
+        return cls(np.packbits(mask), len(mask))
+
+    def __and__(self, other):
+        return Bitmap(self.bits & other.bits, self.size)
+
+    def __or__(self, other):
+        return Bitmap(self.bits | other.bits, self.size)
+
+    def __sub__(self, other):
+        return Bitmap(self.bits & ~other.bits, self.size)
+
+    def __invert__(self):
+        bits = ~self.bits
+        if self.size % 8:
+            bits[-1] &= np.uint8(0xFF << (8 - self.size % 8) & 0xFF)  # Padding bits past the last record stay clear
+        return Bitmap(bits, self.size)
+
+    def __len__(self):
+        return self.count()
+
+    # Number of records in the set
+    def count(self):
+        return int(np.bitwise_count(self.bits).sum())
+
+    # Boolean mask over the records
+    def mask(self):
+        return np.unpackbits(self.bits, count=self.size).view(bool)
+
+    # Row positions of the records, in ascending order
+    def rows(self):
+        return np.flatnonzero(self.mask())
+
+
+class PatientIndex:
+    # history (optional) is the patients x history size array of condition codes (e.g. Cohort.medical_history),
+    # which saves decoding the Medical_History column; conditions then names the codes
+    def __init__(self, patient_database, columns=INDEX_COLUMNS, history=None, conditions=None):
+        self.patient_database = patient_database
+        self.size = len(patient_database)
+        self.bitmaps = {}  # column -> {value: Bitmap}
+        for column in columns:
+            if column in patient_database:
+                self.bitmaps[column] = _value_bitmaps(pd.Categorical(patient_database[column]))
+        if history is None:
+            history, conditions = history_codes(patient_database['Medical_History'], conditions)
+        self.conditions = list(conditions)
+        self.condition_bitmaps = _condition_bitmaps(history, self.conditions)
+
+    def all(self):
+        return ~self.none()
+
+    def none(self):
+        return Bitmap(np.zeros(-(-self.size // 8), dtype=np.uint8), self.size)
+
+    # Records whose column holds any of the values (None selects missing values)
+    def eq(self, column, *values):
+        if column not in self.bitmaps:
+            raise KeyError(f'{column} is not indexed; indexed columns are {list(self.bitmaps)}')
+        result = self.none()
+        for value in values:
+            bitmap = self.bitmaps[column].get(value)
+            if bitmap is not None:
+                result = result | bitmap
+        return result
+
+    # Records with the condition in their medical history
+    def has(self, condition):
+        if condition not in self.condition_bitmaps:
+            raise KeyError(f'{condition} is not a condition of the medical histories')
+        return self.condition_bitmaps[condition]
+
+    # Records with at least one of the conditions
+    def has_any(self, conditions):
+        result = self.none()
+        for condition in conditions:
+            result = result | self.has(condition)
+        return result
+
+    # Records with every one of the conditions
+    def has_all(self, conditions):
+        result = self.all()
+        for condition in conditions:
+            result = result & self.has(condition)
+        return result
+
+    # Function to combine filters with AND: column=value or column=[values] for indexed columns,
+    # conditions=[...] (all required) and any_conditions=[...] (at least one)
+    def query(self, conditions=(), any_conditions=(), **filters):
+        result = self.has_all(conditions)
+        if any_conditions:
+            result = result & self.has_any(any_conditions)
+        for column, values in filters.items():
+            if values is None or isinstance(values, str):
+                values = [values]
+            result = result & self.eq(column, *values)
+        return result
+
+    # The database rows of a bitmap
+    def select(self, bitmap, columns=None):
+        selected = self.patient_database.iloc[bitmap.rows()]
+        return selected if columns is None else selected[columns]
+
+    # Number of records per value of an indexed column, optionally within a bitmap
+    def counts(self, column, within=None):
+        if column == 'Medical_History':
+            bitmaps = self.condition_bitmaps
+        else:
+            bitmaps = self.bitmaps[column]
+        if within is None:
+            return {value: bitmap.count() for value, bitmap in bitmaps.items()}
+        return {value: (bitmap & within).count() for value, bitmap in bitmaps.items()}
+
+
+# One bitmap per category (and None for missing values, when there are any), from a Categorical's codes
+def _value_bitmaps(categorical):
+    codes = np.asarray(categorical.codes)
+    bitmaps = {value: Bitmap.from_mask(codes == code) for code, value in enumerate(categorical.categories)}
+    if (codes < 0).any():
+        bitmaps[None] = Bitmap.from_mask(codes < 0)
+    return bitmaps
+
+
+# Condition codes of a Medical_History column (a sequence of name arrays per record), padded with -1
+def history_codes(medical_history, conditions=None):
+    medical_history = list(medical_history)
+    lengths = np.fromiter(map(len, medical_history), dtype=np.int64, count=len(medical_history))
+    names = np.concatenate(medical_history).astype(object) if lengths.sum() else np.zeros(0, dtype=object)
+    if conditions is None:
+        conditions = sorted(set(names.tolist()))
+    flat = pd.Categorical(names, categories=list(conditions)).codes
+    history = np.full((len(lengths), lengths.max(initial=0)), -1, dtype=np.int16)
+    rows = np.repeat(np.arange(len(lengths)), lengths)
+    columns = np.arange(len(flat)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    history[rows, columns] = flat
+    return history, conditions
+
+
+# One bitmap per condition: the history is encoded as uint64 bitsets first (one pass over the codes),
+# then each condition's bitmap is one bit of those words
+def _condition_bitmaps(history, conditions):
+    history = np.asarray(history)
+    words = bitsets.encode_codes(np.where(history < 0, 0, history), len(conditions))
+    if (history < 0).any():
+        # Padding (-1) was encoded as condition 0 above; recount condition 0 from the codes themselves
+        words[:, 0] &= ~np.uint64(1)
+        words[:, 0] |= (history == 0).any(axis=1).astype(np.uint64)
+    bitmaps = {}
+    for code, condition in enumerate(conditions):
+        word = words[:, code // bitsets.WORD_BITS]
+        bitmaps[condition] = Bitmap.from_mask((word >> np.uint64(code % bitsets.WORD_BITS)) & np.uint64(1) != 0)
+    return bitmaps
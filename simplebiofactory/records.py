@@ -0,0 +1,205 @@
+import numpy as np
+import pandas as pd
+
+from simplebiofactory.cohort import code_dtype
+
+# Columns of a patient record, in the order the scripts build them
+RECORD_COLUMNS = ['Patient_ID', 'Genetics', 'Medical_History', 'Current_Health', 'Selected_Therapy',
+                  'Engineered_Microorganism', 'Bioreactor_Process', 'Dosage_Adjustment', 'Outcome']
+
+# Columns holding one of a handful of repeated strings, stored as small integer codes
+CATEGORY_COLUMNS = ['Current_Health', 'Selected_Therapy', 'Engineered_Microorganism',
+                    'Bioreactor_Process', 'Dosage_Adjustment', 'Outcome']
+
+CODE_DTYPE = np.int16  # -1 marks a missing value (None)
+
+# Genetic values lie in [0, 1]; uint8 genetics store round(value * GENETICS_SCALE)
+GENETICS_SCALE = 255
+
+
+# Append-only vocabulary of one category column: the strings are stored once and records carry
+# their codes. Pipeline stages share one Vocabulary per column (see pipeline.record_vocabularies), so
+# their codes need no translation between stages and strings are only decoded at the output edge.
+class Vocabulary:
+    def __init__(self, values=()):
+        self.values = []
+        self.index = {}
+        for value in values:
+            self.code(value)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __iter__(self):
+        return iter(self.values)
+
+    def __getitem__(self, code):
+        return self.values[code]
+
+    # Code of a value, added on first use (None is always -1, a missing value)
+    def code(self, value):
+        if value is None:
+            return -1
+        code = self.index.get(value)
+        if code is None:
+            code = self.index[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    # Lookup array translating codes into another vocabulary's values to codes of this one
+    # (one entry per value plus a final -1, so missing codes stay missing)
+    def remap(self, values):
+        return np.array([self.code(value) for value in values] + [-1], dtype=CODE_DTYPE)
+
+    # Function to decode an array of codes into an object array of strings (None for -1)
+    def decode(self, codes):
+        return np.array(self.values + [None], dtype=object)[codes]
+
+
+# Function to quantize genetic values in [0, 1] to uint8
+def quantize_genetics(values):
+    return np.rint(np.clip(values, 0.0, 1.0) * GENETICS_SCALE).astype(np.uint8)
+
+
+# Function to turn stored genetics (float or quantized uint8) back into float32 values
+def dequantize_genetics(values):
+    values = np.asarray(values)
+    if values.dtype == np.uint8:
+        return values.astype(np.float32) / GENETICS_SCALE
+    return values
+
+
+# Preallocated columnar builder for the patient database.
+# Every column is allocated up front for num_patients rows and filled in place, so memory is
+# known before the run starts (see estimate_nbytes) and building the DataFrame does not copy.
+# Genetics are one contiguous float32 block (or uint8 with genetics_dtype=np.uint8, a quarter of the size).
+# Medical_History is kept as condition codes, patients x history size like Cohort.medical_history (the
+# width is set by the first record), and only decoded into per-patient arrays of names by to_frame().
+# columns declares the category columns the records have (a version without outcomes leaves out 'Outcome').
+class RecordBuilder:
+    def __init__(self, num_patients, genes, genetics_dtype=np.float32, columns=CATEGORY_COLUMNS):
+        unknown = set(columns) - set(CATEGORY_COLUMNS)
+        if unknown:
+            raise ValueError(f'{sorted(unknown)} are not category columns; expected some of {CATEGORY_COLUMNS}')
+        self.capacity = num_patients
+        self.genes = list(genes)
+        self.columns = [column for column in CATEGORY_COLUMNS if column in columns]
+        self.size = 0
+
+        self.patient_id = np.zeros(num_patients, dtype=np.int64)
+        # Fortran order keeps each gene column contiguous, so it can back a DataFrame column directly
+        self.genetics = np.zeros((num_patients, len(self.genes)), dtype=genetics_dtype, order='F')
+        self.medical_history = None  # Condition codes into self.conditions, allocated by the first record
+        self.conditions = Vocabulary()
+        self.codes = {column: np.full(num_patients, -1, dtype=CODE_DTYPE) for column in self.columns}
+        self.categories = {column: Vocabulary() for column in self.columns}
+
+    # Approximate bytes held by a builder of this size
+    @staticmethod
+    def estimate_nbytes(num_patients, num_genes, genetics_dtype=np.float32, history_size=2, columns=CATEGORY_COLUMNS):
+        row = (np.dtype(np.int64).itemsize + num_genes * np.dtype(genetics_dtype).itemsize
+               + history_size * np.dtype(np.uint8).itemsize + len(columns) * np.dtype(CODE_DTYPE).itemsize)
+        return num_patients * row
+
+    @property
+    def nbytes(self):
+        history = 0 if self.medical_history is None else self.medical_history.nbytes
+        return (self.patient_id.nbytes + self.genetics.nbytes + history
+                + sum(codes.nbytes for codes in self.codes.values()))
+
+    # Function to store condition codes (already in self.conditions) for rows start:start + len(codes)
+    def _write_history(self, start, codes):
+        codes = np.asarray(codes).reshape(len(codes), -1)
+        if self.medical_history is None:
+            self.medical_history = np.zeros((self.capacity, codes.shape[1]), dtype=code_dtype(len(self.conditions)))
+        elif codes.shape[1] != self.medical_history.shape[1]:
+            raise ValueError(f'Every record needs a medical history of {self.medical_history.shape[1]} conditions')
+        dtype = code_dtype(len(self.conditions))
+        if np.dtype(dtype).itemsize > self.medical_history.dtype.itemsize:
+            self.medical_history = self.medical_history.astype(dtype)
+        self.medical_history[start:start + len(codes)] = codes
+
+    # Write one patient_record dict (keys from RECORD_COLUMNS; missing categories are stored as None, keys
+    # of undeclared columns are ignored) into the next free row
+    def append(self, record):
+        row = self.size
+        if row >= self.capacity:
+            raise IndexError(f'RecordBuilder is full ({self.capacity} records)')
+
+        self.patient_id[row] = record['Patient_ID']
+        genetics = record['Genetics']
+        values = [genetics[gene] for gene in self.genes]
+        if self.genetics.dtype == np.uint8:
+            values = quantize_genetics(values)
+        self.genetics[row] = values
+        self._write_history(row, [[self.conditions.code(condition) for condition in record['Medical_History']]])
+        for column in self.columns:
+            self.codes[column][row] = self.categories[column].code(record.get(column))
+        self.size += 1
+
+    # Write a block of rows at once. medical_history is (codes, conditions), a patients x history size array
+    # of codes into the conditions list (e.g. Cohort.medical_history and Cohort.conditions). categories maps
+    # a column to (codes, vocabulary), where the codes index the vocabulary list and -1 is a missing value;
+    # declared columns not given are stored as missing.
+    def extend(self, patient_ids, genetics, medical_history, categories):
+        start, stop = self.size, self.size + len(patient_ids)
+        if stop > self.capacity:
+            raise IndexError(f'RecordBuilder is full ({self.capacity} records)')
+        undeclared = set(categories) - set(self.columns)
+        if undeclared:
+            raise ValueError(f'{sorted(undeclared)} are not columns of this RecordBuilder')
+
+        self.patient_id[start:stop] = patient_ids
+        self.genetics[start:stop] = quantize_genetics(genetics) if self.genetics.dtype == np.uint8 else genetics
+        history, conditions = medical_history
+        remap = self.conditions.remap(conditions)[:-1]
+        self._write_history(start, history if np.array_equal(remap, np.arange(len(conditions))) else remap[history])
+        for column, (codes, vocabulary) in categories.items():
+            remap = self.categories[column].remap(vocabulary)
+            if np.array_equal(remap[:-1], np.arange(len(vocabulary))):
+                self.codes[column][start:stop] = codes  # Same vocabulary (e.g. the pipeline's shared one)
+            else:
+                self.codes[column][start:stop] = remap[codes]
+        self.size = stop
+
+    # DataFrame over the filled rows; genetics become one numeric column per gene, named after the gene.
+    # The gene names are kept in DataFrame.attrs['genes'] for genetics_matrix() and genetics_dict().
+    def to_frame(self):
+        size = self.size
+        columns = {'Patient_ID': self.patient_id[:size]}
+        for j, gene in enumerate(self.genes):
+            columns[gene] = self.genetics[:size, j]
+        columns['Medical_History'] = self.history_column()
+        for column in self.columns:
+            columns[column] = pd.Categorical.from_codes(self.codes[column][:size], self.categories[column].values)
+        patient_database = pd.DataFrame(columns, copy=False)
+        patient_database.attrs['genes'] = list(self.genes)
+        return patient_database
+
+    # Medical_History of the filled rows as an object array holding one array of condition names per patient
+    def history_column(self):
+        if self.medical_history is None:
+            return np.full(self.size, None, dtype=object)
+        names = np.array(self.conditions.values, dtype=object)[self.medical_history[:self.size]]
+        # The trailing None keeps NumPy from treating the equal-length rows as one 2-D array
+        return np.array(list(names) + [None], dtype=object)[:-1]
+
+
+# Function to get one gene's values across the whole database (for filters and aggregates)
+def gene_values(patient_database, gene):
+    return dequantize_genetics(patient_database[gene].to_numpy())
+
+
+# Function to get the genetics of a patient database as a patients x genes float32 matrix
+def genetics_matrix(patient_database, genes=None):
+    if genes is None:
+        genes = patient_database.attrs['genes']
+    return dequantize_genetics(patient_database[list(genes)].to_numpy())
+
+
+# Function to get one patient's genetics as a gene -> value dict (the old 'Genetics' cell)
+def genetics_dict(patient_database, row, genes=None):
+    if genes is None:
+        genes = patient_database.attrs['genes']
+    values = dequantize_genetics(patient_database.loc[row, list(genes)].to_numpy())
+    return {gene: float(value) for gene, value in zip(genes, values)}
@@ -0,0 +1,102 @@
+import sys
+
+import numpy as np
+import pandas as pd
+
+from simplebiofactory.records import CATEGORY_COLUMNS, genetics_matrix
+
+REPORT_MODES = ('detail', 'brief', 'summary', 'csv', 'jsonl', 'quiet')
+DEFAULT_BLOCK_SIZE = 10_000  # Patients rendered per buffered write
+SEPARATOR = '\n' + '-' * 50 + '\n\n'
+
+
+# Per-row strings for a category column: each category is formatted once and indexed by the row codes
+def _category_lines(series, template, missing=''):
+    categorical = pd.Categorical(series)
+    lines = np.array([template.format(category) for category in categorical.categories] + [missing], dtype=object)
+    return lines[categorical.codes]
+
+
+# Per-row strings for a numeric column, formatted in one NumPy call
+def _number_lines(values, template):
+    return np.char.mod(template, values).astype(object)
+
+
+def _history_text(patient_database):
+    return np.array([', '.join(history) for history in patient_database['Medical_History']], dtype=object)
+
+
+# Same text as the per-patient print loops of 2.3/2.4
+def _detail_lines(block, genes):
+    lines = _number_lines(block['Patient_ID'].to_numpy(), 'Patient ID: %d\n') + 'Genetics:\n'
+    values = genetics_matrix(block, genes)
+    for column, gene in enumerate(genes):
+        lines = lines + _number_lines(values[:, column], f'  {gene}: %.2f\n')
+    lines = lines + 'Medical History: ' + _history_text(block) + '\n'
+    lines = lines + _category_lines(block['Current_Health'], 'Current Health: {}\n')
+    lines = lines + _category_lines(block['Selected_Therapy'], 'Selected Therapy: {}\n')
+    # Engineered microorganism and bioreactor process only when both are present
+    both = block['Engineered_Microorganism'].notna().to_numpy() & block['Bioreactor_Process'].notna().to_numpy()
+    manufacturing = (_category_lines(block['Engineered_Microorganism'], 'Engineered Microorganism: {}\n')
+                     + _category_lines(block['Bioreactor_Process'], 'Bioreactor Process: {}\n'))
+    lines = lines + np.where(both, manufacturing, '')
+    lines = lines + _category_lines(block['Dosage_Adjustment'], 'Dosage Adjustment: {}\n')
+    lines = lines + _category_lines(block['Outcome'], 'Outcome: {}\n', missing='Outcome: None\n') + SEPARATOR
+    return lines
+
+
+# Same text as the per-patient print loop of 2.2
+def _brief_lines(block):
+    prefix = _number_lines(block['Patient_ID'].to_numpy(), 'Patient %d - ')
+    lines = prefix + _category_lines(block['Selected_Therapy'], 'Selected Therapy: {}\n')
+    lines = lines + prefix + _category_lines(block['Engineered_Microorganism'], 'Engineered Microorganism: {}\n',
+                                             missing='Engineered Microorganism: None\n')
+    lines = lines + prefix + _category_lines(block['Bioreactor_Process'], 'Bioreactor Process: {}\n')
+    lines = lines + prefix + _category_lines(block['Outcome'], 'Outcome: {}\n\n', missing='Outcome: None\n\n')
+    return lines
+
+
+# Patient count and the distribution of every category column
+def _summary_text(patient_database):
+    parts = [f'Patients: {len(patient_database)}\n']
+    for column in CATEGORY_COLUMNS:
+        if column in patient_database:
+            parts.append(f'\n{column}:\n')
+            for value, count in patient_database[column].value_counts(dropna=False).items():
+                if count:
+                    parts.append(f'  {"None" if pd.isna(value) else value}: {count}\n')
+    return ''.join(parts)
+
+
+# Function to write a report of the patient database in large buffered writes.
+# mode is one of REPORT_MODES: 'detail' and 'brief' render the scripts' per-patient text,
+# 'summary' only counts, 'csv'/'jsonl' are machine-readable and 'quiet' writes nothing.
+def write_report(patient_database, mode='detail', out=None, genes=None, block_size=DEFAULT_BLOCK_SIZE):
+    if mode not in REPORT_MODES:
+        raise ValueError(f'Unknown report mode {mode!r}; expected one of {REPORT_MODES}')
+    if mode == 'quiet':
+        return
+    if out is None:
+        out = sys.stdout
+    if genes is None:
+        genes = patient_database.attrs.get('genes', [])
+
+    if mode == 'summary':
+        out.write(_summary_text(patient_database))
+        return
+    # The text modes render the columns a version does not produce (e.g. Outcome) as missing values
+    missing = {column: None for column in CATEGORY_COLUMNS if column not in patient_database}
+    for start in range(0, len(patient_database), block_size):
+        block = patient_database.iloc[start:start + block_size]
+        if mode in ('detail', 'brief') and missing:
+            block = block.assign(**missing)
+        if mode == 'detail':
+            out.write(''.join(_detail_lines(block, genes)))
+        elif mode == 'brief':
+            out.write(''.join(_brief_lines(block)))
+        else:
+            block = block.assign(Medical_History=_history_text(block))
+            if mode == 'csv':
+                block.to_csv(out, header=start == 0, index=False)
+            else:
+                block.to_json(out, orient='records', lines=True)
@@ -0,0 +1,195 @@
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+from simplebiofactory import bitsets
+from simplebiofactory.cohort import HEALTH_STATES
+from simplebiofactory.profiles import DEFAULT_THERAPY, NO_RECOMMENDATION
+
+# Table entry meaning "this condition leaves the selected therapy unchanged"
+KEEP = -1
+
+
+# Last non-KEEP entry of each row of a patients x history table, or default when the row has none.
+# This mirrors the scripts' loops over medical_history where the last matching condition wins.
+def last_hit(hits, default):
+    present = hits != KEEP
+    last = hits.shape[1] - 1 - np.argmax(present[:, ::-1], axis=1)
+    selected = hits[np.arange(len(hits)), last]
+    return np.where(present.any(axis=1), selected, default).astype(np.int16)
+
+
+# Base class for compiled therapy rules: therapies are integer codes into self.therapies
+class CompiledRules(ABC):
+    random = False  # True when select() draws random values (such results cannot be cached)
+
+    def __init__(self, default_therapy):
+        self.therapies = []
+        self.codes = {}
+        self.default_code = self.code(default_therapy)
+
+    # Code for a therapy name, adding it to the vocabulary on first use
+    def code(self, therapy):
+        if therapy not in self.codes:
+            self.codes[therapy] = len(self.therapies)
+            self.therapies.append(therapy)
+        return self.codes[therapy]
+
+    # Therapy codes for a cohort
+    @abstractmethod
+    def select(self, cohort, rng=None):
+        pass
+
+    # Therapy names for a cohort (decoded from select())
+    def select_names(self, cohort, rng=None):
+        return np.array(self.therapies, dtype=object)[self.select(cohort, rng)]
+
+    def _check_conditions(self, cohort):
+        if cohort.conditions != self.conditions:
+            raise ValueError('Cohort medical history conditions do not match the compiled rules')
+
+
+# Compiled form of a gene_impact dict (2.2, 2.4, 3.1): for each condition a gene is drawn
+# at random and gene_impact[gene][condition] becomes the selected therapy.
+# missing_gene=None keeps the previous therapy when the drawn gene has no entry (3.1).
+class GeneImpactRules(CompiledRules):
+    random = True
+
+    def __init__(self, gene_impact, genes, conditions, missing_gene=DEFAULT_THERAPY,
+                 missing_condition=DEFAULT_THERAPY, default_therapy=NO_RECOMMENDATION):
+        super().__init__(default_therapy)
+        self.genes = tuple(genes)
+        self.conditions = tuple(conditions)
+
+        # Lookup table indexed by (drawn gene code, condition code)
+        self.table = np.full((len(self.genes), len(self.conditions)), KEEP, dtype=np.int16)
+        for g, gene in enumerate(self.genes):
+            if gene in gene_impact:
+                for c, condition in enumerate(self.conditions):
+                    self.table[g, c] = self.code(gene_impact[gene].get(condition, missing_condition))
+            elif missing_gene is not None:
+                self.table[g, :] = self.code(missing_gene)
+
+    # Gene codes drawn at random for every medical history entry (the only random part of select())
+    def draw(self, cohort, rng=None):
+        if rng is None:
+            rng = np.random.default_rng()
+        return rng.integers(0, len(self.genes), cohort.medical_history.shape)
+
+    # drawn_genes replays earlier draws (see draw()), so a cohort can be re-evaluated deterministically
+    def select(self, cohort, rng=None, drawn_genes=None):
+        self._check_conditions(cohort)
+        if drawn_genes is None:
+            drawn_genes = self.draw(cohort, rng)
+        return last_hit(self.table[drawn_genes, cohort.medical_history], self.default_code)
+
+
+# Compiled form of a THERAPIES dict (2.3): a therapy is eligible when all its genes_required
+# are present, and a condition selects the first eligible therapy that lists it in genes_required.
+class TherapyTableRules(CompiledRules):
+    def __init__(self, therapies, genes, conditions, default_therapy=NO_RECOMMENDATION):
+        super().__init__(default_therapy)
+        self.genes = tuple(genes)
+        self.conditions = tuple(conditions)
+        eligible = [therapy for therapy in therapies if set(therapies[therapy]['genes_required']).issubset(self.genes)]
+
+        # Lookup table indexed by condition code
+        self.table = np.full(len(self.conditions), KEEP, dtype=np.int16)
+        for c, condition in enumerate(self.conditions):
+            for therapy in eligible:
+                if condition in therapies[therapy]['genes_required']:
+                    self.table[c] = self.code(therapy)
+                    break
+
+    def select(self, cohort, rng=None):
+        self._check_conditions(cohort)
+        if cohort.genes != self.genes:
+            raise ValueError('Cohort genes do not match the compiled rules')
+        return last_hit(self.table[cohort.medical_history], self.default_code)
+
+
+# Compiled form of an if/elif chain (1, 1.2, 2.1). Steps are (therapy, predicates) pairs run in order;
+# a later step overrides an earlier one, the same way the chains reassign selected_therapy.
+# Predicates (all must hold):
+#   ('history', condition)               condition appears in medical_history
+#   ('allergy', allergy)                 allergy appears in allergies
+#   ('above', biomarker, value)          biomarker > value ('systolic', 'diastolic', 'cholesterol')
+#   ('at_most', biomarker, value)        biomarker <= value
+#   ('mean_genetics_above', value)       mean of the genetic data > value
+#   ('health', state)                    current_health == state
+class ChainRules(CompiledRules):
+    def __init__(self, steps, conditions, allergy_names=(), default_therapy=NO_RECOMMENDATION):
+        super().__init__(default_therapy)
+        self.conditions = tuple(conditions)
+        self.allergy_names = tuple(allergy_names)
+        self.steps = [(self.code(therapy), [self._compile_predicate(p) for p in predicates])
+                      for therapy, predicates in steps]
+
+        # Sorted thresholds of the number predicates per biomarker ('mean_genetics' for the genetics mean)
+        thresholds = {}
+        for _, predicates in steps:
+            for kind, *args in predicates:
+                if kind in ('above', 'at_most'):
+                    thresholds.setdefault(args[0], set()).add(args[1])
+                elif kind == 'mean_genetics_above':
+                    thresholds.setdefault('mean_genetics', set()).add(args[0])
+        self.thresholds = {name: sorted(values) for name, values in thresholds.items()}
+
+    # Resolve names in a predicate to integer codes once, at compile time
+    def _compile_predicate(self, predicate):
+        kind, *args = predicate
+        if kind == 'history':
+            return kind, self._mask(self.conditions, args[0])
+        if kind == 'allergy':
+            return kind, self._mask(self.allergy_names, args[0])
+        if kind == 'health':
+            return kind, HEALTH_STATES.index(args[0])
+        if kind in ('above', 'at_most', 'mean_genetics_above'):
+            return (kind, *args)
+        raise ValueError(f'Unknown rule predicate: {kind}')
+
+    # Bitset mask for one name (all zero, so never matching, when the name is not in the vocabulary)
+    @staticmethod
+    def _mask(names, name):
+        return bitsets.names_mask(names, [name] if name in names else [])
+
+    def _evaluate(self, predicate, cohort):
+        kind, *args = predicate
+        if kind == 'history':
+            return bitsets.has_any(cohort.history_bits, args[0])
+        if kind == 'allergy':
+            return bitsets.has_any(cohort.allergy_bits, args[0])
+        if kind == 'above':
+            return getattr(cohort, args[0]) > args[1]
+        if kind == 'at_most':
+            return getattr(cohort, args[0]) <= args[1]
+        if kind == 'mean_genetics_above':
+            return cohort.genetics_mean() > args[0]
+        return cohort.current_health == args[0]
+
+    # rng is unused: no chain predicate is random (drug blocker tests run in screening.Screening)
+    def select(self, cohort, rng=None):
+        self._check_conditions(cohort)
+        therapy = np.full(len(cohort), self.default_code, dtype=np.int16)
+        for code, predicates in self.steps:
+            mask = np.ones(len(cohort), dtype=bool)
+            for predicate in predicates:
+                mask &= self._evaluate(predicate, cohort)
+            therapy[mask] = code
+        return therapy
+
+
+# Function to compile the therapy rules of a version profile (see profiles.PROFILES)
+def compile_rules(profile):
+    default_therapy = profile.get('default_therapy', NO_RECOMMENDATION)
+    genes = list(profile['genes']) if not isinstance(profile['genes'], int) else None
+    if 'chain' in profile:
+        return ChainRules(profile['chain'], profile['conditions'], profile.get('allergies', ()),
+                          default_therapy=default_therapy)
+    if 'gene_impact' in profile:
+        return GeneImpactRules(profile['gene_impact'], profile.get('impact_genes', genes), profile['conditions'],
+                               missing_gene=profile['missing_gene'], default_therapy=default_therapy)
+    if 'therapies' in profile:
+        return TherapyTableRules(profile['therapies'], genes, profile['conditions'],
+                                 default_therapy=default_therapy)
+    raise ValueError('Profile has no therapy rules')
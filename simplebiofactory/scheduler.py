@@ -0,0 +1,157 @@
+import heapq
+
+import numpy as np
+import pandas as pd
+
+from simplebiofactory.kinetics import IDLE_PROCESSES, kinetics_table
+
+DEFAULT_CAPACITY = 50  # Patient doses per reactor run
+DEFAULT_CHANGEOVER_HOURS = 12.0  # Cleaning and re-seeding when a reactor switches to another process
+DEFAULT_DOSAGE_CHANGEOVER_HOURS = 2.0  # Same process, different dosage tier
+
+# Production scheduling: orders (one per patient) that share a bioreactor process and dosage tier are
+# pooled into runs of up to capacity doses, and the runs are placed on a limited pool of reactors.
+# Runs are placed longest group first on the reactor that can finish them earliest: a reactor that
+# last ran the same group needs no changeover, any other one pays the changeover first. Reactors are
+# kept in a heap by the hour they become free, plus one heap per group of the reactors that last ran
+# it, so every run is placed in O(log reactors).
+
+
+# A finished schedule: one row per reactor run plus the run of every order
+class Schedule:
+    def __init__(self, runs, order_runs, num_reactors, processes, dosages):
+        self.runs = runs  # DataFrame: Reactor, Process, Dosage, Orders, Changeover, Start, End
+        self.order_runs = order_runs  # Run index of every order (-1 for orders that need no reactor)
+        self.num_reactors = num_reactors
+        self.processes = processes
+        self.dosages = dosages
+
+    def __len__(self):
+        return len(self.runs)
+
+    # Hours until the last run finishes
+    @property
+    def makespan(self):
+        return float(self.runs['End'].max()) if len(self.runs) else 0.0
+
+    # Share of the reactor hours up to the makespan spent producing (changeovers excluded)
+    @property
+    def utilization(self):
+        if not len(self.runs):
+            return 0.0
+        producing = (self.runs['End'] - self.runs['Start'] - self.runs['Changeover']).sum()
+        return float(producing / (self.makespan * self.num_reactors))
+
+    # Doses finished per hour over the whole schedule
+    @property
+    def throughput(self):
+        return float(self.runs['Orders'].sum() / self.makespan) if len(self.runs) else 0.0
+
+    # Start and end hour of every order's run (NaN for orders that need no reactor)
+    def order_times(self):
+        scheduled = self.order_runs >= 0
+        start = np.full(len(self.order_runs), np.nan)
+        end = np.full(len(self.order_runs), np.nan)
+        start[scheduled] = self.runs['Start'].to_numpy()[self.order_runs[scheduled]]
+        end[scheduled] = self.runs['End'].to_numpy()[self.order_runs[scheduled]]
+        return start, end
+
+    # One-line summary of the schedule, as printed by the scripts
+    def summary(self):
+        return (f'Production schedule: {len(self)} reactor runs on {self.num_reactors} reactors, '
+                f'makespan {self.makespan:.0f} h, utilization {self.utilization:.0%}, '
+                f'{self.throughput:.1f} doses per hour')
+
+
+# Function to schedule orders given as process and dosage codes (into processes and dosages, -1 missing)
+def schedule_orders(process_codes, dosage_codes, processes, dosages, num_reactors, capacity=DEFAULT_CAPACITY,
+                    changeover_hours=DEFAULT_CHANGEOVER_HOURS,
+                    dosage_changeover_hours=DEFAULT_DOSAGE_CHANGEOVER_HOURS):
+    if num_reactors < 1:
+        raise ValueError('Scheduling needs at least one reactor')
+    if capacity < 1:
+        raise ValueError('Reactor capacity must be at least one dose')
+    processes, dosages = list(processes), list(dosages)
+    process_codes = np.asarray(process_codes, dtype=np.int64)
+    dosage_codes = np.asarray(dosage_codes, dtype=np.int64)
+    batch_hours = kinetics_table(processes)['batch_hours']
+
+    # Group orders by (process, dosage); dosage -1 gets its own slot so every key is non-negative
+    idle = np.isin(np.array(processes, dtype=object), IDLE_PROCESSES)
+    needs_reactor = (process_codes >= 0) & ~idle[np.maximum(process_codes, 0)]
+    keys = np.where(needs_reactor, process_codes * (len(dosages) + 1) + dosage_codes + 1, -1)
+    orders = np.flatnonzero(needs_reactor)
+    groups, group_of_order, group_sizes = np.unique(keys[orders], return_inverse=True, return_counts=True)
+    group_processes = groups // (len(dosages) + 1)
+    group_dosages = groups % (len(dosages) + 1) - 1
+    group_runs = -(-group_sizes // capacity)
+
+    # Runs of each group, longest total work first
+    order = np.argsort(-(group_runs * batch_hours[group_processes]), kind='stable')
+    first_run = np.zeros(len(groups), dtype=np.int64)
+    first_run[order] = np.cumsum(group_runs[order]) - group_runs[order]
+
+    free = [(0.0, reactor, 0) for reactor in range(num_reactors)]  # (free at hour, reactor, stamp)
+    last_group = [-1] * num_reactors
+    stamp = [0] * num_reactors  # Bumped when a reactor is used, so its older heap entries are skipped
+    group_free = {}  # group -> heap of (free at hour, reactor, stamp)
+    total_runs = int(group_runs.sum())
+    run_reactor = np.empty(total_runs, dtype=np.int64)
+    run_start = np.empty(total_runs)
+    run_end = np.empty(total_runs)
+    run_changeover = np.empty(total_runs)
+
+    for group in order:
+        duration = batch_hours[group_processes[group]]
+        same_group = group_free.setdefault(group, [])
+        for run in range(first_run[group], first_run[group] + group_runs[group]):
+            while same_group and same_group[0][2] != stamp[same_group[0][1]]:
+                heapq.heappop(same_group)
+            while free[0][2] != stamp[free[0][1]]:
+                heapq.heappop(free)
+            hour, reactor, _ = free[0]
+            changeover = 0.0
+            if last_group[reactor] >= 0 and last_group[reactor] != group:
+                same_process = group_processes[last_group[reactor]] == group_processes[group]
+                changeover = dosage_changeover_hours if same_process else changeover_hours
+            if same_group and same_group[0][0] <= hour + changeover:
+                hour, reactor, _ = same_group[0]
+                changeover = 0.0
+            run_reactor[run] = reactor
+            run_start[run] = hour
+            run_end[run] = hour + changeover + duration
+            run_changeover[run] = changeover
+            last_group[reactor] = group
+            stamp[reactor] += 1
+            heapq.heappush(free, (run_end[run], reactor, stamp[reactor]))
+            heapq.heappush(same_group, (run_end[run], reactor, stamp[reactor]))
+
+    # Orders fill their group's runs in patient order
+    order_runs = np.full(len(process_codes), -1, dtype=np.int64)
+    by_group = np.argsort(group_of_order, kind='stable')
+    rank = np.arange(len(orders)) - np.repeat(np.cumsum(group_sizes) - group_sizes, group_sizes)
+    order_runs[orders[by_group]] = first_run[group_of_order[by_group]] + rank // capacity
+
+    run_group = np.repeat(np.arange(len(groups)), group_runs)[np.argsort(np.repeat(first_run, group_runs),
+                                                                        kind='stable')]
+    runs = pd.DataFrame({
+        'Reactor': run_reactor,
+        'Process': pd.Categorical.from_codes(group_processes[run_group], processes),
+        'Dosage': pd.Categorical.from_codes(group_dosages[run_group], dosages),
+        'Orders': np.bincount(order_runs[orders], minlength=total_runs),
+        'Changeover': run_changeover,
+        'Start': run_start,
+        'End': run_end,
+    })
+    return Schedule(runs, order_runs, num_reactors, processes, dosages)
+
+
+# Function to schedule the orders of a patient database (its Bioreactor_Process and Dosage_Adjustment columns)
+def schedule_database(patient_database, num_reactors, **options):
+    process = pd.Categorical(patient_database['Bioreactor_Process'])
+    if 'Dosage_Adjustment' in patient_database:
+        dosage = pd.Categorical(patient_database['Dosage_Adjustment'])
+        dosage_codes, dosages = dosage.codes, list(dosage.categories)
+    else:
+        dosage_codes, dosages = np.full(len(patient_database), -1), []
+    return schedule_orders(process.codes, dosage_codes, list(process.categories), dosages, num_reactors, **options)
@@ -0,0 +1,144 @@
+import numpy as np
+
+from simplebiofactory.manufacturing import entry_matches
+from simplebiofactory.tiers import Tiers
+
+# Drug interaction and drug blocker screening of selected therapies (see profiles.SCREENING_*).
+# Interactions are a therapy x drug boolean matrix built once, so screening a cohort is one gather of
+# matrix rows by therapy code. Blocker entries apply to the therapies they match (first match wins,
+# like the scripts' if/elif chains) and either tier a gene's value ('gene' with 'levels', e.g. TP53
+# in 2.4) or stand for a genetic test of random_genes fresh values ('random_genes' with 'threshold', 1.2).
+# screen() returns arrays only; warning text is formatted once per therapy and attached by render().
+
+
+# Screening flags of a cohort: interaction and blocker codes per patient (-1 where none applies)
+class ScreeningResult:
+    def __init__(self, therapy, interaction, blocker):
+        self.therapy = therapy  # Therapy codes that were screened
+        self.interaction = interaction  # Codes into Screening.interaction_sets
+        self.blocker = blocker  # Codes into Screening.blocked
+
+    def __len__(self):
+        return len(self.therapy)
+
+    # Patients whose therapy interacts with at least one drug
+    def interacts(self):
+        return self.interaction >= 0
+
+    # Patients whose therapy a blocker adjusted
+    def blocked(self):
+        return self.blocker >= 0
+
+
+class Screening:
+    def __init__(self, spec, therapies, genes):
+        self.therapies = list(therapies)
+        genes = list(genes)
+        interactions = spec.get('interactions', {})
+
+        # Drug vocabulary and the therapy x drug interaction matrix
+        self.drugs = []
+        for drugs in interactions.values():
+            self.drugs.extend(drug for drug in drugs if drug not in self.drugs)
+        self.matrix = np.zeros((len(self.therapies), len(self.drugs)), dtype=bool)
+        for code, therapy in enumerate(self.therapies):
+            for drug in interactions.get(therapy, ()):
+                self.matrix[code, self.drugs.index(drug)] = True
+
+        # Therapies with the same interacting drugs share an interaction set; interaction_codes maps
+        # each therapy code to its set (-1 for therapies without interactions)
+        self.interaction_sets = []
+        self.interaction_codes = np.full(len(self.therapies), -1, dtype=np.int16)
+        for code, therapy in enumerate(self.therapies):
+            drugs = tuple(interactions.get(therapy, ()))
+            if drugs:
+                if drugs not in self.interaction_sets:
+                    self.interaction_sets.append(drugs)
+                self.interaction_codes[code] = self.interaction_sets.index(drugs)
+
+        # Blocker rules: (therapy code, gene column, Tiers, tier -> blocked code) for gene tiers,
+        # (therapy code, None, probability, blocked code) for random genetic tests
+        self.blocked = []  # Adjusted therapy names the blocker codes index
+        self.blocker_rules = []
+        for code, therapy in enumerate(self.therapies):
+            entry = next((entry for entry in spec.get('blockers', ()) if entry_matches(entry, therapy)), None)
+            if entry is None:
+                continue
+            if 'gene' in entry:
+                if entry['gene'] not in genes:
+                    raise ValueError(f'Blocker gene {entry["gene"]} for {therapy} is not in the genetic data')
+                tiers = Tiers(entry['levels'], None)
+                remap = np.array([-1] + [self._blocked_code(label) for label in tiers.labels[1:]], dtype=np.int16)
+                self.blocker_rules.append((code, genes.index(entry['gene']), tiers, remap))
+            else:
+                # P(any of random_genes draws > threshold) == 1 - threshold ** random_genes: one draw per patient
+                probability = 1.0 - entry['threshold'] ** entry['random_genes']
+                self.blocker_rules.append((code, None, probability, self._blocked_code(entry['blocked'])))
+
+    def _blocked_code(self, name):
+        if name not in self.blocked:
+            self.blocked.append(name)
+        return self.blocked.index(name)
+
+    # Uniform values for the random blocker tests, one per patient (a patient's therapy matches at most
+    # one blocker rule, so one value serves every test); screen() replays tests from them
+    def draw(self, size, rng=None):
+        if rng is None:
+            rng = np.random.default_rng()
+        return rng.random(size)
+
+    # Function to screen therapy codes of a cohort; random blocker tests use draws (see draw()),
+    # drawn from rng when not given
+    def screen(self, cohort, therapy_codes, rng=None, draws=None):
+        therapy_codes = np.asarray(therapy_codes)
+        interaction = self.interaction_codes[therapy_codes]
+        blocker = np.full(len(therapy_codes), -1, dtype=np.int16)
+        if draws is None and any(gene is None for _, gene, _, _ in self.blocker_rules):
+            draws = self.draw(len(therapy_codes), rng)
+        for code, gene, test, remap in self.blocker_rules:
+            if gene is None:
+                hits = (therapy_codes == code) & (draws < test)
+                blocker[hits] = remap
+                continue
+            rows = np.flatnonzero(therapy_codes == code)
+            if len(rows):
+                blocker[rows] = remap[test.assign(cohort.gene_values(gene, rows))]
+        return ScreeningResult(therapy_codes, interaction, blocker)
+
+    # Patients x drugs interaction flags (packed=True packs 8 drugs per byte, for hundreds of drugs)
+    def interaction_matrix(self, result, packed=False):
+        matrix = np.packbits(self.matrix, axis=1) if packed else self.matrix
+        return matrix[result.therapy]
+
+    # Patients whose therapy interacts with one drug
+    def interacts_with(self, result, drug):
+        return self.matrix[result.therapy, self.drugs.index(drug)]
+
+    # Output name of each therapy: the therapy with its interaction warning, if any
+    def therapy_names(self):
+        names = []
+        for code, therapy in enumerate(self.therapies):
+            if self.interaction_codes[code] >= 0:
+                therapy += f' (May interact with {", ".join(self.interaction_sets[self.interaction_codes[code]])})'
+            names.append(therapy)
+        return names
+
+    # Output names the codes of output_codes() index: therapy_names(), then the blocked names
+    def output_names(self):
+        return self.therapy_names() + self.blocked
+
+    # Output name codes of a ScreeningResult: blocked patients get the adjusted therapy,
+    # the others their therapy with its interaction warning
+    def output_codes(self, result):
+        codes = result.therapy.astype(np.int16)
+        blocked = result.blocker >= 0
+        codes[blocked] = len(self.therapies) + result.blocker[blocked]
+        return codes
+
+    # Rendered therapy names of a ScreeningResult
+    def names(self, result):
+        return np.array(self.output_names(), dtype=object)[self.output_codes(result)]
+
+    # Function to render a ScreeningResult as codes into vocabulary (a records.Vocabulary)
+    def render(self, result, vocabulary):
+        return vocabulary.remap(self.output_names())[self.output_codes(result)]
@@ -0,0 +1,307 @@
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+import numpy as np
+
+from simplebiofactory import api
+from simplebiofactory.cohort import gene_names
+from simplebiofactory.manufacturing import ManufacturingTable
+from simplebiofactory.profiles import PROFILES
+
+# Online therapy selection. Requests (one patient dict each) are queued and merged into micro-batches:
+# the batcher takes the first waiting request, then keeps collecting until max_batch_size requests are
+# in or max_wait seconds have passed, and runs the whole batch through the vectorized rules and
+# biomanufacturing table at once. The queue holds at most max_queue requests; when it is full, callers
+# of select() wait (backpressure) and try_select() fails at once with Overloaded.
+# serve() exposes the service over TCP as JSON lines ({"id": ..., patient keys} in, {"id": ..., result} out)
+# and load_test() is a local open-loop client that reports throughput and latency percentiles:
+#   python -m simplebiofactory.service serve 2.4 --port 8765
+#   python -m simplebiofactory.service load 2.4 --rate 5000 --duration 10
+
+DEFAULT_BATCH_SIZE = 256
+DEFAULT_MAX_WAIT = 0.002  # Seconds the first request of a batch may wait for more to arrive
+DEFAULT_MAX_QUEUE = 10_000
+DEFAULT_PORT = 8765
+
+
+class Overloaded(Exception):
+    pass
+
+
+class TherapyService:
+    def __init__(self, version, max_batch_size=DEFAULT_BATCH_SIZE, max_wait=DEFAULT_MAX_WAIT,
+                 max_queue=DEFAULT_MAX_QUEUE, seed=None):
+        profile = PROFILES[version]
+        self.version = version
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.rules = api.therapy_rules(version)
+        self.table = ManufacturingTable(profile['manufacturing'], self.rules.therapies, gene_names(profile['genes']))
+        self.screening = api.therapy_screening(version)
+        self.rng = np.random.default_rng(seed)
+        self.queue = asyncio.Queue(max_queue)
+        self.batches = 0
+        self.requests = 0
+        self._task = None
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        return self
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    # Therapy and biomanufacturing for one patient dict (waits while the queue is full)
+    async def select(self, patient):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((patient, future))
+        return await future
+
+    # Same as select(), but raises Overloaded instead of waiting when the queue is full
+    async def try_select(self, patient):
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((patient, future))
+        except asyncio.QueueFull:
+            raise Overloaded(f'{self.queue.qsize()} requests already queued') from None
+        return await future
+
+    async def _collect(self):
+        batch = [await self.queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            if not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                continue
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            rows, futures = [], []
+            for patient, future in batch:
+                if future.done():
+                    continue
+                # A malformed request fails on its own future and is left out of the batch
+                try:
+                    rows.append(api.patient_row(self.version, patient))
+                except ValueError as error:
+                    future.set_exception(error)
+                    continue
+                futures.append(future)
+            try:
+                results = self._process_rows(rows)
+            except Exception as error:
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+            for future, result in zip(futures, results):
+                if not future.done():
+                    future.set_result(result)
+            self.batches += 1
+            self.requests += len(batch)
+
+    # Function to run one batch of patient dicts through the vectorized path; returns one dict per patient
+    def process(self, patients):
+        return self._process_rows([api.patient_row(self.version, patient) for patient in patients])
+
+    def _process_rows(self, rows):
+        results = [None] * len(rows)
+        for indices in api.group_rows(rows):
+            cohort = api.cohort_from_rows(self.version, [rows[index] for index in indices])
+            therapy = self.rules.select(cohort, self.rng)
+            microorganism, process, dosage = self.table.apply(cohort, therapy)
+            if self.screening is None:
+                names = np.array(self.rules.therapies, dtype=object)[therapy]
+            else:
+                names = self.screening.names(self.screening.screen(cohort, therapy, self.rng))
+            for index, name, m, p, d in zip(indices, names.tolist(), microorganism.tolist(), process.tolist(),
+                                            dosage.tolist()):
+                results[index] = {
+                    'therapy': name,
+                    'engineered_microorganism': self.table.microorganisms[m] if m >= 0 else None,
+                    'bioreactor_process': self.table.processes[p],
+                    'dosage_adjustment': self.table.dosages[d],
+                }
+        return results
+
+    def stats(self):
+        return {'requests': self.requests, 'batches': self.batches,
+                'mean_batch_size': self.requests / self.batches if self.batches else 0.0,
+                'queued': self.queue.qsize()}
+
+
+async def _handle_connection(service, reader, writer):
+    # Every request gets a reply: errors of one request never close the connection or reach the other requests
+    async def answer(line):
+        request_id = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError('A request must be a JSON object')
+            request_id = request.pop('id', None)
+            response = await service.try_select(request)
+        except Overloaded as error:
+            response = {'error': 'overloaded', 'detail': str(error)}
+        except Exception as error:
+            response = {'error': 'bad_request', 'detail': str(error)}
+        response['id'] = request_id
+        writer.write((json.dumps(response) + '\n').encode())
+
+    tasks = set()
+    try:
+        while line := await reader.readline():
+            task = asyncio.create_task(answer(line))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            # Stop reading from this client while its replies are not being consumed (backpressure)
+            await writer.drain()
+        if tasks:
+            await asyncio.gather(*tasks)
+        await writer.drain()
+    finally:
+        writer.close()
+
+
+# Function to serve a version's therapy selection over TCP until cancelled
+async def serve(version, host='127.0.0.1', port=DEFAULT_PORT, ready=None, **options):
+    async with TherapyService(version, **options) as service:
+        server = await asyncio.start_server(lambda r, w: _handle_connection(service, r, w), host, port)
+        if ready is not None:
+            ready.set_result(server.sockets[0].getsockname()[1])
+        async with server:
+            await server.serve_forever()
+
+
+# Plain, JSON-ready patient dicts for a version
+def sample_patients(version, count, seed=None):
+    cohort = api.generate(version, count, seed)
+    patients = []
+    for index in range(count):
+        view = cohort.patient(index)
+        patients.append({
+            'genetics': {gene: float(value) for gene, value in view['genetics'].items()},
+            'medical_history': list(view['medical_history']),
+            'current_health': view['current_health'],
+            'biomarkers': view['biomarkers'],
+            'allergies': list(view['allergies']),
+        })
+    return patients
+
+
+# Latency percentiles (milliseconds) and throughput from request latencies in seconds
+def latency_summary(latencies, seconds, errors=0):
+    latencies = np.asarray(latencies) * 1e3
+    summary = {'requests': len(latencies), 'errors': errors, 'seconds': seconds,
+               'throughput': len(latencies) / seconds if seconds else 0.0}
+    for name, q in (('p50', 50), ('p90', 90), ('p99', 99), ('p999', 99.9)):
+        summary[f'{name}_ms'] = float(np.percentile(latencies, q)) if len(latencies) else None
+    summary['max_ms'] = float(latencies.max()) if len(latencies) else None
+    return summary
+
+
+# Function to load a running server at a fixed request rate (open loop: requests are sent on schedule
+# whether or not earlier ones were answered, and latency counts from the scheduled send time)
+async def load_test(version, rate, duration, host='127.0.0.1', port=DEFAULT_PORT, connections=8, seed=0):
+    patients = sample_patients(version, 1000, seed)
+    total = int(rate * duration)
+    scheduled = {}
+    latencies = []
+    errors = 0
+
+    async def connection(index):
+        nonlocal errors
+        reader, writer = await asyncio.open_connection(host, port)
+        ids = range(index, total, connections)
+
+        async def receive():
+            nonlocal errors
+            for _ in ids:
+                response = json.loads(await reader.readline())
+                latencies.append(time.perf_counter() - scheduled.pop(response['id']))
+                errors += 'error' in response
+
+        receiver = asyncio.create_task(receive())
+        for request_id in ids:
+            send_at = start + request_id / rate
+            delay = send_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            scheduled[request_id] = send_at
+            writer.write((json.dumps(dict(patients[request_id % len(patients)], id=request_id)) + '\n').encode())
+            await writer.drain()
+        await receiver
+        writer.close()
+
+    start = time.perf_counter() + 0.05
+    await asyncio.gather(*(connection(index) for index in range(connections)))
+    return latency_summary(latencies, time.perf_counter() - start, errors)
+
+
+# Function to run the server and the load generator in one process (a quick local check)
+async def local_load_test(version, rate, duration, connections=8, **options):
+    ready = asyncio.get_running_loop().create_future()
+    server = asyncio.create_task(serve(version, port=0, ready=ready, **options))
+    port = await ready
+    try:
+        return await load_test(version, rate, duration, port=port, connections=connections)
+    finally:
+        server.cancel()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m simplebiofactory.service')
+    commands = parser.add_subparsers(dest='command', required=True)
+    for name in ('serve', 'load', 'local'):
+        command = commands.add_parser(name)
+        command.add_argument('version', choices=list(PROFILES))
+        command.add_argument('--port', type=int, default=DEFAULT_PORT)
+        if name != 'load':
+            command.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+            command.add_argument('--max-wait', type=float, default=DEFAULT_MAX_WAIT)
+            command.add_argument('--max-queue', type=int, default=DEFAULT_MAX_QUEUE)
+        if name != 'serve':
+            command.add_argument('--rate', type=float, default=2000, help='Requests per second')
+            command.add_argument('--duration', type=float, default=5, help='Seconds')
+            command.add_argument('--connections', type=int, default=8)
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        asyncio.run(serve(args.version, port=args.port, max_batch_size=args.batch_size, max_wait=args.max_wait,
+                          max_queue=args.max_queue))
+    elif args.command == 'load':
+        print(json.dumps(asyncio.run(load_test(args.version, args.rate, args.duration, port=args.port,
+                                               connections=args.connections)), indent=1))
+    else:
+        print(json.dumps(asyncio.run(local_load_test(args.version, args.rate, args.duration, args.connections,
+                                                     max_batch_size=args.batch_size, max_wait=args.max_wait,
+                                                     max_queue=args.max_queue)), indent=1))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,67 @@
+import json
+
+# Columnar persistence of patient_database (Arrow IPC or Parquet).
+# Category columns are stored dictionary-encoded, Medical_History as a list of dictionary-encoded
+# condition names and genetics as one numeric column per gene.
+# Arrow IPC files are written uncompressed so they can be memory-mapped: opening one is instant and
+# only the pages of the columns a query touches are ever read from disk.
+
+METADATA_KEY = b'simplebiofactory'
+
+
+# pyarrow is only needed for persistence, so it is imported when a database is saved or loaded
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError as error:
+        raise ImportError('Saving and loading patient databases requires pyarrow (pip install pyarrow)') from error
+    return pyarrow
+
+
+def _is_parquet(path):
+    return str(path).endswith(('.parquet', '.pq'))
+
+
+# Function to convert a patient database to an Arrow table with the on-disk schema
+def to_table(patient_database):
+    pa = _pyarrow()
+    table = pa.Table.from_pandas(patient_database, preserve_index=False)
+    if 'Medical_History' in table.column_names:
+        index = table.schema.get_field_index('Medical_History')
+        history = table.column(index).cast(pa.list_(pa.dictionary(pa.int16(), pa.string())))
+        table = table.set_column(index, 'Medical_History', history)
+    metadata = dict(table.schema.metadata or {})
+    metadata[METADATA_KEY] = json.dumps({'genes': patient_database.attrs.get('genes', [])}).encode()
+    return table.replace_schema_metadata(metadata)
+
+
+# Function to save a patient database; the format follows the file extension (.parquet, otherwise Arrow IPC)
+def save_database(patient_database, path):
+    pa = _pyarrow()
+    table = to_table(patient_database)
+    if _is_parquet(path):
+        pa.parquet.write_table(table, path)
+    else:
+        with pa.ipc.new_file(path, table.schema) as writer:
+            writer.write_table(table)
+
+
+# Function to open a saved database as an Arrow table without reading it (memory-mapped)
+def open_database(path, columns=None):
+    pa = _pyarrow()
+    if _is_parquet(path):
+        return pa.parquet.read_table(path, columns=columns, memory_map=True)
+    table = pa.ipc.open_file(pa.memory_map(str(path))).read_all()
+    return table.select(columns) if columns is not None else table
+
+
+# Function to load a saved database (or only some of its columns) back into a DataFrame
+def load_database(path, columns=None):
+    table = open_database(path, columns)
+    patient_database = table.to_pandas()
+    metadata = (table.schema.metadata or {}).get(METADATA_KEY)
+    genes = json.loads(metadata)['genes'] if metadata else []
+    patient_database.attrs['genes'] = [gene for gene in genes if gene in patient_database.columns]
+    return patient_database
@@ -0,0 +1,84 @@
+from bisect import bisect_left
+
+import numpy as np
+
+CLOSED_SIDES = ('both', 'left', 'right', 'neither')
+
+
+# Labelled value ranges (dosage and outcome levels) compiled into sorted breakpoints.
+# levels are (label, low, high, closed) tuples with closed in CLOSED_SIDES; values outside every
+# level get default. Ranges may only touch at a shared boundary: an overlap of positive length or a
+# gap between the lowest and highest boundary raises ValueError. Where two closed ranges share a
+# boundary point, the level listed first owns it (the first-match rule of the scripts' if/elif chains).
+class Tiers:
+    def __init__(self, levels, default):
+        self.levels = [tuple(level) for level in levels]
+        self.labels = [default]
+        for label, *_ in self.levels:
+            if label not in self.labels:
+                self.labels.append(label)
+
+        ranges = []
+        for order, (label, low, high, closed) in enumerate(self.levels):
+            if closed not in CLOSED_SIDES:
+                raise ValueError(f'Level {label!r}: closed must be one of {CLOSED_SIDES}, not {closed!r}')
+            if not low < high:
+                raise ValueError(f'Level {label!r}: low ({low}) must be below high ({high})')
+            ranges.append((low, high, closed in ('both', 'left'), closed in ('both', 'right'),
+                           order, self.labels.index(label)))
+        ranges.sort()
+
+        # Boundaries between consecutive ranges and, for each, whether the range on its right owns the point
+        edges, right_owned, slot_codes = [], [], [0]
+        for index, (low, high, low_closed, high_closed, order, code) in enumerate(ranges):
+            if index == 0:
+                edges.append(low)
+                right_owned.append(low_closed)
+            else:
+                previous = ranges[index - 1]
+                previous_label = self.levels[previous[4]][0]
+                label = self.levels[order][0]
+                if low < previous[1]:
+                    raise ValueError(f'Levels {previous_label!r} and {label!r} overlap')
+                if low > previous[1] or not (low_closed or previous[3]):
+                    raise ValueError(f'Gap between levels {previous_label!r} and {label!r} at {previous[1]}')
+                if low_closed and previous[3]:
+                    right_owned[-1] = order < previous[4]
+                else:
+                    right_owned[-1] = low_closed
+            slot_codes.append(code)
+            edges.append(high)
+            right_owned.append(not high_closed)
+        slot_codes.append(0)
+
+        self.edges = np.array(edges, dtype=np.float64)
+        self.right_owned = np.array(right_owned, dtype=bool)
+        self.slot_codes = np.array(slot_codes, dtype=np.int16)
+        # Plain lists for label(), which runs once per patient in the scripts
+        self._edge_list = edges
+        self._right_owned_list = right_owned
+        self._slot_labels = [self.labels[code] for code in slot_codes]
+
+    # Codes into self.labels for an array of values (one binary search per value)
+    def assign(self, values):
+        values = np.asarray(values)
+        if values.dtype.kind != 'f':
+            values = values.astype(np.float64)
+        if len(self.edges) == 0:
+            return np.zeros(len(values), dtype=np.int16)
+        # Compare in the values' precision, as the scripts' float32 > 0.6 tests do
+        edges = self.edges.astype(values.dtype, copy=False)
+        slots = np.searchsorted(edges, values, side='left')
+        # A value equal to a boundary belongs to the slot right of it when that range owns the point
+        edge = np.minimum(slots, len(edges) - 1)
+        on_edge = (slots < len(edges)) & (edges[edge] == values)
+        slots += on_edge & self.right_owned[edge]
+        return self.slot_codes[slots]
+
+    # Label for a single value (the same binary search as assign(), without building arrays).
+    # A NumPy scalar is compared in its own precision, like assign() compares arrays.
+    def label(self, value):
+        slot = bisect_left(self._edge_list, value)
+        if slot < len(self._edge_list) and self._edge_list[slot] == value and self._right_owned_list[slot]:
+            slot += 1
+        return self._slot_labels[slot]
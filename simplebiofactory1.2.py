@@ -1,10 +1,20 @@
 import numpy as np
 
+from simplebiofactory.cohort import gene_names
+from simplebiofactory.profiles import CHAIN_1_2, NO_RECOMMENDATION, SCREENING_1_2
+from simplebiofactory.screening import Screening
+
+NUM_GENES = 10  # Number of genes in the genetic data
+
+# Drug blocker screening (see profiles.SCREENING_1_2), compiled once for the therapies ai_workflow selects
+THERAPIES = [NO_RECOMMENDATION] + [therapy for therapy, _ in CHAIN_1_2]
+SCREENING = Screening(SCREENING_1_2, THERAPIES, gene_names(NUM_GENES))
+
 # Function to generate simulated patient data including genetics
 def generate_patient_data():
     # Simulated health profile data (more parameters)
     patient_data = {
-        'genetics': np.random.rand(10),  # Simulated genetic data (e.g., gene expressions)
+        'genetics': np.random.rand(NUM_GENES),  # Simulated genetic data (e.g., gene expressions)
         'medical_history': ['Allergy', 'Hypertension'],  # Simulated medical history
         'current_health': 'Fair',  # Simulated current health status
         'biomarkers': {
@@ -16,7 +26,8 @@ def generate_patient_data():
     return patient_data
 
 # Function to simulate the AI-driven workflow for a patient considering genetics and drug blockers
-def ai_workflow(patient_data):
+# (the blocker tests draw from rng)
+def ai_workflow(patient_data, rng=None):
     # Simulated AI algorithm for therapy selection based on multiple parameters, including genetics and drug blockers
     selected_therapy = 'No specific recommendation'
 
@@ -36,13 +47,10 @@ def ai_workflow(patient_data):
     if np.mean(patient_data['genetics']) > 0.5:
         selected_therapy = 'Genetic-based therapy'
 
-    # Consider drug blockers based on genetics and molecular makeup of drugs
-    if 'Genetic-based therapy' in selected_therapy:
-        # Simulated genetic testing results that indicate drug blockers
-        genetic_testing_results = np.random.rand(10)  # Simulated results for 10 genes
-        # Check if any genes indicate drug blockers
-        if np.any(genetic_testing_results > 0.7):
-            selected_therapy = 'Genetic-based therapy (adjusted for drug blockers)'
+    # Consider drug blockers based on genetics and molecular makeup of drugs: the screening replays the
+    # simulated genetic testing of the genetic-based therapy with one draw
+    result = SCREENING.screen(None, [THERAPIES.index(selected_therapy)], rng)
+    selected_therapy = SCREENING.names(result)[0]
 
     if patient_data['current_health'] == 'Poor':
         selected_therapy = 'Hospitalization and specialized treatment'
@@ -67,18 +75,25 @@ def biomanufacturing(selected_therapy):
 
     return engineered_microorganism, bioreactor_process
 
-# Simulate multiple patients and their workflows
-num_patients = 5  # Number of patients to simulate
-
-for patient_id in range(1, num_patients + 1):
-    print(f"Simulating Patient {patient_id}")
-    patient_data = generate_patient_data()
-    selected_therapy = ai_workflow(patient_data)
-    engineered_microorganism, bioreactor_process = biomanufacturing(selected_therapy)
-
-    # Print the results for each patient
-    print("AI-Driven Digital Biofactory Workflow:")
-    print(f"Selected Therapy for Patient {patient_id}: {selected_therapy}")
-    print(f"Engineered Microorganism for Patient {patient_id}: {engineered_microorganism}")
-    print(f"Bioreactor Process for Patient {patient_id}: {bioreactor_process}")
-    print("\n")
+# Function to run the simulation (only when the script is run, not when it is imported)
+def main():
+    # Simulate multiple patients and their workflows
+    num_patients = 5  # Number of patients to simulate
+    rng = np.random.default_rng()
+
+    for patient_id in range(1, num_patients + 1):
+        print(f"Simulating Patient {patient_id}")
+        patient_data = generate_patient_data()
+        selected_therapy = ai_workflow(patient_data, rng)
+        engineered_microorganism, bioreactor_process = biomanufacturing(selected_therapy)
+
+        # Print the results for each patient
+        print("AI-Driven Digital Biofactory Workflow:")
+        print(f"Selected Therapy for Patient {patient_id}: {selected_therapy}")
+        print(f"Engineered Microorganism for Patient {patient_id}: {engineered_microorganism}")
+        print(f"Bioreactor Process for Patient {patient_id}: {bioreactor_process}")
+        print("\n")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,21 @@
 import numpy as np
 
+from simplebiofactory.kinetics import DEFAULT_DT, Bioreactors
+from simplebiofactory.manufacturing import IDLE_PROCESS
+from simplebiofactory.qc import HOLD, NO_LOT, REJECTED, RELEASED, QualityMonitor, SensorStreams
+from simplebiofactory.qc import delivery_status as lot_delivery_status
+
+QC_SECONDS = 600  # Seconds of 1 Hz sensor readings (titer, pH, temperature, dissolved oxygen) monitored per batch
+SEED = 1  # Seed of the simulated pH, temperature and dissolved oxygen readings (None for new readings every run)
+
+# Product quality text of each QC decision
+PRODUCT_QUALITY = {
+    RELEASED: 'Product quality within acceptable range',
+    HOLD: 'Product quality under review (quality alerts raised)',
+    REJECTED: 'Product quality out of specification',
+    NO_LOT: 'No product to monitor',
+}
+
 # Simulated health profile data (extreme simplified)
 # replace w acc data integration from healthcare records
 patient_data = {
@@ -24,40 +40,50 @@ def synthetic_biology_engine(selected_therapy):
     else:
         return 'No specific bioactive compound engineered'
 
-# Simulated bioreactor automation (simplified)
+# Bioreactor automation: the reactor runs one fed-batch of its process with the kinetics engine
+# (see kinetics.Bioreactors); returns the reactor status, the grams of product harvested and the batch's
+# titer trajectory (one sample per step up to the harvest, which empties the reactor in the last step)
 def bioreactor_automation(engineered_microorganism):
-    # Simulated bioreactor process
-    if engineered_microorganism:
-        return 'Bioreactor producing therapy'
-    else:
-        return 'Bioreactor idle'
+    process = 'Bioreactor producing therapy' if engineered_microorganism else IDLE_PROCESS
+    reactor = Bioreactors([0], [process])
+    titers = reactor.run(reactor.parameters['batch_hours'][0] - DEFAULT_DT, record_every=DEFAULT_DT)
+    reactor.run(DEFAULT_DT)
+    return reactor.status()[0], reactor.production()[process], titers
 
-# Simulated quality control and monitoring (simplified)
-def quality_control_and_monitoring(process_output):
-    # Simulated quality control and monitoring
-    if process_output == 'Bioreactor producing therapy':
-        return 'Product quality within acceptable range'
-    else:
-        return 'No product to monitor'
+# Quality control and monitoring: the batch's titer trajectory and simulated pH, temperature and dissolved
+# oxygen readings are monitored with running statistics and out-of-spec/drift alerts, and the lot is
+# released, held or rejected (NO_LOT when nothing is produced)
+def quality_control_and_monitoring(process_output, titers, rng):
+    if process_output != 'Bioreactor producing therapy':
+        return NO_LOT
+    streams = SensorStreams(1, batch_seconds=QC_SECONDS, rng=rng, trajectory=titers)
+    monitor = QualityMonitor(1)
+    for _ in range(QC_SECONDS):
+        monitor.update(streams.tick())
+    return int(monitor.release()[0])
 
-# Simulated personalized delivery (simplified)
-def personalized_delivery(process_output):
-    # Simulated personalized delivery mechanism
-    if process_output == 'Product quality within acceptable range':
-        return 'Personalized drug delivery to patient'
-    else:
-        return 'No therapy to deliver'
-
-# Main workflow
-selected_therapy = ai_algorithm(patient_data)
-engineered_microorganism = synthetic_biology_engine(selected_therapy)
-bioreactor_process = bioreactor_automation(engineered_microorganism)
-product_quality = quality_control_and_monitoring(bioreactor_process)
-delivery_status = personalized_delivery(product_quality)
-
-# Print the final result
-print("AI-Driven Digital Biofactory Workflow:")
-print(f"Selected Therapy: {selected_therapy}")
-print(f"Bioreactor Process: {bioreactor_process}")
-print(f"Product Quality: {product_quality}")
-print(f"Delivery Status: {delivery_status}")
+# Personalized delivery driven by the QC decision of the lot
+def personalized_delivery(qc_decision):
+    return lot_delivery_status(qc_decision)
+
+# Function to run the main workflow (only when the script is run, not when it is imported)
+def main():
+    # Main workflow
+    rng = np.random.default_rng(SEED)
+    selected_therapy = ai_algorithm(patient_data)
+    engineered_microorganism = synthetic_biology_engine(selected_therapy)
+    bioreactor_process, harvested_product, titers = bioreactor_automation(engineered_microorganism)
+    product_quality = quality_control_and_monitoring(bioreactor_process, titers, rng)
+    delivery_status = personalized_delivery(product_quality)
+
+    # Print the final result
+    print("AI-Driven Digital Biofactory Workflow:")
+    print(f"Selected Therapy: {selected_therapy}")
+    print(f"Bioreactor Process: {bioreactor_process}")
+    print(f"Harvested Product: {harvested_product:.1f} g")
+    print(f"Product Quality: {PRODUCT_QUALITY[product_quality]}")
+    print(f"Delivery Status: {delivery_status}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,14 @@
 import numpy as np
 
+from simplebiofactory.profiles import DRUG_INTERACTIONS_2_1 as drug_interactions  # Drugs each therapy interacts with
+
 NUM_PATIENTS = 10  # Number of patients to simulate
 NUM_GENES = 20  # Number of genes in the genetic data
 
+# Interaction warning of each therapy, joined once and attached when the therapy is printed
+INTERACTION_WARNINGS = {therapy: f' (May interact with {", ".join(drugs)})'
+                        for therapy, drugs in drug_interactions.items()}
+
 # Function to generate detailed simulated patient data including genetics
 def generate_patient_data():
     # Simulated health profile data (more parameters)
@@ -45,17 +51,6 @@ def ai_workflow(patient_data):
     if np.mean(patient_data['genetics']) > 0.5:
         selected_therapy = 'Genetic-based therapy'
 
-    # Consider drug interactions based on selected therapy
-    drug_interactions = {
-        'Prescription antihypertensive drug': ['Drug A', 'Drug B'],
-        'Insulin therapy and cholesterol-lowering medication': ['Drug C', 'Drug D'],
-        'Oral diabetes medication': ['Drug E', 'Drug F'],
-    }
-
-    if selected_therapy in drug_interactions:
-        interaction_list = drug_interactions[selected_therapy]
-        selected_therapy += f' (May interact with {", ".join(interaction_list)})'
-
     if patient_data['current_health'] == 'Poor':
         selected_therapy = 'Hospitalization and specialized treatment'
 
@@ -85,16 +80,23 @@ def biomanufacturing(selected_therapy):
 
     return engineered_microorganism, bioreactor_process
 
-# Simulate multiple patients and their workflows
-for patient_id in range(1, NUM_PATIENTS + 1):
-    print(f"Simulating Patient {patient_id}")
-    patient_data = generate_patient_data()
-    selected_therapy = ai_workflow(patient_data)
-    engineered_microorganism, bioreactor_process = biomanufacturing(selected_therapy)
-
-    # Print the results for each patient
-    print("AI-Driven Personalized Medicine Workflow:")
-    print(f"Selected Therapy for Patient {patient_id}: {selected_therapy}")
-    print(f"Engineered Microorganism for Patient {patient_id}: {engineered_microorganism}")
-    print(f"Bioreactor Process for Patient {patient_id}: {bioreactor_process}")
-    print("\n")
+# Function to run the simulation (only when the script is run, not when it is imported)
+def main():
+    # Simulate multiple patients and their workflows
+    for patient_id in range(1, NUM_PATIENTS + 1):
+        print(f"Simulating Patient {patient_id}")
+        patient_data = generate_patient_data()
+        selected_therapy = ai_workflow(patient_data)
+        engineered_microorganism, bioreactor_process = biomanufacturing(selected_therapy)
+
+        # Print the results for each patient
+        print("AI-Driven Personalized Medicine Workflow:")
+        warning = INTERACTION_WARNINGS.get(selected_therapy, '')
+        print(f"Selected Therapy for Patient {patient_id}: {selected_therapy}{warning}")
+        print(f"Engineered Microorganism for Patient {patient_id}: {engineered_microorganism}")
+        print(f"Bioreactor Process for Patient {patient_id}: {bioreactor_process}")
+        print("\n")
+
+
+if __name__ == '__main__':
+    main()
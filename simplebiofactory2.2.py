@@ -1,145 +1,98 @@
 import numpy as np
-import pandas as pd
+
+from simplebiofactory.cohort import HEALTH_STATES, gene_names, generate_cohort
+from simplebiofactory.manufacturing import ManufacturingTable, OutcomeTable
+from simplebiofactory.profiles import CONDITIONS_2_2 as MEDICAL_CONDITIONS
+from simplebiofactory.profiles import GENE_IMPACT_2_2 as gene_impact  # Impact of genes on therapy selection
+from simplebiofactory.profiles import GENES_2_2 as GENES
+from simplebiofactory.profiles import MANUFACTURING_2_2 as MANUFACTURING  # Biomanufacturing and dosage tiers
+from simplebiofactory.profiles import OUTCOME_2_2 as OUTCOME  # Outcome gene and outcome tiers
+from simplebiofactory.profiling import get_profiler, write_profile
+from simplebiofactory.records import RecordBuilder
+from simplebiofactory.report import write_report
+from simplebiofactory.rules import GeneImpactRules
+from simplebiofactory.scheduler import schedule_database
 
 # Define constants
 NUM_PATIENTS = 100  # Number of patients to simulate
 NUM_GENES = 50  # Number of genes in the genetic data
-
-# Create a list to store patient records
-patient_records = []
-
-# Function to generate detailed simulated patient data including genetics
-def generate_patient_data():
-    # Simulated health profile data (more parameters)
-    patient_data = {
-        'genetics': {
-            'Gene1': np.random.rand(),  # Simulated genetic variation for Gene1
-            'Gene2': np.random.rand(),  # Simulated genetic variation for Gene2
-            # Add more genes and associated data here...
-        },
-        'medical_history': np.random.choice(['Allergy', 'Hypertension', 'Diabetes'], 2),  # Simulated medical history
-        'current_health': np.random.choice(['Poor', 'Fair', 'Good'], 1)[0],  # Simulated current health status
-    }
-    return patient_data
-
-# Function to simulate the AI-driven therapy selection for a patient considering genetics, medical history, and current health
-def ai_workflow(patient_data):
-    # Simulated AI algorithm for therapy selection based on multiple parameters
-    selected_therapy = 'No specific recommendation'
-
-    # Define the impact of genes on therapy selection
-    gene_impact = {
-        'Gene1': {
-            'Hypertension': 'Prescription antihypertensive drug (Moderate genetic risk)',
-            'Diabetes': 'Oral diabetes medication (Low genetic risk)',
-            'Allergy': 'Allergy medication (antihistamine)',
-        },
-        'Gene2': {
-            'Hypertension': 'Lifestyle modification for hypertension',
-            'Diabetes': 'Insulin therapy (Moderate genetic risk)',
-            'Allergy': 'Allergy medication (antihistamine)',
-        },
-        # Define impacts for more genes and conditions...
+IMPACT_GENES = gene_names(NUM_GENES)  # Genes each condition's therapy gene is drawn from (Gene1 to Gene50)
+NUM_REACTORS = 10  # Reactors shared by the patients' production runs
+REPORT_MODE = 'brief'  # Results report: 'brief', 'detail', 'summary', 'csv', 'jsonl' or 'quiet'
+
+# Function to simulate the biomanufacturing process for the selected therapies of a whole cohort, including
+# dosage adjustments (MANUFACTURING is compiled once into manufacturing_table: the dosage tiers are sorted
+# breakpoints); returns the microorganism, process and dosage codes of every patient
+def biomanufacturing(cohort, therapy_codes, manufacturing_table):
+    return manufacturing_table.apply(cohort, therapy_codes)
+
+# Function to run the whole simulation (only when the script is run, not when it is imported)
+def main():
+    # Stage timers and counters (on when SIMPLEBIOFACTORY_PROFILE names the trace file to write)
+    profiler = get_profiler()
+
+    # Generate the whole cohort in one call (genetics, medical history and health as arrays)
+    with profiler.span('generate_cohort'):
+        cohort = generate_cohort(NUM_PATIENTS, GENES, MEDICAL_CONDITIONS, history_size=2)
+
+    # Compile gene_impact into a lookup table once and select therapies for the whole cohort
+    therapy_rules = GeneImpactRules(gene_impact, IMPACT_GENES, MEDICAL_CONDITIONS)
+    manufacturing_table = ManufacturingTable(MANUFACTURING, therapy_rules.therapies, GENES)
+    with profiler.span('ai_workflow'):
+        therapy_codes = therapy_rules.select(cohort)
+    profiler.count_codes('therapy', therapy_codes, therapy_rules.therapies)
+
+    # Biomanufacturing for the whole cohort: microorganism, process and dosage codes of every patient
+    with profiler.span('biomanufacturing'):
+        microorganisms, processes, dosages = biomanufacturing(cohort, therapy_codes, manufacturing_table)
+
+    # Compile the outcome tiers into sorted breakpoints once and assign outcomes for the whole cohort
+    outcome_table = OutcomeTable(OUTCOME, GENES)
+    with profiler.span('outcome'):
+        outcomes = outcome_table.apply(cohort)
+
+    # Simulate multiple patients and their workflows
+    for patient_id in range(1, NUM_PATIENTS + 1):
+        print(f"Simulating Patient {patient_id}")
+
+    # Store the patient records, therapy history and outcomes of the whole cohort in preallocated record
+    # columns: each category column is given as codes and the vocabulary they index, and the record
+    # builder declares only the columns given here
+    categories = {
+        'Current_Health': (cohort.current_health, HEALTH_STATES),
+        'Selected_Therapy': (therapy_codes, therapy_rules.therapies),
+        'Engineered_Microorganism': (microorganisms, manufacturing_table.microorganisms),
+        'Bioreactor_Process': (processes, manufacturing_table.processes),
+        'Outcome': (outcomes, outcome_table.outcomes),
     }
+    with profiler.span('records'):
+        record_builder = RecordBuilder(NUM_PATIENTS, GENES, columns=list(categories))
+        record_builder.extend(np.arange(1, NUM_PATIENTS + 1), cohort.genetics,
+                              (cohort.medical_history, cohort.conditions), categories)
+        patient_database = record_builder.to_frame()
+    profiler.count('patients', NUM_PATIENTS)
 
-    for condition in patient_data['medical_history']:
-        gene = f'Gene{np.random.choice(list(range(1, NUM_GENES + 1)), 1)[0]}'  # Randomly select a gene
-
-        # Check if the selected gene is in the dictionary, otherwise use a default therapy (temp until can add more)
-        if gene in gene_impact:
-            selected_therapy = gene_impact[gene][condition]
-        else:
-            selected_therapy = 'Default therapy for missing gene'
-
-    return selected_therapy
-
-# Function to simulate the biomanufacturing process for a therapy, including dosage adjustments
-def biomanufacturing(selected_therapy, patient_data):
-    # Simulated synthetic biology and bioreactor process based on therapy
-    engineered_microorganism = None
-    bioreactor_process = 'Bioreactor idle'
-    dosage_adjustment = 'Standard dosage'
-
-    if 'antihypertensive' in selected_therapy.lower():
-        engineered_microorganism = 'Engineered microorganism for antihypertensive drug production'
-        bioreactor_process = 'Bioreactor producing antihypertensive drug'
-
-        # Simulate dosage adjustment based on genetics
-        dosage_gene = 'Gene1'  # Gene responsible for dosage adjustments
-        if patient_data['genetics'][dosage_gene] > 0.6:
-            dosage_adjustment = 'Higher dosage (High genetic risk)'
-        elif patient_data['genetics'][dosage_gene] > 0.3:
-            dosage_adjustment = 'Moderate dosage (Moderate genetic risk)'
-
-    elif 'Insulin therapy' in selected_therapy:
-        engineered_microorganism = 'Engineered microorganism for insulin production'
-        bioreactor_process = 'Bioreactor producing insulin'
-
-        # Simulate dosage adjustment based on genetics
-        dosage_gene = 'Gene2'  # Gene responsible for dosage adjustments
-        if patient_data['genetics'][dosage_gene] > 0.6:
-            dosage_adjustment = 'Higher insulin dosage (High genetic risk)'
-        elif patient_data['genetics'][dosage_gene] > 0.3:
-            dosage_adjustment = 'Moderate insulin dosage (Moderate genetic risk)'
-
-    elif 'Oral diabetes medication' in selected_therapy:
-        engineered_microorganism = 'Engineered microorganism for oral diabetes medication production'
-
-    elif 'Allergy medication' in selected_therapy:
-        engineered_microorganism = 'Engineered microorganism for allergy medication production'
-
-    return engineered_microorganism, bioreactor_process, dosage_adjustment
-
-# Simulate multiple patients and their workflows
-for patient_id in range(1, NUM_PATIENTS + 1):
-    print(f"Simulating Patient {patient_id}")
-    patient_data = generate_patient_data()
-    
-    # Check if the outcome_gene exists in the patient's genetic data
-    outcome_gene = 'Gene3'  # Gene responsible for therapy outcomes
-    if outcome_gene in patient_data['genetics']:
-        if patient_data['genetics'][outcome_gene] > 0.6:
-            outcome = 'Favorable outcome (High genetic risk)'
-        elif patient_data['genetics'][outcome_gene] > 0.3:
-            outcome = 'Moderate outcome (Moderate genetic risk)'
-        else:
-            outcome = 'Standard outcome (Low genetic risk)'
-    else:
-        outcome = 'Gene not found in genetic data'
-
-    selected_therapy = ai_workflow(patient_data)
-    engineered_microorganism, bioreactor_process, dosage_adjustment = biomanufacturing(selected_therapy, patient_data)
-
-    # Store patient record, therapy history, and outcome in the list
-    patient_record = {
-        'Patient_ID': patient_id,
-        'Genetics': patient_data['genetics'],
-        'Medical_History': patient_data['medical_history'],
-        'Current_Health': patient_data['current_health'],
-        'Selected_Therapy': selected_therapy,
-        'Engineered_Microorganism': engineered_microorganism,
-        'Bioreactor_Process': bioreactor_process,
-        'Outcome': outcome,
-    }
-    
-    patient_records.append(patient_record)  # Append the record to the list
-
-# Create the patient database from the list of patient records
-patient_database = pd.DataFrame(patient_records)
-
-# Display patient database (not needed so commented out)
-# print("\nPatient Database:")
-# print(patient_database)
-
-# After simulating all patients and creating the patient_records list
-for patient_record in patient_records:
-    patient_id = patient_record['Patient_ID']
-    selected_therapy = patient_record['Selected_Therapy']
-    engineered_microorganism = patient_record['Engineered_Microorganism']
-    bioreactor_process = patient_record['Bioreactor_Process']
-    outcome = patient_record['Outcome']
-
-    print(f"Patient {patient_id} - Selected Therapy: {selected_therapy}")
-    print(f"Patient {patient_id} - Engineered Microorganism: {engineered_microorganism}")
-    print(f"Patient {patient_id} - Bioreactor Process: {bioreactor_process}")
-    print(f"Patient {patient_id} - Outcome: {outcome}\n")
+    # Schedule the patients' orders (by Bioreactor_Process) into shared reactor runs
+    with profiler.span('schedule'):
+        schedule = schedule_database(patient_database, NUM_REACTORS)
+    if len(schedule):  # Nothing to print when no order needs a reactor
+        print(schedule.summary())
+
+    # Display patient database (not needed so commented out)
+    # print("\nPatient Database:")
+    # print(patient_database)
+
+    # After simulating all patients and creating the patient database, write the results report
+    with profiler.span('report'):
+        write_report(patient_database, REPORT_MODE)
+
+    # Write the stage timings and counters when profiling
+    if profiler.enabled:
+        print(profiler.format_summary())
+        write_profile()
+
+    return patient_database
+
+
+if __name__ == '__main__':
+    main()
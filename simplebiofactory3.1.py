@@ -1,143 +1,95 @@
 import numpy as np
-import pandas as pd
+
+from simplebiofactory.cohort import HEALTH_STATES, generate_cohort
+from simplebiofactory.manufacturing import ManufacturingTable, OutcomeTable
+from simplebiofactory.profiles import CONDITIONS_3_1 as MEDICAL_CONDITIONS
+from simplebiofactory.profiles import GENE_IMPACT_3_1 as gene_impact  # Impact of genes on therapy selection
+from simplebiofactory.profiles import GENES_3_1 as GENES
+from simplebiofactory.profiles import MANUFACTURING_3_1 as MANUFACTURING  # Biomanufacturing and dosage tiers
+from simplebiofactory.profiles import OUTCOME_3_1 as OUTCOME  # Outcome gene and outcome tiers
+from simplebiofactory.profiling import get_profiler, write_profile
+from simplebiofactory.records import RecordBuilder
+from simplebiofactory.rules import GeneImpactRules
+from simplebiofactory.scheduler import schedule_database
 
 # Define constants
 NUM_PATIENTS = 100  # Number of patients to simulate
 NUM_GENES = 50  # Number of genes in the genetic data
+NUM_REACTORS = 10  # Reactors shared by the patients' production runs
 NUM_MEDICAL_HISTORY_CONDITIONS = 30  # Number of possible medical history conditions
 
-# Create a database to store patient records and therapy history
-patient_database = pd.DataFrame(columns=['Patient_ID', 'Genetics', 'Medical_History', 'Current_Health',
-                                         'Selected_Therapy', 'Engineered_Microorganism', 'Bioreactor_Process', 'Dosage_Adjustment', 'Outcome'])
-
-# Function to generate detailed simulated patient data including genetics
-def generate_patient_data():
-    # Simulated health profile data (more parameters)
-    patient_data = {
-        'genetics': {
-            'BRCA1': np.random.rand(),  # Simulated genetic variation for BRCA1
-            'BRCA2': np.random.rand(),  # Simulated genetic variation for BRCA2
-            'TP53': np.random.rand(),   # Simulated genetic variation for TP53
-            'EGFR': np.random.rand(),   # Simulated genetic variation for EGFR
-            'KRAS': np.random.rand(),   # Simulated genetic variation for KRAS
-            # Add more genes and associated data here...
-        },
-        'medical_history': np.random.choice([
-            'Allergy', 'Hypertension', 'Diabetes', 'Asthma', 'Depression', 'Arthritis', 'COPD', 'Obesity',
-            'Hyperthyroidism', 'Migraine', 'Osteoporosis', 'Alzheimer\'s', 'Parkinson\'s', 'Schizophrenia',
-            'Bipolar Disorder', 'Epilepsy', 'Multiple Sclerosis', 'Crohn\'s Disease', 'Ulcerative Colitis',
-            'Rheumatoid Arthritis', 'Fibromyalgia', 'Celiac Disease', 'Lupus', 'Psoriasis', 'Endometriosis',
-            'PCOS', 'Sickle Cell Anemia', 'HIV/AIDS',
-            # Add more conditions here...
-        ], NUM_MEDICAL_HISTORY_CONDITIONS),  # Simulated medical history
-        'current_health': np.random.choice(['Poor', 'Fair', 'Good'], 1)[0],  # Simulated current health status
-    }
-    return patient_data
-
-# Define the impact of genes on therapy selection
-gene_impact = {
-    'BRCA1': {
-        'Cancer': 'Prophylactic surgery (High genetic risk)',
-    },
-    'BRCA2': {
-        'Cancer': 'Prophylactic surgery (High genetic risk)',
-    },
-    'TP53': {
-        'Cancer': 'Aggressive treatment and monitoring (High genetic risk)',
-    },
-    'EGFR': {
-        'Lung Cancer': 'EGFR inhibitor therapy (Specific genetic mutation)',
-    },
-    'KRAS': {
-        'Lung Cancer': 'Immunotherapy (Specific genetic mutation)',
-    },
-    # Continue defining impacts for more genes and conditions...
-}
-
-# Function to simulate the AI-driven therapy selection for a patient considering genetics, medical history, and current health
-def ai_workflow(patient_data):
-    # Simulated AI algorithm for therapy selection based on multiple parameters
-    selected_therapy = 'No specific recommendation'
-
-    for condition in patient_data['medical_history']:
-        gene = np.random.choice(list(patient_data['genetics'].keys()), 1)[0]  # Randomly select a gene
-
-        # Check if the selected gene is in the dictionary, otherwise use a default therapy
-        if gene in gene_impact:
-            selected_therapy = gene_impact[gene].get(condition, 'Default therapy for missing gene')
-
-    return selected_therapy
-
-# Function to simulate the biomanufacturing process for a therapy, including dosage adjustments
-def biomanufacturing(selected_therapy, patient_data):
-    # Simulated synthetic biology and bioreactor process based on therapy
-    engineered_microorganism = None
-    bioreactor_process = 'Bioreactor idle'
-    dosage_adjustment = 'Standard dosage'
-
-    if 'surgery' in selected_therapy.lower():
-        engineered_microorganism = 'No engineered microorganism needed'
-        bioreactor_process = 'No bioreactor needed'
-        dosage_adjustment = 'No dosage adjustment needed'
-
-    elif 'EGFR inhibitor therapy' in selected_therapy:
-        engineered_microorganism = 'Engineered microorganism for EGFR inhibitor production'
-        bioreactor_process = 'Bioreactor producing EGFR inhibitor'
-
-        # Simulate dosage adjustment based on genetics
-        dosage_gene = 'EGFR'  # Gene responsible for dosage adjustments
-        if patient_data['genetics'][dosage_gene] > 0.6:
-            dosage_adjustment = 'Higher dosage (High genetic risk)'
-        elif patient_data['genetics'][dosage_gene] > 0.3:
-            dosage_adjustment = 'Moderate dosage (Moderate genetic risk)'
-
-    # Continue to define biomanufacturing for other therapies and genes...
-
-    return engineered_microorganism, bioreactor_process, dosage_adjustment
-
-# Simulate multiple patients and their workflows
-patient_records = []  # Create a list to store patient records
-
-for patient_id in range(1, NUM_PATIENTS + 1):
-    print(f"Simulating Patient {patient_id}")
-    patient_data = generate_patient_data()
-    
-    # Check if the outcome_gene exists in the patient's genetic data
-    outcome_gene = 'EGFR'  # Gene responsible for therapy outcomes
-    if outcome_gene in patient_data['genetics']:
-        if patient_data['genetics'][outcome_gene] > 0.6:
-            outcome = 'Favorable outcome (High genetic risk)'
-        elif patient_data['genetics'][outcome_gene] > 0.3:
-            outcome = 'Moderate outcome (Moderate genetic risk)'
-        else:
-            outcome = 'Standard outcome (Low genetic risk)'
-    else:
-        outcome = 'Gene not found in genetic data'
-
-    selected_therapy = ai_workflow(patient_data)
-    engineered_microorganism, bioreactor_process, dosage_adjustment = biomanufacturing(selected_therapy, patient_data)
-
-    # Store patient record, therapy history, and outcome in the database
-    patient_record = {
-        'Patient_ID': patient_id,
-        'Genetics': patient_data['genetics'],
-        'Medical_History': patient_data['medical_history'],
-        'Current_Health': patient_data['current_health'],
-        'Selected_Therapy': selected_therapy,
-        'Engineered_Microorganism': engineered_microorganism,
-        'Bioreactor_Process': bioreactor_process,
-        'Dosage_Adjustment': dosage_adjustment,
-        'Outcome': outcome,
+# Function to simulate the biomanufacturing process for the selected therapies of a whole cohort, including
+# dosage adjustments (MANUFACTURING is compiled once into manufacturing_table: the dosage tiers are sorted
+# breakpoints); returns the microorganism, process and dosage codes of every patient
+def biomanufacturing(cohort, therapy_codes, manufacturing_table):
+    return manufacturing_table.apply(cohort, therapy_codes)
+
+# Function to run the whole simulation (only when the script is run, not when it is imported)
+def main():
+    # Stage timers and counters (on when SIMPLEBIOFACTORY_PROFILE names the trace file to write)
+    profiler = get_profiler()
+
+    # Generate the whole cohort in one call (genetics, medical history and health as arrays)
+    with profiler.span('generate_cohort'):
+        cohort = generate_cohort(NUM_PATIENTS, GENES, MEDICAL_CONDITIONS, history_size=NUM_MEDICAL_HISTORY_CONDITIONS)
+
+    # Compile gene_impact into a lookup table once and select therapies for the whole cohort
+    therapy_rules = GeneImpactRules(gene_impact, GENES, MEDICAL_CONDITIONS, missing_gene=None)
+    manufacturing_table = ManufacturingTable(MANUFACTURING, therapy_rules.therapies, GENES)
+    with profiler.span('ai_workflow'):
+        therapy_codes = therapy_rules.select(cohort)
+    profiler.count_codes('therapy', therapy_codes, therapy_rules.therapies)
+
+    # Biomanufacturing for the whole cohort: microorganism, process and dosage codes of every patient
+    with profiler.span('biomanufacturing'):
+        microorganisms, processes, dosages = biomanufacturing(cohort, therapy_codes, manufacturing_table)
+
+    # Compile the outcome tiers into sorted breakpoints once and assign outcomes for the whole cohort
+    outcome_table = OutcomeTable(OUTCOME, GENES)
+    with profiler.span('outcome'):
+        outcomes = outcome_table.apply(cohort)
+
+    # Simulate multiple patients and their workflows
+    for patient_id in range(1, NUM_PATIENTS + 1):
+        print(f"Simulating Patient {patient_id}")
+
+    # Store the patient records, therapy history and outcomes of the whole cohort in preallocated record
+    # columns: each category column is given as codes and the vocabulary they index, and the record
+    # builder declares only the columns given here
+    categories = {
+        'Current_Health': (cohort.current_health, HEALTH_STATES),
+        'Selected_Therapy': (therapy_codes, therapy_rules.therapies),
+        'Engineered_Microorganism': (microorganisms, manufacturing_table.microorganisms),
+        'Bioreactor_Process': (processes, manufacturing_table.processes),
+        'Dosage_Adjustment': (dosages, manufacturing_table.dosages),
+        'Outcome': (outcomes, outcome_table.outcomes),
     }
-    patient_records.append(patient_record)
-
-# Convert the list of patient records to a DataFrame
-patient_database = pd.DataFrame(patient_records)
-
-# Set display options to show all rows and columns
-pd.set_option('display.max_rows', None)  # Display all rows
-pd.set_option('display.max_columns', None)  # Display all columns
-
-# Display patient database
-print("\nPatient Database:")
-print(patient_database)
+    with profiler.span('records'):
+        record_builder = RecordBuilder(NUM_PATIENTS, GENES, columns=list(categories))
+        record_builder.extend(np.arange(1, NUM_PATIENTS + 1), cohort.genetics,
+                              (cohort.medical_history, cohort.conditions), categories)
+        patient_database = record_builder.to_frame()
+    profiler.count('patients', NUM_PATIENTS)
+
+    # Schedule the patients' orders (Bioreactor_Process and Dosage_Adjustment) into shared reactor runs
+    with profiler.span('schedule'):
+        schedule = schedule_database(patient_database, NUM_REACTORS)
+    if len(schedule):  # Nothing to print when no order needs a reactor
+        print(schedule.summary())
+
+    # Display patient database with all rows and columns (pandas is only needed for the display options)
+    import pandas as pd
+    with pd.option_context('display.max_rows', None, 'display.max_columns', None):
+        print("\nPatient Database:")
+        print(patient_database)
+
+    # Write the stage timings and counters when profiling
+    if profiler.enabled:
+        print(profiler.format_summary())
+        write_profile()
+
+    return patient_database
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from simplebiofactory import api
+from simplebiofactory.cohort import gene_names
+from simplebiofactory.profiles import PROFILES
+
+GOOD = {'genetics': {'BRCA1': 0.7, 'APOE': 0.2, 'TP53': 0.5}, 'medical_history': ['Hypertension', 'Allergy'],
+        'current_health': 'Good', 'biomarkers': {'cholesterol_level': 180,
+                                                 'blood_pressure': {'systolic': 140, 'diastolic': 90}}}
+
+
+def test_genetics_as_a_sequence_equal_genetics_as_a_dict():
+    genes = gene_names(PROFILES['2.4']['genes'])
+    values = [GOOD['genetics'][gene] for gene in genes]
+    by_name = api.cohort_from_patients('2.4', [GOOD])
+    for genetics in (values, np.array(values), tuple(values)):
+        cohort = api.cohort_from_patients('2.4', [dict(GOOD, genetics=genetics)])
+        np.testing.assert_array_equal(cohort.genetics, by_name.genetics)
+
+
+def test_missing_genes_count_as_zero():
+    cohort = api.cohort_from_patients('2.4', [dict(GOOD, genetics={'BRCA1': 0.7, 'Unknown': 1.0})])
+    np.testing.assert_array_equal(cohort.genetics, np.array([[0.7, 0.0, 0.0]], dtype=np.float32))
+
+
+@pytest.mark.parametrize('change', [
+    {'genetics': [0.1, 0.2]},  # Wrong length
+    {'genetics': np.zeros((1, 3))},  # Wrong shape
+    {'genetics': 'ACGT'},
+    {'genetics': ['a', 'b', 'c']},
+    {'genetics': {'BRCA1': 'high'}},
+    {'medical_history': ['Migraine']},  # Not a 2.4 condition
+    {'medical_history': 5},
+    {'current_health': 'Excellent'},
+    {'biomarkers': ['high']},
+    {'biomarkers': {'blood_pressure': 140}},
+    {'biomarkers': {'cholesterol_level': 'high'}},
+    {'biomarkers': {'cholesterol_level': 10 ** 6}},
+])
+def test_malformed_patients_raise_value_error(change):
+    with pytest.raises(ValueError):
+        api.select_therapy('2.4', dict(GOOD, **change), seed=0)
+
+
+def test_patients_that_are_not_dicts_or_lack_a_history_raise_value_error():
+    with pytest.raises(ValueError):
+        api.select_therapies('2.4', [['Hypertension']])
+    with pytest.raises(ValueError):
+        api.select_therapy('2.4', {key: value for key, value in GOOD.items() if key != 'medical_history'})
+
+
+def test_unknown_allergy_and_version_raise_value_error():
+    patient = {'medical_history': ['Allergy', 'Hypertension'], 'allergies': ['Pollen', 'Cats']}
+    with pytest.raises(ValueError):
+        api.select_therapy('2.1', patient)
+    with pytest.raises(ValueError):
+        api.select_therapy('9.9', GOOD)
+
+
+def test_patients_with_different_history_lengths_are_grouped():
+    short = dict(GOOD, medical_history=['Diabetes'])
+    selected = api.select_therapies('2.4', [GOOD, short, GOOD], seed=0)
+    assert len(selected) == 3 and all(isinstance(therapy, str) for therapy in selected)
+    with pytest.raises(ValueError):
+        api.cohort_from_patients('2.4', [GOOD, short])
@@ -0,0 +1,68 @@
+import json
+
+import pytest
+
+from simplebiofactory import benchmark
+
+# The benchmark harness: stages per version, script runs, and regressions against a baseline
+
+
+def row(stage, seconds, peak_bytes, version='2.4', size=100):
+    return {'version': version, 'size': size, 'stage': stage, 'seconds': seconds, 'peak_bytes': peak_bytes}
+
+
+@pytest.mark.parametrize('version, stages', [
+    ('1', {'generation', 'ai_workflow', 'biomanufacturing', 'records', 'report'}),
+    ('2.2', {'generation', 'ai_workflow', 'biomanufacturing', 'outcome', 'records', 'report'}),
+    ('2.4', {'generation', 'ai_workflow', 'biomanufacturing', 'screening', 'outcome', 'records', 'report'}),
+])
+def test_stages_of_each_version(version, stages):
+    timings = benchmark.run_stages(version, 200, trace=True)
+    assert set(timings) == stages
+    assert all(seconds >= 0 and peak > 0 for seconds, peak in timings.values())
+    assert all(peak is None for _, peak in benchmark.run_stages(version, 200).values())
+
+
+def test_benchmarks_run_the_scripts_up_to_their_size_limit():
+    results = benchmark.run_benchmarks(['1', '2.4'], [50, 200], repeat=2, script_max_size=100)
+    scripts = [(result['version'], result['size']) for result in results if result['stage'] == 'script']
+    assert scripts == [('1', 1), ('2.4', 50)]  # The single-patient script runs once, at size 1
+    assert len([result for result in results if result['version'] == '2.4' and result['size'] == 200]) == 7
+    assert all(result['peak_bytes'] > 0 for result in results)
+    assert not any(result['stage'] == 'script' for result in benchmark.run_benchmarks(['2.4'], [50], 1,
+                                                                                           script_max_size=0))
+
+
+def test_regressions_in_time_and_memory():
+    baseline = [row('records', 0.1, 2 ** 24), row('report', 0.001, 2 ** 24), row('outcome', 0.1, 2 ** 10)]
+    results = [row('records', 0.16, 2 ** 24 * 1.2),  # Slower by 60% and 20% more memory
+               row('report', 0.01, 2 ** 24),  # Too fast in the baseline to compare
+               row('outcome', 0.1, 2 ** 20),  # Too little memory in the baseline to compare
+               row('records', 1.0, 2 ** 30, size=1000)]  # Not in the baseline
+    regressions = benchmark.find_regressions(results, baseline)
+    assert [(regression['stage'], regression['metric']) for regression in regressions] == \
+        [('records', 'seconds'), ('records', 'peak_bytes')]
+    assert regressions[0]['ratio'] == pytest.approx(1.6)
+    assert benchmark.find_regressions(results, baseline, tolerance=0.7, memory_tolerance=0.25) == []
+
+
+def test_main_writes_results_and_compares_them(tmp_path, capsys):
+    output = tmp_path / 'results.json'
+    arguments = ['--versions', '2.2', '--sizes', '100', '--repeat', '1', '--script-max-size', '0']
+    assert benchmark.main(arguments + ['--output', str(output)]) == 0
+    document = json.loads(output.read_text())
+    assert set(document) == {'environment', 'results'} and len(document['results']) == 6
+
+    baseline = tmp_path / 'baseline.json'
+    for result in document['results']:
+        result['seconds'], result['peak_bytes'] = 1000.0, 2 ** 40  # A far slower, far bigger baseline
+    baseline.write_text(json.dumps(document))
+    capsys.readouterr()
+    assert benchmark.main(arguments + ['--baseline', str(baseline)]) == 0
+    assert capsys.readouterr().out == f'No regressions against {baseline}\n'
+
+    for result in document['results']:
+        result['seconds'] = benchmark.MIN_SECONDS  # Any time above it counts with a negative tolerance
+    baseline.write_text(json.dumps(document))
+    assert benchmark.main(arguments + ['--baseline', str(baseline), '--tolerance', '-1']) == 1
+    assert capsys.readouterr().out.count('Regression: 2.2 ') == 6
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from simplebiofactory import bitsets
+
+# Bitsets against Python sets of the same codes, including vocabularies that span several words
+
+
+@pytest.mark.parametrize('size', [3, 64, 65, 200])
+def test_bitsets_match_sets(size):
+    rng = np.random.default_rng(size)
+    vocabulary = [f'Condition{i}' for i in range(size)]
+    codes = rng.integers(0, size, (300, 5))
+    sets = [set(row) for row in codes.tolist()]
+    bitset = bitsets.encode_codes(codes, size)
+    assert bitset.shape == (300, bitsets.num_words(size)) and bitset.dtype == np.uint64
+
+    assert bitsets.count_members(bitset).tolist() == [len(members) for members in sets]
+    assert [bitsets.decode_row(row, vocabulary) for row in bitset[:20]] == \
+        [[vocabulary[code] for code in sorted(members)] for members in sets[:20]]
+
+    query = [0, size - 1, size // 2]
+    mask = bitsets.names_mask(vocabulary, [vocabulary[code] for code in query])
+    assert bitsets.has_any(bitset, mask).tolist() == [bool(members & set(query)) for members in sets]
+    assert bitsets.has_all(bitset, mask).tolist() == [set(query) <= members for members in sets]
+
+
+def test_empty_draws_and_unknown_names():
+    assert bitsets.num_words(0) == 1 and bitsets.num_words(64) == 1 and bitsets.num_words(65) == 2
+    empty = bitsets.encode_codes(np.zeros((4, 0), dtype=np.uint8), 3)
+    assert not empty.any() and bitsets.count_members(empty).tolist() == [0] * 4
+    mask = bitsets.names_mask(['Allergy', 'Diabetes'], [])
+    assert bitsets.has_all(empty, mask).all() and not bitsets.has_any(empty, mask).any()
+    with pytest.raises(ValueError):
+        bitsets.names_mask(['Allergy', 'Diabetes'], ['Asthma'])
@@ -0,0 +1,48 @@
+import pytest
+
+from simplebiofactory.checkpoint import checkpointed_stream, load_state
+from simplebiofactory.parallel import shard_stream
+from simplebiofactory.pipeline import csv_sink
+
+# A run interrupted after some chunks and resumed from its checkpoint must write the same bytes as an
+# uninterrupted run with the same seed (1.2 draws random blocker tests, so the shards' seeding matters)
+
+SIZE = 5000
+CHUNK_SIZE = 1000
+SEED = 3
+
+
+@pytest.mark.parametrize('version', ['1.2', '2.4', '3.1'])
+def test_resumed_run_is_bit_identical(tmp_path, version):
+    expected = tmp_path / 'expected.csv'
+    csv_sink(shard_stream(version, SIZE, SEED, CHUNK_SIZE), expected)
+
+    directory = tmp_path / 'checkpoint'
+    chunks = checkpointed_stream(version, SIZE, directory, CHUNK_SIZE, SEED, every=0)
+    for _ in range(2):
+        next(chunks)
+    chunks.close()  # Interrupted after two chunks
+    assert load_state(directory)['cursor'] == 2 * CHUNK_SIZE
+
+    resumed = tmp_path / 'resumed.csv'
+    csv_sink(checkpointed_stream(version, SIZE, directory, CHUNK_SIZE, SEED, every=0, resume=True), resumed)
+    assert resumed.read_bytes() == expected.read_bytes()
+
+
+def test_resume_rejects_a_checkpoint_of_another_run(tmp_path):
+    for _ in checkpointed_stream('2.4', SIZE, tmp_path, CHUNK_SIZE, SEED, every=0):
+        break
+    with pytest.raises(ValueError):
+        next(checkpointed_stream('2.4', 2 * SIZE, tmp_path, CHUNK_SIZE, SEED, resume=True))
+
+
+def test_unseeded_run_resumes_with_its_entropy(tmp_path):
+    chunks = checkpointed_stream('1.2', SIZE, tmp_path, CHUNK_SIZE, every=0)
+    next(chunks)
+    chunks.close()
+    entropy = load_state(tmp_path)['entropy']
+    resumed = tmp_path / 'resumed.csv'
+    csv_sink(checkpointed_stream('1.2', SIZE, tmp_path, CHUNK_SIZE, every=0, resume=True), resumed)
+    expected = tmp_path / 'expected.csv'
+    csv_sink(shard_stream('1.2', SIZE, entropy, CHUNK_SIZE), expected)
+    assert resumed.read_bytes() == expected.read_bytes()
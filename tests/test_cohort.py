@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from simplebiofactory.cohort import (CHOLESTEROL_RANGE, HEALTH_STATES, SYSTOLIC_RANGE, PatientView, gene_names,
+                                     generate_cohort)
+
+# The vectorized cohort generator: arrays of the right shapes and ranges, reproducible from a seed, and
+# per-patient views with the keys and values of the scripts' generate_patient_data() dicts
+
+GENES = ['BRCA1', 'APOE', 'TP53']
+CONDITIONS = ['Allergy', 'Hypertension', 'Diabetes']
+ALLERGIES = ['Pollen', 'Penicillin', 'Dust']
+SIZE = 500
+
+
+def cohort(seed=3, **options):
+    return generate_cohort(SIZE, GENES, CONDITIONS, allergy_names=ALLERGIES, rng=np.random.default_rng(seed),
+                           **options)
+
+
+def test_arrays_have_the_shapes_and_ranges_of_the_scripts():
+    patients = cohort(history_size=4)
+    assert len(patients) == SIZE and patients.genes == tuple(GENES)
+    assert patients.genetics.shape == (SIZE, 3) and patients.genetics.dtype == np.float32
+    assert ((patients.genetics >= 0) & (patients.genetics < 1)).all()
+    assert patients.medical_history.shape == (SIZE, 4) and patients.medical_history.max() < len(CONDITIONS)
+    assert patients.allergies.shape == (SIZE, 2) and patients.allergies.max() < len(ALLERGIES)
+    assert set(patients.current_health) == {0, 1, 2}
+    assert SYSTOLIC_RANGE[0] <= patients.systolic.min() and patients.systolic.max() < SYSTOLIC_RANGE[1]
+    assert CHOLESTEROL_RANGE[0] <= patients.cholesterol.min() and patients.cholesterol.max() < CHOLESTEROL_RANGE[1]
+    assert generate_cohort(3, 2, CONDITIONS).allergies.shape == (3, 0)  # No allergies simulated
+
+
+def test_seeded_cohorts_are_reproducible():
+    first, second = cohort(), cohort()
+    for name in ('genetics', 'medical_history', 'current_health', 'systolic', 'cholesterol', 'allergies'):
+        np.testing.assert_array_equal(getattr(first, name), getattr(second, name))
+    assert not np.array_equal(first.genetics, cohort(seed=4).genetics)
+
+
+def test_patient_view_reads_one_row():
+    patients = cohort()
+    view = patients.patient(7)
+    assert isinstance(view, PatientView)
+    assert list(view) == ['genetics', 'medical_history', 'current_health', 'biomarkers', 'allergies']
+    assert dict(view['genetics']) == {gene: patients.genetics[7, j] for j, gene in enumerate(GENES)}
+    assert 'APOE' in view['genetics'] and 'Gene1' not in view['genetics']
+    assert list(view['medical_history']) == [CONDITIONS[code] for code in patients.medical_history[7]]
+    assert list(view['allergies']) == [ALLERGIES[code] for code in patients.allergies[7]]
+    assert view['current_health'] == HEALTH_STATES[patients.current_health[7]]
+    assert view['biomarkers'] == {'cholesterol_level': int(patients.cholesterol[7]),
+                                  'blood_pressure': {'systolic': int(patients.systolic[7]),
+                                                     'diastolic': int(patients.diastolic[7])}}
+    with pytest.raises(KeyError):
+        view['outcome']
+    assert [patient['current_health'] for patient in patients.patients()][:8] == \
+        [patients.patient(index)['current_health'] for index in range(8)]
+
+
+def test_history_queries_and_take():
+    patients = cohort()
+    names = patients.history_names()
+    has_diabetes = (names == 'Diabetes').any(axis=1)
+    np.testing.assert_array_equal(patients.has_any_condition(['Diabetes']), has_diabetes)
+    np.testing.assert_array_equal(patients.has_all_conditions(['Diabetes', 'Allergy']),
+                                  has_diabetes & (names == 'Allergy').any(axis=1))
+    assert patients.history_text()[0] == ', '.join(names[0])
+
+    rows = np.flatnonzero(has_diabetes)
+    taken = patients.take(rows)
+    assert len(taken) == len(rows) and taken.has_any_condition(['Diabetes']).all()
+    np.testing.assert_array_equal(taken.genetics, patients.genetics[rows])
+    np.testing.assert_array_equal(taken.gene('TP53'), patients.gene('TP53')[rows])
+
+
+def test_gene_names():
+    assert gene_names(3) == ['Gene1', 'Gene2', 'Gene3']
+    assert gene_names({'Gene1': {}, 'Gene7': {}}) == ['Gene1', 'Gene7']
+    assert gene_names(('BRCA1',)) == ['BRCA1']
@@ -0,0 +1,298 @@
+import numpy as np
+import pytest
+
+from simplebiofactory import api
+from simplebiofactory.cohort import HEALTH_STATES, Cohort, gene_names
+from simplebiofactory.manufacturing import ManufacturingTable, OutcomeTable
+from simplebiofactory.profiles import MANUFACTURING_2_4, NO_RECOMMENDATION, PROFILES, THERAPIES_2_3
+from simplebiofactory.tiers import Tiers
+
+# The compiled rules, tiers and screening against the outputs of the original per-patient scripts,
+# written out by hand for patients that exercise every branch (and the boundaries of every comparison).
+# Genetics are float64, as np.random.rand gave them to the scripts.
+
+SIZE = 2000
+SEED = 7
+
+IDLE = (None, 'Bioreactor idle', 'Standard dosage')
+
+
+# A hand-written patient: the genes not given get fill, allergies are names
+def patient(history, health='Fair', systolic=120, cholesterol=180, allergies=(), fill=0.4, **genes):
+    return {'history': history, 'health': health, 'systolic': systolic, 'cholesterol': cholesterol,
+            'allergies': allergies, 'fill': fill, 'genes': genes}
+
+
+# Cohort of hand-written patients of one version
+def make_cohort(version, patients):
+    profile = PROFILES[version]
+    genes = gene_names(profile['genes'])
+    conditions, allergy_names = list(profile['conditions']), list(profile.get('allergies', ()))
+    genetics = np.array([[case['genes'].get(gene, case['fill']) for gene in genes] for case in patients])
+    history = np.array([[conditions.index(name) for name in case['history']] for case in patients], dtype=np.uint8)
+    health = np.array([HEALTH_STATES.index(case['health']) for case in patients], dtype=np.uint8)
+    systolic = np.array([case['systolic'] for case in patients], dtype=np.int16)
+    cholesterol = np.array([case['cholesterol'] for case in patients], dtype=np.int16)
+    allergies = None
+    if allergy_names:
+        allergies = np.array([[allergy_names.index(name) for name in case['allergies']] for case in patients],
+                             dtype=np.uint8)
+    return Cohort(genes, genetics, conditions, history, health, systolic, np.full(len(patients), 80, np.int16),
+                  cholesterol, allergy_names, allergies)
+
+
+def manufacturing_table(version, therapies):
+    profile = PROFILES[version]
+    return ManufacturingTable(profile['manufacturing'], therapies, gene_names(profile['genes']))
+
+
+# Microorganism, process and dosage names of a cohort from ManufacturingTable.apply()
+def manufactured(table, cohort, therapy_codes):
+    return list(zip(*(names.tolist() for names in table.names(table.apply(cohort, therapy_codes)))))
+
+
+def test_chain_rules_1():
+    cohort = make_cohort('1', [patient(['Allergy', 'Hypertension']), patient(['Allergy', 'Allergy'])])
+    rules = api.therapy_rules('1')
+    codes = rules.select(cohort)
+    assert np.array(rules.therapies, dtype=object)[codes].tolist() == [
+        'Anti-hypertensive drug', 'General wellness recommendation']
+    assert manufactured(manufacturing_table('1', rules.therapies), cohort, codes) == [
+        ('Engineered microorganism for drug production', 'Bioreactor producing therapy', 'Standard dosage'),
+        ('No specific bioactive compound engineered', 'Bioreactor producing therapy', 'Standard dosage')]
+
+
+ANTIHYPERTENSIVE_1_2 = ('Engineered microorganism for drug production (antihypertensive)',
+                        'Bioreactor producing antihypertensive drug', 'Standard dosage')
+ANTIHISTAMINE_1_2 = ('Engineered microorganism for drug production (antihistamine)',
+                     'Bioreactor producing antihistamine', 'Standard dosage')
+GENETIC_1_2 = ('Engineered microorganism for genetic therapy', 'Bioreactor producing genetic therapy',
+               'Standard dosage')
+
+CASES_1_2 = [
+    (patient(['Hypertension', 'Hypertension'], systolic=161, allergies=['Pollen', 'Pollen']),
+     'Prescription antihypertensive drug', ANTIHYPERTENSIVE_1_2),
+    (patient(['Hypertension', 'Hypertension'], systolic=160, allergies=['Pollen', 'Pollen']),
+     'Lifestyle modification for hypertension', IDLE),
+    (patient(['Hypertension', 'Allergy'], systolic=170, allergies=['Pollen', 'Pollen']),
+     'Allergy medication (antihistamine)', ANTIHISTAMINE_1_2),
+    (patient(['Allergy', 'Hypertension'], allergies=['Pollen', 'Penicillin']),
+     'Allergy medication (non-penicillin-based)', ANTIHISTAMINE_1_2),
+    (patient(['Hypertension', 'Hypertension'], allergies=['Pollen', 'Pollen'], fill=0.5),  # Mean not above 0.5
+     'Lifestyle modification for hypertension', IDLE),
+    (patient(['Allergy', 'Allergy'], allergies=['Penicillin', 'Pollen'], fill=0.6),
+     'Genetic-based therapy', GENETIC_1_2),
+    (patient(['Allergy', 'Hypertension'], 'Poor', systolic=165, allergies=['Pollen', 'Pollen'], fill=0.6),
+     'Hospitalization and specialized treatment', IDLE),
+]
+
+
+def test_chain_rules_and_blocker_screening_1_2():
+    cohort = make_cohort('1.2', [case for case, _, _ in CASES_1_2])
+    rules, screening = api.therapy_rules('1.2'), api.therapy_screening('1.2')
+    codes = rules.select(cohort)
+    expected = [therapy for _, therapy, _ in CASES_1_2]
+    assert np.array(rules.therapies, dtype=object)[codes].tolist() == expected
+    assert manufactured(manufacturing_table('1.2', rules.therapies), cohort, codes) == \
+        [manufacturing for _, _, manufacturing in CASES_1_2]
+
+    # Any of ten genetic tests above 0.7 blocks: one draw below 1 - 0.7 ** 10 does
+    blocked = 'Genetic-based therapy (adjusted for drug blockers)'
+    for draw, genetic in ((0.97, blocked), (0.98, 'Genetic-based therapy')):
+        draws = np.full(len(cohort), draw)
+        assert screening.names(screening.screen(cohort, codes, draws=draws)).tolist() == \
+            [genetic if therapy == 'Genetic-based therapy' else therapy for therapy in expected]
+
+
+def test_blocker_screening_rate_1_2():
+    cohort = api.generate('1.2', SIZE, SEED)
+    rules, screening = api.therapy_rules('1.2'), api.therapy_screening('1.2')
+    selected = screening.names(screening.screen(cohort, rules.select(cohort), np.random.default_rng(SEED)))
+    tested = selected[np.char.startswith(selected.astype(str), 'Genetic-based therapy')]
+    blocked = (tested != 'Genetic-based therapy').mean()
+    assert abs(blocked - (1 - 0.7 ** 10)) < 0.03
+
+
+ANTIHYPERTENSIVE_2_1 = ('Engineered microorganism for antihypertensive drug production',
+                        'Bioreactor producing antihypertensive drug', 'Standard dosage')
+
+CASES_2_1 = [
+    (patient(['Hypertension', 'Allergy'], systolic=161, allergies=['Dust', 'Peanuts']),
+     'Prescription antihypertensive drug (May interact with Drug A, Drug B)', ANTIHYPERTENSIVE_2_1),
+    (patient(['Hypertension', 'Hypertension'], systolic=160, allergies=['Dust', 'Peanuts']),
+     'Lifestyle modification for hypertension', IDLE),
+    (patient(['Hypertension', 'Diabetes'], systolic=170, cholesterol=201, allergies=['Dust', 'Dust']),
+     'Insulin therapy and cholesterol-lowering medication (May interact with Drug C, Drug D)',
+     ('Engineered microorganism for insulin and cholesterol medication production',
+      'Bioreactor producing insulin and cholesterol medication', 'Standard dosage')),
+    (patient(['Diabetes', 'Diabetes'], cholesterol=200, allergies=['Dust', 'Dust']),
+     'Oral diabetes medication (May interact with Drug E, Drug F)',
+     ('Engineered microorganism for oral diabetes medication production',
+      'Bioreactor producing oral diabetes medication', 'Standard dosage')),
+    (patient(['Diabetes', 'Allergy'], allergies=['Peanuts', 'Pollen']), 'Allergy medication (antihistamine)', IDLE),
+    (patient(['Allergy', 'Allergy'], allergies=['Penicillin', 'Pollen']),
+     'Allergy medication (non-penicillin-based)', IDLE),
+    (patient(['Allergy', 'Allergy'], allergies=['Dust', 'Peanuts']), NO_RECOMMENDATION, IDLE),
+    (patient(['Hypertension', 'Hypertension'], systolic=150, allergies=['Dust', 'Dust'], fill=0.51),
+     'Genetic-based therapy',
+     ('Engineered microorganism for genetic therapy production', 'Bioreactor producing genetic therapy',
+      'Standard dosage')),
+    (patient(['Hypertension', 'Hypertension'], 'Poor', systolic=165, allergies=['Dust', 'Dust']),
+     'Hospitalization and specialized treatment', IDLE),
+]
+
+
+def test_chain_rules_and_interaction_screening_2_1():
+    cohort = make_cohort('2.1', [case for case, _, _ in CASES_2_1])
+    rules, screening = api.therapy_rules('2.1'), api.therapy_screening('2.1')
+    codes = rules.select(cohort)
+    assert screening.names(screening.screen(cohort, codes)).tolist() == [therapy for _, therapy, _ in CASES_2_1]
+    assert manufactured(manufacturing_table('2.1', rules.therapies), cohort, codes) == \
+        [manufacturing for _, _, manufacturing in CASES_2_1]
+
+
+ANTIHYPERTENSIVE = ('Engineered microorganism for antihypertensive drug production',
+                    'Bioreactor producing antihypertensive drug')
+INSULIN = ('Engineered microorganism for insulin production', 'Bioreactor producing insulin')
+ORAL_DIABETES = ('Engineered microorganism for oral diabetes medication production', 'Bioreactor idle',
+                 'Standard dosage')
+ALLERGY = ('Engineered microorganism for allergy medication production', 'Bioreactor idle', 'Standard dosage')
+
+# (patient, the gene drawn for each history entry, therapy, manufacturing, screened therapy, outcome)
+CASES_2_2 = [
+    (patient(['Hypertension', 'Diabetes'], Gene2=0.31), ['Gene1', 'Gene2'], 'Insulin therapy (Moderate genetic risk)',
+     INSULIN + ('Moderate insulin dosage (Moderate genetic risk)',)),
+    (patient(['Diabetes', 'Hypertension'], Gene1=0.6), ['Gene2', 'Gene1'],
+     'Prescription antihypertensive drug (Moderate genetic risk)',
+     ANTIHYPERTENSIVE + ('Moderate dosage (Moderate genetic risk)',)),
+    (patient(['Allergy', 'Hypertension'], Gene1=0.61), ['Gene3', 'Gene1'],
+     'Prescription antihypertensive drug (Moderate genetic risk)',
+     ANTIHYPERTENSIVE + ('Higher dosage (High genetic risk)',)),
+    (patient(['Allergy', 'Hypertension'], Gene1=0.3), ['Gene50', 'Gene1'],
+     'Prescription antihypertensive drug (Moderate genetic risk)', ANTIHYPERTENSIVE + ('Standard dosage',)),
+    (patient(['Diabetes', 'Diabetes'], Gene2=0.9), ['Gene1', 'Gene2'], 'Insulin therapy (Moderate genetic risk)',
+     INSULIN + ('Higher insulin dosage (High genetic risk)',)),
+    (patient(['Allergy', 'Diabetes']), ['Gene1', 'Gene7'], 'Default therapy for missing gene', IDLE),
+    (patient(['Diabetes', 'Allergy']), ['Gene9', 'Gene2'], 'Allergy medication (antihistamine)', ALLERGY),
+    (patient(['Hypertension', 'Diabetes']), ['Gene2', 'Gene1'], 'Oral diabetes medication (Low genetic risk)',
+     ORAL_DIABETES),
+    (patient(['Diabetes', 'Hypertension'], Gene1=0.9), ['Gene1', 'Gene2'], 'Lifestyle modification for hypertension',
+     IDLE),
+]
+
+CASES_2_4 = [
+    (patient(['Allergy', 'Hypertension'], BRCA1=0.45), ['TP53', 'BRCA1'],
+     'Prescription antihypertensive drug (Moderate genetic risk)',
+     ANTIHYPERTENSIVE + ('Moderate dosage (Moderate genetic risk)',), None, 'Moderate outcome (Moderate genetic risk)'),
+    (patient(['Diabetes', 'Hypertension'], BRCA1=0.3), ['BRCA1', 'TP53'],
+     'Prescription antihypertensive drug (Low genetic risk)', ANTIHYPERTENSIVE + ('Standard dosage',), None,
+     'Standard outcome (Low genetic risk)'),
+    (patient(['Hypertension', 'Allergy'], BRCA1=0.61, TP53=0.61), ['BRCA1', 'TP53'],
+     'Allergy medication (Moderate genetic risk)', ALLERGY, 'Allergy medication (High genetic risk) - Drug blocked',
+     'Favorable outcome (High genetic risk)'),
+    (patient(['Diabetes', 'Allergy'], TP53=0.6), ['BRCA1', 'APOE'], 'Allergy medication (antihistamine)', ALLERGY,
+     'Allergy medication (Moderate genetic risk) - Drug partially blocked', 'Moderate outcome (Moderate genetic risk)'),
+    (patient(['Allergy', 'Allergy'], TP53=0.3), ['APOE', 'BRCA1'], 'Allergy medication (antihistamine)', ALLERGY,
+     None, 'Moderate outcome (Moderate genetic risk)'),
+    (patient(['Allergy', 'Diabetes'], APOE=0.7), ['BRCA1', 'APOE'], 'Insulin therapy (Moderate genetic risk)',
+     INSULIN + ('Higher insulin dosage (High genetic risk)',), None, 'Moderate outcome (Moderate genetic risk)'),
+    (patient(['Hypertension', 'Diabetes']), ['APOE', 'TP53'], 'Oral diabetes medication (High genetic risk)',
+     ORAL_DIABETES, None, 'Moderate outcome (Moderate genetic risk)'),
+    (patient(['Diabetes', 'Hypertension']), ['TP53', 'APOE'], 'Lifestyle modification for hypertension', IDLE, None,
+     'Moderate outcome (Moderate genetic risk)'),
+]
+
+# 3.1's gene_impact only knows 'Cancer' and 'Lung Cancer', which are not 3.1 conditions
+CASES_3_1 = [
+    (patient(['Allergy', 'HIV/AIDS'], EGFR=0.2), ['BRCA1', 'EGFR'], 'Default therapy for missing gene', IDLE,
+     None, 'Standard outcome (Low genetic risk)'),
+    (patient(['Lupus', 'Asthma'], EGFR=0.61), ['KRAS', 'TP53'], 'Default therapy for missing gene', IDLE, None,
+     'Favorable outcome (High genetic risk)'),
+]
+
+
+def replay(version, cases):
+    cohort = make_cohort(version, [case[0] for case in cases])
+    rules = api.therapy_rules(version)
+    drawn = np.array([[rules.genes.index(gene) for gene in case[1]] for case in cases])
+    return cohort, rules, rules.select(cohort, drawn_genes=drawn)
+
+
+@pytest.mark.parametrize('version, cases', [('2.2', CASES_2_2), ('2.4', CASES_2_4), ('3.1', CASES_3_1)])
+def test_gene_impact_rules_replay_the_drawn_genes(version, cases):
+    cohort, rules, codes = replay(version, cases)
+    assert np.array(rules.therapies, dtype=object)[codes].tolist() == [case[2] for case in cases]
+    assert manufactured(manufacturing_table(version, rules.therapies), cohort, codes) == [case[3] for case in cases]
+
+    screening = api.therapy_screening(version)
+    if screening is not None:
+        # 2.4's TP53 drug blockers rename the therapy inside biomanufacturing()
+        assert screening.names(screening.screen(cohort, codes)).tolist() == \
+            [case[4] or case[2] for case in cases]
+
+
+@pytest.mark.parametrize('version, cases', [('2.4', CASES_2_4), ('3.1', CASES_3_1)])
+def test_outcome_tiers(version, cases):
+    cohort, _, _ = replay(version, cases)
+    profile = PROFILES[version]
+    table = OutcomeTable(profile['outcome'], gene_names(profile['genes']))
+    assert np.array(table.outcomes, dtype=object)[table.apply(cohort)].tolist() == [case[5] for case in cases]
+
+
+def test_missing_outcome_gene_2_2():
+    cohort, _, _ = replay('2.2', CASES_2_2)
+    table = OutcomeTable(PROFILES['2.2']['outcome'], gene_names(PROFILES['2.2']['genes']))
+    assert set(np.array(table.outcomes, dtype=object)[table.apply(cohort)]) == {'Gene not found in genetic data'}
+
+
+def test_surgery_and_egfr_manufacturing_3_1():
+    therapies = ['Prophylactic surgery (High genetic risk)', 'EGFR inhibitor therapy (Specific genetic mutation)',
+                 'Aggressive treatment and monitoring (High genetic risk)']
+    cohort = make_cohort('3.1', [patient(['Allergy'], EGFR=0.61)] * 3)
+    assert manufactured(manufacturing_table('3.1', therapies), cohort, np.arange(3)) == [
+        ('No engineered microorganism needed', 'No bioreactor needed', 'No dosage adjustment needed'),
+        ('Engineered microorganism for EGFR inhibitor production', 'Bioreactor producing EGFR inhibitor',
+         'Higher dosage (High genetic risk)'),
+        IDLE]
+
+
+def test_therapy_table_rules_2_3():
+    # 2.3 looks conditions up in genes_required, which lists genes, so nothing is ever selected
+    cohort = api.generate('2.3', SIZE, SEED)
+    assert set(api.therapy_rules('2.3').select_names(cohort)) == {NO_RECOMMENDATION}
+
+
+@pytest.mark.parametrize('therapy, gene, process', [
+    ('Antihypertensive', 'Gene1', 'Bioreactor producing antihypertensive drug'),
+    ('Insulin Therapy', 'Gene2', 'Bioreactor producing insulin'),
+])
+def test_therapy_table_dosage_ranges_2_3(therapy, gene, process):
+    values = [0.0, 0.1, 0.2, 0.45, 0.7, 0.71, 1.0]
+    levels = ['Low genetic risk'] * 3 + ['Moderate genetic risk'] * 2 + ['High genetic risk'] * 2  # First range wins
+    cohort = make_cohort('2.3', [patient(['Diabetes', 'Allergy'], **{gene: value}) for value in values])
+    table = manufacturing_table('2.3', [therapy])
+    expected = [(f'Engineered microorganism for {therapy} production', process, level) for level in levels]
+    assert manufactured(table, cohort, np.zeros(len(cohort), dtype=np.int16)) == expected
+    assert [table.lookup(therapy, cohort.patient(index)['genetics']) for index in range(len(cohort))] == expected
+
+
+@pytest.mark.parametrize('dtype', [np.float32, np.float64])
+def test_tiers_match_the_scripts_comparisons_at_the_boundaries(dtype):
+    boundaries = np.array([0.0, 0.2, 0.3, 0.6, 0.7, 1.0], dtype=dtype)
+    values = np.concatenate([boundaries, np.nextafter(boundaries, dtype(-1)), np.nextafter(boundaries, dtype(2))])
+
+    # > 0.6 high, > 0.3 moderate, standard otherwise (2.2, 2.4, 3.1)
+    tiers = Tiers(MANUFACTURING_2_4[0]['dosage_levels'], 'Standard dosage')
+    expected = ['Higher dosage (High genetic risk)' if value > 0.6 else
+                'Moderate dosage (Moderate genetic risk)' if value > 0.3 else 'Standard dosage' for value in values]
+    assert np.array(tiers.labels, dtype=object)[tiers.assign(values)].tolist() == expected
+    assert [tiers.label(value) for value in values] == expected
+
+    # Closed ranges, first listed wins at a shared boundary (2.3)
+    dosage_levels = THERAPIES_2_3['Antihypertensive']['dosage_levels']
+    tiers = Tiers([(level, bounds['min'], bounds['max'], 'both') for level, bounds in dosage_levels.items()],
+                  'Standard dosage')
+    expected = [next((level for level, bounds in dosage_levels.items() if bounds['min'] <= value <= bounds['max']),
+                     'Standard dosage') for value in values]
+    assert np.array(tiers.labels, dtype=object)[tiers.assign(values)].tolist() == expected
+    assert [tiers.label(value) for value in values] == expected
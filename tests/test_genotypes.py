@@ -0,0 +1,108 @@
+import numpy as np
+import pytest
+
+from simplebiofactory.cohort import Cohort, generate_cohort
+from simplebiofactory.genotypes import (QuantizedGenotypes, SparseGenotypes, load_genotypes, quantize,
+                                        random_panel, referenced_genes, save_genotypes)
+from simplebiofactory.profiles import PROFILES
+from simplebiofactory.rules import compile_rules
+
+# Compact genotype stores must decode to the quantized values of the dense matrix they were built from,
+# whatever the code width, and a cohort over a store must select the therapies of its dense genetics
+
+PATIENTS = 37  # Not a multiple of the 4 or 2 codes packed to a byte
+GENES = 6
+
+
+def genetics(bits, seed=0):
+    rng = np.random.default_rng(seed)
+    values = rng.random((PATIENTS, GENES))
+    values[rng.random(values.shape) < 0.7] = 0.0  # Mostly baseline, as in a sparse panel
+    return values, quantize(values, bits) / np.float32((1 << bits) - 1)
+
+
+def stores(values, bits):
+    return [QuantizedGenotypes.from_dense(values, bits=bits), SparseGenotypes.from_dense(values, bits=bits)]
+
+
+def test_quantize():
+    assert quantize(np.array([-1.0, 0.0, 0.5, 1.0, 2.0]), bits=2).tolist() == [0, 0, 2, 3, 3]
+    assert quantize(1.0).tolist() == 255
+    with pytest.raises(ValueError):
+        quantize(0.5, bits=3)
+
+
+@pytest.mark.parametrize('bits', [2, 4, 8])
+def test_stores_decode_the_quantized_values(bits):
+    values, expected = genetics(bits)
+    rows, columns = np.array([0, 36, 5, 5, 17]), np.array([3, 0, 5, 0, 3])
+    for store in stores(values, bits):
+        assert len(store) == PATIENTS and store.genes == ('Gene1', 'Gene2', 'Gene3', 'Gene4', 'Gene5', 'Gene6')
+        np.testing.assert_allclose(store.dense(), expected, rtol=1e-6)
+        np.testing.assert_allclose(store.column(2, [4, 1, 36]), expected[[4, 1, 36], 2], rtol=1e-6)
+        np.testing.assert_allclose(store.values_at(rows, columns), expected[rows, columns], rtol=1e-6)
+        np.testing.assert_allclose(store.row_means(), expected.mean(axis=1), rtol=1e-5)
+
+
+@pytest.mark.parametrize('bits', [2, 8])
+def test_select_and_take(bits):
+    values, expected = genetics(bits, seed=1)
+    rows = np.array([3, 0, 36, 10])
+    for store in stores(values, bits):
+        selected = store.select(['Gene5', 'Gene2'])
+        assert type(selected) is type(store) and selected.genes == ('Gene5', 'Gene2')
+        np.testing.assert_allclose(selected.dense(), expected[:, [4, 1]], rtol=1e-6)
+        taken = store.take(rows)
+        assert len(taken) == len(rows)
+        np.testing.assert_allclose(taken.dense(), expected[rows], rtol=1e-6)
+        assert store.select([]).dense().shape == (PATIENTS, 0)
+
+
+def test_sparse_stores_keep_only_the_values_off_the_baseline():
+    values, expected = genetics(8)
+    store = SparseGenotypes.from_dense(values)
+    assert store.nnz == np.count_nonzero(quantize(values))
+
+    baseline = SparseGenotypes.from_dense(values, baseline=1.0)  # Every zero is now off the baseline
+    assert baseline.baseline == 255 and baseline.nnz == np.count_nonzero(quantize(values) != 255)
+    np.testing.assert_allclose(baseline.dense(), expected, rtol=1e-6)
+
+
+def test_random_panel():
+    panel = random_panel(10000, 50, density=0.02, bits=4, rng=np.random.default_rng(0))
+    assert panel.genes[-1] == 'Gene50' and panel.bits == 4
+    assert panel.nnz == pytest.approx(10000 * 50 * 0.02, rel=0.05)
+    assert (panel.codes != panel.baseline).all() and panel.codes.max() <= 15
+    for column in range(50):
+        assert (np.diff(panel.rows[panel.indptr[column]:panel.indptr[column + 1]].astype(np.int64)) > 0).all()
+
+
+@pytest.mark.parametrize('store', [QuantizedGenotypes, SparseGenotypes])
+def test_saved_stores_load_back(store, tmp_path):
+    values, expected = genetics(4)
+    path = tmp_path / 'genotypes.npz'
+    save_genotypes(store.from_dense(values, bits=4), path)
+    loaded = load_genotypes(path)
+    assert type(loaded) is store and loaded.bits == 4 and loaded.genes == store.from_dense(values).genes
+    np.testing.assert_allclose(loaded.dense(), expected, rtol=1e-6)
+
+
+def test_referenced_genes():
+    assert referenced_genes(PROFILES['2.4']) == ['BRCA1', 'APOE', 'TP53']
+    assert referenced_genes(PROFILES['1']) == []
+    assert referenced_genes(PROFILES['1.2']) is None  # The chain reads the mean of every gene
+
+
+@pytest.mark.parametrize('store', [QuantizedGenotypes, SparseGenotypes])
+def test_cohorts_over_a_store_select_the_therapies_of_its_genetics(store):
+    profile = PROFILES['1.2']
+    values = np.random.default_rng(2).random((500, profile['genes']))
+    genotypes = store.from_dense(values)
+    cohort = generate_cohort(500, profile['genes'], profile['conditions'], allergy_names=profile['allergies'],
+                             rng=np.random.default_rng(5), genotypes=genotypes)
+    dense = Cohort(cohort.genes, genotypes.dense(), cohort.conditions, cohort.medical_history, cohort.current_health,
+                   cohort.systolic, cohort.diastolic, cohort.cholesterol, cohort.allergy_names, cohort.allergies)
+    rules = compile_rules(profile)
+    np.testing.assert_array_equal(rules.select(cohort), rules.select(dense))
+    with pytest.raises(ValueError):
+        generate_cohort(499, profile['genes'], profile['conditions'], genotypes=genotypes)
@@ -0,0 +1,58 @@
+import copy
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from simplebiofactory import api
+from simplebiofactory.incremental import IncrementalEngine
+from simplebiofactory.profiles import GENE_IMPACT_2_4, SCREENING_1_2
+
+# An edit re-evaluates only the affected patients, replaying the engine's stored draws, so the patched
+# database equals a full evaluation and a saved engine gives the same ChangeSet as the one in memory
+
+SIZE = 5000
+SEED = 5
+
+# 1.2's random blocker test, now against 0.8
+BLOCKER_EDIT = {'screening': {'blockers': [dict(SCREENING_1_2['blockers'][0], threshold=0.8)]}}
+
+
+def gene_impact_edit():
+    gene_impact = copy.deepcopy(GENE_IMPACT_2_4)
+    gene_impact['APOE']['Hypertension'] = 'Prescription antihypertensive drug (High genetic risk)'
+    return {'gene_impact': gene_impact}
+
+
+@pytest.mark.parametrize('version, edit', [('1.2', BLOCKER_EDIT), ('2.4', gene_impact_edit())])
+def test_patched_database_equals_the_engine_after_an_edit(version, edit):
+    engine = IncrementalEngine(version, api.generate(version, SIZE, SEED), seed=SEED)
+    patient_database = engine.to_frame()
+    changes = engine.update(**edit)
+    assert 0 < len(changes) <= changes.evaluated
+    pd.testing.assert_frame_equal(engine.patch_frame(patient_database, changes), engine.to_frame())
+
+
+def test_a_seeded_engine_is_deterministic():
+    results = []
+    for _ in range(2):
+        engine = IncrementalEngine('1.2', api.generate('1.2', SIZE, SEED), seed=SEED)
+        results.append((engine.to_frame(), engine.update(**BLOCKER_EDIT).rows))
+    pd.testing.assert_frame_equal(results[0][0], results[1][0])
+    np.testing.assert_array_equal(results[0][1], results[1][1])
+
+
+def test_a_loaded_engine_replays_the_saved_draws(tmp_path):
+    engine = IncrementalEngine('1.2', api.generate('1.2', SIZE, SEED), seed=SEED)
+    engine.save(tmp_path / 'engine.npz')
+    loaded = IncrementalEngine.load(tmp_path / 'engine.npz')
+    pd.testing.assert_frame_equal(loaded.to_frame(), engine.to_frame())
+    np.testing.assert_array_equal(loaded.update(**BLOCKER_EDIT).rows, engine.update(**BLOCKER_EDIT).rows)
+    pd.testing.assert_frame_equal(loaded.to_frame(), engine.to_frame())
+
+
+def test_patch_frame_rejects_a_database_the_engine_did_not_evaluate():
+    engine = IncrementalEngine('1.2', api.generate('1.2', SIZE, SEED), seed=SEED)
+    changes = engine.update(**BLOCKER_EDIT)
+    with pytest.raises(ValueError):
+        engine.patch_frame(api.simulate('1.2', SIZE, seed=SEED + 1), changes)
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from simplebiofactory.kinetics import (DEFAULT_DT, DEFAULT_KINETICS, PROCESS_KINETICS, Bioreactors, kinetics_table,
+                                       simulate_production)
+from simplebiofactory.manufacturing import IDLE_PROCESS
+
+# Fed-batch kinetics: a bank of reactors stepped together must behave like each reactor stepped alone,
+# batches are harvested on schedule and idle reactors never produce
+
+INSULIN = 'Bioreactor producing insulin'
+GENETIC = 'Bioreactor producing genetic therapy'
+PROCESSES = [IDLE_PROCESS, INSULIN, GENETIC, 'Bioreactor producing therapy']
+
+
+def test_kinetics_table_overrides_the_defaults():
+    table = kinetics_table(PROCESSES)
+    assert table['mu_max'].tolist() == [DEFAULT_KINETICS['mu_max'], PROCESS_KINETICS[INSULIN]['mu_max'],
+                                        PROCESS_KINETICS[GENETIC]['mu_max'], DEFAULT_KINETICS['mu_max']]
+    assert table['batch_hours'].tolist() == [72.0, 48.0, 168.0, 72.0]
+
+
+def test_a_bank_of_reactors_matches_reactors_run_alone():
+    codes = [1, 2, 3, 0, 1]
+    bank = Bioreactors(codes, PROCESSES)
+    trajectory = bank.run(200, record_every=1.0)
+    for reactor, code in enumerate(codes):
+        alone = Bioreactors([code], PROCESSES)
+        np.testing.assert_allclose(alone.run(200, record_every=1.0)[:, 0], trajectory[:, reactor])
+        np.testing.assert_allclose(alone.harvested, bank.harvested[reactor])
+    assert trajectory.shape == (200, len(codes))
+
+
+def test_batches_are_harvested_after_their_batch_hours():
+    reactors = Bioreactors([1, 3], PROCESSES)
+    product = reactors.run(48 - DEFAULT_DT, record_every=DEFAULT_DT)
+    assert (np.diff(product[:, 0]) > 0).all() and (product >= 0).all()
+    assert reactors.batches.tolist() == [0, 0]
+    reactors.step()  # The insulin batch reaches 48 hours
+    assert reactors.batches.tolist() == [1, 0] and reactors.product[0] == 0.0
+    assert reactors.harvested[0] > 0 and reactors.batch_age[0] == -DEFAULT_KINETICS['turnaround_hours']
+    assert reactors.volume[0] == DEFAULT_KINETICS['volume']
+
+    # Feeding stops at the maximum volume
+    reactors.run(24)
+    assert (reactors.volume <= DEFAULT_KINETICS['max_volume'] + DEFAULT_KINETICS['feed_rate'] * DEFAULT_DT).all()
+
+
+def test_idle_reactors_never_produce():
+    reactors = simulate_production(PROCESSES, reactors_per_process=2, hours=240)
+    production = reactors.production()
+    assert production[IDLE_PROCESS] == 0.0 and all(production[process] > 0 for process in PROCESSES[1:])
+    assert reactors.batches.tolist() == [0, 0, 4, 4, 1, 1, 3, 3]
+    assert reactors.status().tolist()[:3] == [IDLE_PROCESS, IDLE_PROCESS, INSULIN]
+    assert reactors.production(include_running=False)[INSULIN] < production[INSULIN]
+    with pytest.raises(ValueError):
+        Bioreactors([0, -1], PROCESSES)
@@ -0,0 +1,103 @@
+import pytest
+
+from simplebiofactory import api
+from simplebiofactory.memo import MemoCache, TherapySignature
+from simplebiofactory.profiles import NO_RECOMMENDATION, PROFILES
+from simplebiofactory.service import sample_patients
+
+# The therapy selection cache must return what uncached selection returns, hit for patients with the same
+# signature and drop its results when the rules are recompiled
+
+SIZE = 2000
+SEED = 5
+
+
+@pytest.fixture
+def recompiled():
+    yield
+    api.reload_rules()
+
+
+@pytest.mark.parametrize('version', ['1', '2.1', '2.3'])
+def test_cached_selection_equals_uncached_selection(version):
+    patients = sample_patients(version, SIZE, SEED)
+    cache = api.therapy_cache(version)
+    expected = api.select_therapies(version, patients).tolist()
+    assert api.select_therapies(version, patients, cache=cache).tolist() == expected
+    assert api.select_therapies(version, patients, cache=cache).tolist() == expected
+    assert cache.misses == len(cache) and cache.hits == 2 * SIZE - cache.misses
+
+
+def test_patients_share_few_signatures():
+    patients = sample_patients('2.3', SIZE, SEED)
+    cache = api.therapy_cache('2.3')
+    api.select_therapies('2.3', patients, cache=cache)
+    # 2.3 reads only the ordered two-condition history
+    assert len(cache) <= len(PROFILES['2.3']['conditions']) ** 2
+    assert cache.hit_rate > 0.98
+
+
+def test_signature_tiers_biomarkers_between_the_rule_thresholds():
+    signature = TherapySignature(api.therapy_rules('2.1'))
+    patient = {'medical_history': ['Hypertension', 'Diabetes'], 'biomarkers': {
+        'cholesterol_level': 150, 'blood_pressure': {'systolic': 120, 'diastolic': 80}}}
+
+    def key(**biomarkers):
+        changed = dict(patient['biomarkers'], **biomarkers)
+        return signature(api.patient_row('2.1', dict(patient, biomarkers=changed)))
+
+    assert key(cholesterol_level=199) == key()
+    assert key(cholesterol_level=200) != key() != key(cholesterol_level=201)
+    assert key(blood_pressure={'systolic': 150, 'diastolic': 80}) == key()
+    assert key(blood_pressure={'systolic': 161, 'diastolic': 80}) != key()
+    # The history is a set for chain rules
+    assert signature(api.patient_row('2.1', dict(patient, medical_history=['Diabetes', 'Hypertension']))) == key()
+
+
+def test_random_selection_is_not_cached():
+    for version in ('1.2', '2.2', '2.4', '3.1'):
+        assert api.therapy_cache(version) is None
+    with pytest.raises(ValueError):
+        TherapySignature(api.therapy_rules('2.4'))
+
+
+def test_recompiled_rules_invalidate_the_cache(recompiled, monkeypatch):
+    patients = sample_patients('1', 100, SEED)
+    cache = api.therapy_cache('1')
+    before = api.select_therapies('1', patients, cache=cache)
+    default = {PROFILES['1'].get('default_therapy', NO_RECOMMENDATION)}
+    assert set(before) != default
+
+    monkeypatch.setitem(PROFILES['1'], 'chain', [])
+    assert api.select_therapies('1', patients, cache=cache).tolist() == before.tolist()  # Not recompiled yet
+    api.reload_rules()
+    assert set(api.select_therapies('1', patients, cache=cache)) == default
+    assert cache.invalidations == 1 and cache.version == 1
+
+
+def test_memo_cache_evicts_the_least_recently_used_result():
+    calls = []
+    cache = MemoCache(2, on_invalidate=lambda: calls.append('invalidated'))
+    square = cache.wrap(lambda value: calls.append(value) or value * value, lambda value: value)
+    assert [square(2), square(3), square(2), square(4), square(3)] == [4, 9, 4, 16, 9]
+    assert calls == [2, 3, 4, 3]  # 3 was evicted by 4, 2 was used more recently
+    assert cache.stats() == {'size': 2, 'maxsize': 2, 'hits': 1, 'misses': 4, 'hit_rate': 0.2, 'evictions': 2,
+                             'invalidations': 0}
+    cache.invalidate()
+    assert len(cache) == 0 and calls[-1] == 'invalidated'
+
+
+def test_get_many_computes_each_missed_key_once():
+    cache = MemoCache(10)
+    computed = []
+
+    def compute(indices):
+        computed.append(indices)
+        return [f'result {index}' for index in indices]
+
+    assert cache.get_many(['a', 'b', 'a'], compute) == ['result 0', 'result 1', 'result 0']
+    assert cache.get_many(['b', 'c'], compute) == ['result 1', 'result 1']
+    assert computed == [[0, 1], [1]]
+    assert (cache.hits, cache.misses) == (2, 3)
+    with pytest.raises(ValueError):
+        MemoCache(0)
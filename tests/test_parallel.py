@@ -0,0 +1,86 @@
+import pandas as pd
+import pytest
+
+from simplebiofactory import api
+
+from simplebiofactory.analytics import Analytics, default_aggregates
+from simplebiofactory.parallel import analyze_parallel, shard_stream, simulate_parallel
+from simplebiofactory.profiles import PROFILES
+
+# Sharded runs: the output for a seed must not depend on the worker count, and merging the shards'
+# aggregates must give the aggregates of the merged records
+
+SIZE = 3000
+SHARD_SIZE = 1000
+SEED = 11
+
+
+@pytest.mark.parametrize('version', ['1.2', '2.4', '3.1'])
+def test_simulate_parallel_is_independent_of_the_worker_count(version):
+    single = simulate_parallel(version, SIZE, SEED, workers=1, shard_size=SHARD_SIZE)
+    pooled = simulate_parallel(version, SIZE, SEED, workers=3, shard_size=SHARD_SIZE)
+    pd.testing.assert_frame_equal(single, pooled)
+    assert single['Patient_ID'].tolist() == list(range(1, SIZE + 1))
+
+
+def test_simulate_parallel_depends_on_the_seed():
+    first = simulate_parallel('2.4', SIZE, SEED, workers=1, shard_size=SHARD_SIZE)
+    again = simulate_parallel('2.4', SIZE, SEED, workers=1, shard_size=SHARD_SIZE)
+    other = simulate_parallel('2.4', SIZE, SEED + 1, workers=1, shard_size=SHARD_SIZE)
+    pd.testing.assert_frame_equal(first, again)
+    assert not first['BRCA1'].equals(other['BRCA1'])
+
+
+@pytest.mark.parametrize('version', ['2.1', '2.4'])
+def test_analyze_parallel_is_independent_of_the_worker_count(version):
+    profile = PROFILES[version]
+    single = analyze_parallel(version, SIZE, SEED, Analytics(default_aggregates(profile)), workers=1,
+                              shard_size=SHARD_SIZE)
+    pooled = analyze_parallel(version, SIZE, SEED, Analytics(default_aggregates(profile)), workers=3,
+                              shard_size=SHARD_SIZE)
+    assert single.records == pooled.records == SIZE
+    assert single.text() == pooled.text()
+
+
+def _sorted(frame):
+    return frame.sort_index().sort_index(axis=1)
+
+
+@pytest.mark.parametrize('version', ['2.2', '2.4'])
+def test_merged_shard_analytics_match_the_merged_records(version):
+    profile = PROFILES[version]
+    merged = analyze_parallel(version, SIZE, SEED, Analytics(default_aggregates(profile, biomarkers=False)),
+                              workers=1, shard_size=SHARD_SIZE)
+    from_records = Analytics(default_aggregates(profile, biomarkers=False))
+    from_records.update_frame(simulate_parallel(version, SIZE, SEED, workers=1, shard_size=SHARD_SIZE))
+    # The database's categories are in first-seen order, the chunks' in vocabulary order
+    for aggregate in merged:
+        pd.testing.assert_frame_equal(_sorted(aggregate.frame()), _sorted(from_records[aggregate.name].frame()))
+
+
+@pytest.mark.parametrize('version', ['1.2', '2.4'])
+def test_api_output_is_independent_of_the_worker_count(version, tmp_path):
+    single = api.simulate(version, SIZE, SEED, chunk_size=SHARD_SIZE, workers=1)
+    pooled = api.simulate(version, SIZE, SEED, chunk_size=SHARD_SIZE, workers=2)
+    pd.testing.assert_frame_equal(single, pooled)
+    assert api.analyze(version, SIZE, SEED, chunk_size=SHARD_SIZE).text() == \
+        api.analyze(version, SIZE, SEED, chunk_size=SHARD_SIZE, workers=2).text()
+
+    # The single-process CSV stream and checkpointed runs have the sharded run's records
+    expected = pd.read_csv(_csv(single, tmp_path))
+    for name, checkpoint in (('streamed.csv', None), ('checkpointed.csv', tmp_path / 'checkpoint')):
+        api.simulate_to_file(version, SIZE, tmp_path / name, SEED, SHARD_SIZE, checkpoint=checkpoint)
+        streamed = pd.read_csv(tmp_path / name)
+        pd.testing.assert_frame_equal(streamed, expected)
+
+
+def _csv(patient_database, tmp_path):
+    path = tmp_path / 'database.csv'
+    with open(path, 'w', newline='') as out:
+        api.report(patient_database, 'csv', out)
+    return path
+
+
+def test_shard_stream_chunks_are_the_shards():
+    starts = [chunk['start'] for chunk in shard_stream('2.4', SIZE, SEED, SHARD_SIZE)]
+    assert starts == list(range(0, SIZE, SHARD_SIZE))
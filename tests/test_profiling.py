@@ -0,0 +1,96 @@
+import json
+
+import pytest
+
+from simplebiofactory import api, profiling
+from simplebiofactory.profiling import PROFILE_ENV, Profiler
+
+# Stage timers and counters: nested spans, counters, trace exports and the shared profiler
+
+
+@pytest.fixture
+def shared_profiler():
+    previous = profiling.set_profiler(None)
+    yield
+    profiling.set_profiler(previous)
+
+
+def test_spans_nest_and_export_as_folded_stacks():
+    profiler = Profiler()
+    with profiler.span('outer'):
+        with profiler.span('inner'):
+            pass
+        with profiler.span('inner'):
+            pass
+    assert [(name, path) for name, path, _, _, _ in profiler.events] == \
+        [('inner', 'outer;inner'), ('inner', 'outer;inner'), ('outer', 'outer')]
+    assert profiler.summary()['stages']['inner']['calls'] == 2
+
+    folded = dict(line.rsplit(' ', 1) for line in profiler.folded_stacks().splitlines())
+    assert set(folded) == {'outer', 'outer;inner'}
+    assert all(int(microseconds) >= 0 for microseconds in folded.values())
+
+
+def test_counters():
+    profiler = Profiler()
+    profiler.count('patients', 3)
+    profiler.count('patients')
+    profiler.count_codes('therapy', [0, 2, 2, -1], ['Insulin', 'Diet', 'Surgery'])
+    profiler.count_values('health', ['Good', 'Poor', 'Good'])
+    assert profiler.counters == {'patients': 4, 'therapy:Insulin': 1, 'therapy:Surgery': 2,
+                                 'health:Good': 2, 'health:Poor': 1}
+
+    with profiler.span('stage'):
+        pass
+    summary = profiler.summary()
+    assert summary['patients_per_second'] > 0
+    assert 'patients per second' in profiler.format_summary()
+
+
+def test_a_disabled_profiler_does_no_work():
+    profiler = Profiler(enabled=False)
+    with profiler.span('stage'):
+        profiler.count('patients')
+        profiler.count_codes('therapy', [0], ['Insulin'])
+        profiler.count_values('health', ['Good'])
+    assert profiler.events == [] and profiler.counters == {}
+    assert profiler.wrap(len) is len
+    assert profiler.summary() == {'stages': {}, 'counters': {}}
+
+
+def test_wrapped_functions_are_timed():
+    profiler = Profiler()
+    wrapped = profiler.wrap(sorted)
+    assert wrapped([2, 1]) == [1, 2] and wrapped.__wrapped__ is sorted
+    profiler.wrap(sorted, name='sorting')([3])
+    assert [event[0] for event in profiler.events] == ['sorted', 'sorting']
+
+
+def test_chrome_trace_is_written(tmp_path):
+    profiler = Profiler()
+    with profiler.span('stage'):
+        profiler.count('patients', 5)
+    profiler.write(tmp_path / 'trace.json')
+    events = json.loads((tmp_path / 'trace.json').read_text())['traceEvents']
+    assert [(event['name'], event['ph']) for event in events] == [('stage', 'X'), ('patients', 'C')]
+    assert events[1]['args'] == {'value': 5}
+
+    profiler.write(tmp_path / 'trace.folded')
+    assert (tmp_path / 'trace.folded').read_text().startswith('stage ')
+
+
+def test_shared_profiler_follows_the_environment(shared_profiler, monkeypatch, tmp_path):
+    monkeypatch.delenv(PROFILE_ENV, raising=False)
+    assert not profiling.get_profiler().enabled and profiling.write_profile() is None
+
+    path = tmp_path / 'pipeline.folded'
+    monkeypatch.setenv(PROFILE_ENV, str(path))
+    profiling.set_profiler(None)
+    profiler = profiling.get_profiler()
+    assert profiler.enabled and profiling.get_profiler() is profiler
+
+    api.simulate('2.4', 100, seed=1)
+    assert profiler.counters['patients'] == 100
+    assert sum(amount for name, amount in profiler.counters.items() if name.startswith('therapy:')) == 100
+    assert {'generate_patient_data', 'ai_workflow', 'screening', 'outcome'} <= set(profiler.summary()['stages'])
+    assert profiling.write_profile() == str(path) and path.read_text()
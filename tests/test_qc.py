@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+from simplebiofactory.kinetics import DEFAULT_DT, Bioreactors
+from simplebiofactory.qc import (DELIVERY_STATUS, HOLD, NO_LOT, REJECTED, RELEASED, SENSORS, TITER, QualityMonitor,
+                                 SensorStats, SensorStreams, delivery_status, order_decisions, run_monitoring)
+
+# Quality control: the running statistics must match whole-series statistics, and lots are released, held
+# or rejected from their readings
+
+IN_SPEC = np.array([2.0, 7.1, 37.0, 50.0])  # Titer, pH, temperature and dissolved oxygen
+
+
+def readings(ticks, reactors=1):
+    return np.tile(IN_SPEC, (ticks, reactors, 1)) + np.random.default_rng(3).normal(0, 0.01, (ticks, reactors, 4))
+
+
+def monitored(samples, **settings):
+    monitor = QualityMonitor(samples.shape[1], **settings)
+    for tick in samples:
+        monitor.update(tick)
+    return monitor
+
+
+def test_running_statistics_match_the_series_with_missing_readings():
+    samples = np.random.default_rng(1).normal(5.0, 2.0, (200, 3, len(SENSORS)))
+    samples[np.random.default_rng(2).random(samples.shape) < 0.1] = np.nan
+    stats = SensorStats(3, len(SENSORS))
+    for tick in samples:
+        stats.update(tick)
+    np.testing.assert_array_equal(stats.count, (~np.isnan(samples)).sum(axis=0))
+    np.testing.assert_allclose(stats.mean, np.nanmean(samples, axis=0))
+    np.testing.assert_allclose(stats.variance(), np.nanvar(samples, axis=0, ddof=1))
+    np.testing.assert_array_equal(stats.minimum, np.nanmin(samples, axis=0))
+    np.testing.assert_array_equal(stats.maximum, np.nanmax(samples, axis=0))
+
+
+def test_lot_decisions():
+    samples = readings(100, 4)
+    samples[10:13, 1, 1] = 8.0  # A short pH excursion
+    samples[40:80, 2, 2] = 40.0  # A 40 sample temperature excursion
+    samples[:, 3, TITER] = 0.5  # Below the release titer
+    monitor = monitored(samples)
+    assert monitor.decisions().tolist() == [RELEASED, HOLD, REJECTED, REJECTED]
+    assert monitor.out_of_spec[1, 1] == 3 and monitor.longest_excursion[2, 2] == 40
+
+    assert monitor.release([1, 2]).tolist() == [HOLD, REJECTED]
+    assert monitor.lots.tolist() == [0, 1, 1, 0]
+    assert monitor.decisions([1, 2]).tolist() == [REJECTED, REJECTED]  # New lots without titer readings
+    with pytest.raises(ValueError):
+        QualityMonitor(1, specs={'viscosity': (0, 1)})
+
+
+def test_drift_is_flagged_after_the_warmup():
+    samples = readings(200)
+    samples[150:, 0, 3] = 70.0  # A step in dissolved oxygen, still within spec
+    monitor = monitored(samples)
+    assert monitor.drift[0, 3] > 0 and monitor.out_of_spec.sum() == 0
+    assert monitor.decisions().tolist() == [HOLD]
+    assert monitored(samples, warmup=201).decisions().tolist() == [RELEASED]
+
+
+def test_delivery_status_maps_every_decision():
+    decisions = order_decisions([1, -1, 0, 2], [RELEASED, REJECTED, HOLD])
+    assert decisions.tolist() == [REJECTED, NO_LOT, RELEASED, HOLD]
+    assert delivery_status(decisions).tolist() == [DELIVERY_STATUS[code] for code in decisions]
+    assert delivery_status(NO_LOT) == 'No therapy to deliver'
+    assert delivery_status(RELEASED) == 'Personalized drug delivery to patient'
+    with pytest.raises(ValueError):
+        delivery_status([3])
+
+
+def test_titer_readings_follow_the_kinetics_trajectory():
+    reactor = Bioreactors([0], ['Bioreactor producing therapy'])
+    titers = reactor.run(reactor.parameters['batch_hours'][0] - DEFAULT_DT, record_every=DEFAULT_DT)
+    streams = SensorStreams(1, batch_seconds=len(titers) * 2, missing_rate=0, spike_rate=0, fault_rate=0,
+                            rng=np.random.default_rng(0), trajectory=titers)
+    titer = [streams.tick()[0, TITER] for _ in range(len(titers) * 2)]
+    # Two readings per sample, within the titer sensor's noise (an AR(1) standard deviation of about 0.02)
+    np.testing.assert_allclose(titer, np.repeat(titers[:, 0], 2), atol=0.15)
+    assert titer[-1] > 1.0
+    with pytest.raises(ValueError):
+        SensorStreams(2, trajectory=titers)
+
+
+def test_seeded_monitoring_is_reproducible():
+    first, second = run_monitoring(500, 120, seed=4), run_monitoring(500, 120, seed=4)
+    assert first['decisions'] == second['decisions'] and first['alerts'] == second['alerts']
+    assert sum(first['decisions'].values()) == 500
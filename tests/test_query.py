@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from simplebiofactory import api
+from simplebiofactory.query import Bitmap, PatientIndex, history_codes
+
+# Bitmap indexes must select exactly the records a scan of the columns selects
+
+SIZE = 1001  # Not a multiple of 8, so the last byte of every bitmap has padding
+
+
+@pytest.fixture(scope='module')
+def database():
+    return api.simulate('2.4', SIZE, seed=3)
+
+
+@pytest.fixture(scope='module')
+def index(database):
+    return PatientIndex(database)
+
+
+def has(database, condition):
+    return np.array([condition in history for history in database['Medical_History']])
+
+
+def test_bitmap_set_operations():
+    rng = np.random.default_rng(0)
+    a, b = rng.random(13) < 0.5, rng.random(13) < 0.5
+    left, right = Bitmap.from_mask(a), Bitmap.from_mask(b)
+    np.testing.assert_array_equal((left & right).mask(), a & b)
+    np.testing.assert_array_equal((left | right).mask(), a | b)
+    np.testing.assert_array_equal((left - right).mask(), a & ~b)
+    np.testing.assert_array_equal((~left).mask(), ~a)
+    assert (~left).count() == len(~left) == (~a).sum()  # Padding bits are never counted
+    np.testing.assert_array_equal(left.rows(), np.flatnonzero(a))
+
+
+def test_values_match_a_scan_of_the_columns(index, database):
+    for column in ('Selected_Therapy', 'Current_Health', 'Outcome'):
+        for value in database[column].dropna().unique():
+            np.testing.assert_array_equal(index.eq(column, value).mask(), (database[column] == value).to_numpy())
+    assert index.all().count() == SIZE and index.none().count() == 0
+    assert index.eq('Current_Health', 'No such health').count() == 0
+    with pytest.raises(KeyError):  # Only the INDEX_COLUMNS are indexed
+        index.eq('Engineered_Microorganism', None)
+
+
+def test_conditions_match_a_scan_of_the_histories(index, database):
+    assert index.conditions == sorted(set(np.concatenate(list(database['Medical_History'])).tolist()))
+    for condition in index.conditions:
+        np.testing.assert_array_equal(index.has(condition).mask(), has(database, condition))
+    first, second = index.conditions[:2]
+    np.testing.assert_array_equal(index.has_all([first, second]).mask(),
+                                  has(database, first) & has(database, second))
+    np.testing.assert_array_equal(index.has_any([first, second]).mask(),
+                                  has(database, first) | has(database, second))
+    assert index.counts('Medical_History')[first] == has(database, first).sum()
+    with pytest.raises(KeyError):
+        index.has('No such condition')
+
+
+def test_query_combines_filters(index, database):
+    first, second = index.conditions[:2]
+    health = database['Current_Health'].isin(['Poor', 'Fair']).to_numpy()
+    rows = index.query(conditions=[first], Current_Health=['Poor', 'Fair'])
+    np.testing.assert_array_equal(rows.mask(), has(database, first) & health)
+    rows = index.query(any_conditions=[first, second], Current_Health='Poor')
+    expected = (has(database, first) | has(database, second)) & (database['Current_Health'] == 'Poor').to_numpy()
+    pd.testing.assert_frame_equal(index.select(rows), database[expected])
+    assert list(index.select(rows, ['Patient_ID']).columns) == ['Patient_ID']
+    assert index.counts('Current_Health', within=rows) == {'Poor': expected.sum(), 'Fair': 0, 'Good': 0}
+
+
+def test_history_codes_pad_with_minus_one():
+    history, conditions = history_codes([np.array(['Asthma', 'Diabetes']), np.array([], dtype=object),
+                                         np.array(['Diabetes'])])
+    assert conditions == ['Asthma', 'Diabetes']
+    assert history.tolist() == [[0, 1], [-1, -1], [1, -1]]
+    index = PatientIndex(pd.DataFrame({'Medical_History': [[]] * 2}), history=np.full((2, 1), -1), conditions=[])
+    assert index.condition_bitmaps == {} and index.all().count() == 2
@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from simplebiofactory.cohort import HEALTH_STATES, generate_cohort
+from simplebiofactory.records import (CATEGORY_COLUMNS, RecordBuilder, Vocabulary, gene_values, genetics_dict,
+                                      genetics_matrix)
+
+# RecordBuilder: rows appended one record dict at a time and blocks of codes written with extend() must give
+# the same patient database; only the declared category columns exist
+
+GENES = ['BRCA1', 'APOE', 'TP53']
+CONDITIONS = ['Allergy', 'Hypertension', 'Diabetes']
+THERAPIES = ['Therapy A', 'Therapy B']
+
+
+def cohort_and_therapy(size=50, seed=1):
+    cohort = generate_cohort(size, GENES, CONDITIONS, history_size=2, rng=np.random.default_rng(seed))
+    therapy = np.random.default_rng(seed).integers(-1, len(THERAPIES), size).astype(np.int16)  # -1 is missing
+    return cohort, therapy
+
+
+def appended(cohort, therapy, builder):
+    for index in range(len(cohort)):
+        patient = cohort.patient(index)
+        builder.append({'Patient_ID': index + 1, 'Genetics': patient['genetics'],
+                        'Medical_History': patient['medical_history'], 'Current_Health': patient['current_health'],
+                        'Selected_Therapy': THERAPIES[therapy[index]] if therapy[index] >= 0 else None})
+    return builder.to_frame()
+
+
+def extended(cohort, therapy, builder):
+    builder.extend(np.arange(1, len(cohort) + 1), cohort.genetics, (cohort.medical_history, cohort.conditions),
+                   {'Current_Health': (cohort.current_health, HEALTH_STATES), 'Selected_Therapy': (therapy, THERAPIES)})
+    return builder.to_frame()
+
+
+def test_append_and_extend_build_the_same_database():
+    cohort, therapy = cohort_and_therapy()
+    by_row = appended(cohort, therapy, RecordBuilder(len(cohort), GENES))
+    by_block = extended(cohort, therapy, RecordBuilder(len(cohort), GENES))
+    assert list(by_row.columns) == ['Patient_ID'] + GENES + ['Medical_History'] + CATEGORY_COLUMNS
+    for column in by_row.columns.drop('Medical_History'):
+        assert by_row[column].astype(object).tolist() == by_block[column].astype(object).tolist(), column
+    assert by_block['Outcome'].isna().all()  # Declared but not given
+    np.testing.assert_array_equal(genetics_matrix(by_block), cohort.genetics)
+    assert genetics_dict(by_block, 0) == pytest.approx({gene: float(cohort.genetics[0, j])
+                                                        for j, gene in enumerate(GENES)})
+    expected = [list(cohort.patient(index)['medical_history']) for index in range(len(cohort))]
+    for frame in (by_row, by_block):
+        assert [list(history) for history in frame['Medical_History']] == expected
+
+
+def test_only_the_declared_columns_are_built():
+    cohort, therapy = cohort_and_therapy()
+    columns = ['Current_Health', 'Selected_Therapy']
+    frame = extended(cohort, therapy, RecordBuilder(len(cohort), GENES, columns=columns))
+    assert list(frame.columns) == ['Patient_ID'] + GENES + ['Medical_History'] + columns
+
+    builder = RecordBuilder(len(cohort), GENES, columns=['Selected_Therapy'])
+    with pytest.raises(ValueError):
+        extended(cohort, therapy, builder)  # Current_Health is not declared
+    with pytest.raises(ValueError):
+        RecordBuilder(1, GENES, columns=['Dosage'])
+
+
+def test_blocks_over_other_vocabularies_are_remapped():
+    cohort, therapy = cohort_and_therapy(20)
+    shared = Vocabulary(THERAPIES)
+    builder = RecordBuilder(40, GENES, columns=['Selected_Therapy'])
+    history = (cohort.medical_history, cohort.conditions)
+    builder.extend(np.arange(1, 21), cohort.genetics, history, {'Selected_Therapy': (therapy, shared)})
+    # Same names under other codes, with an extra name first
+    reordered = ['Therapy C'] + THERAPIES[::-1]
+    codes = np.where(therapy >= 0, len(THERAPIES) - therapy, -1).astype(np.int16)
+    builder.extend(np.arange(21, 41), cohort.genetics, history, {'Selected_Therapy': (codes, reordered)})
+    selected = builder.to_frame()['Selected_Therapy'].astype(object)
+    assert selected[:20].tolist() == selected[20:].tolist()
+    assert builder.categories['Selected_Therapy'].values == THERAPIES + ['Therapy C']
+
+
+def test_uint8_genetics_are_quantized_to_a_quarter_of_the_size():
+    cohort, therapy = cohort_and_therapy()
+    frame = extended(cohort, therapy, RecordBuilder(len(cohort), GENES, genetics_dtype=np.uint8))
+    assert frame['BRCA1'].dtype == np.uint8
+    np.testing.assert_allclose(gene_values(frame, 'BRCA1'), cohort.gene('BRCA1'), atol=0.5 / 255 + 1e-6)
+    assert RecordBuilder.estimate_nbytes(1000, 100, np.uint8) < RecordBuilder.estimate_nbytes(1000, 100) / 3
+
+
+def test_full_builder_and_history_width_mismatch_raise():
+    cohort, therapy = cohort_and_therapy(4)
+    builder = RecordBuilder(3, GENES)
+    with pytest.raises(IndexError):
+        extended(cohort, therapy, builder)
+    builder.extend([1], cohort.genetics[:1], (cohort.medical_history[:1], cohort.conditions), {})
+    with pytest.raises(ValueError):
+        builder.extend([2], cohort.genetics[:1], (np.zeros((1, 3), dtype=np.uint8), cohort.conditions), {})
+
+
+def test_empty_database_has_the_declared_columns():
+    frame = RecordBuilder(0, GENES, columns=['Outcome']).to_frame()
+    assert len(frame) == 0 and list(frame.columns) == ['Patient_ID'] + GENES + ['Medical_History', 'Outcome']
+    assert isinstance(frame['Outcome'].dtype, pd.CategoricalDtype)
@@ -0,0 +1,100 @@
+import io
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from simplebiofactory.records import CATEGORY_COLUMNS, RecordBuilder
+from simplebiofactory.report import write_report
+
+# The vectorized report modes must write the text of the scripts' per-patient print loops
+
+GENES = ['BRCA1', 'APOE']
+PATIENTS = [
+    {'Patient_ID': 1, 'Genetics': {'BRCA1': 0.125, 'APOE': 0.75}, 'Medical_History': ['Diabetes', 'Allergy'],
+     'Current_Health': 'Good', 'Selected_Therapy': 'Insulin therapy (Moderate genetic risk)',
+     'Engineered_Microorganism': 'Engineered microorganism for insulin production',
+     'Bioreactor_Process': 'Bioreactor producing insulin',
+     'Dosage_Adjustment': 'Higher insulin dosage (High genetic risk)',
+     'Outcome': 'Favorable outcome (High genetic risk)'},
+    {'Patient_ID': 2, 'Genetics': {'BRCA1': 0.5, 'APOE': 0.0625}, 'Medical_History': ['Hypertension', 'Hypertension'],
+     'Current_Health': 'Poor', 'Selected_Therapy': 'Lifestyle modification for hypertension',
+     'Engineered_Microorganism': None, 'Bioreactor_Process': 'Bioreactor idle', 'Dosage_Adjustment': 'Standard dosage',
+     'Outcome': None},
+]
+
+DETAIL = (
+    'Patient ID: 1\nGenetics:\n  BRCA1: 0.12\n  APOE: 0.75\nMedical History: Diabetes, Allergy\n'
+    'Current Health: Good\nSelected Therapy: Insulin therapy (Moderate genetic risk)\n'
+    'Engineered Microorganism: Engineered microorganism for insulin production\n'
+    'Bioreactor Process: Bioreactor producing insulin\nDosage Adjustment: Higher insulin dosage (High genetic risk)\n'
+    'Outcome: Favorable outcome (High genetic risk)\n'
+    '\n--------------------------------------------------\n\n'
+    'Patient ID: 2\nGenetics:\n  BRCA1: 0.50\n  APOE: 0.06\nMedical History: Hypertension, Hypertension\n'
+    'Current Health: Poor\nSelected Therapy: Lifestyle modification for hypertension\n'
+    'Dosage Adjustment: Standard dosage\nOutcome: None\n'
+    '\n--------------------------------------------------\n\n'
+)
+
+BRIEF = (
+    'Patient 1 - Selected Therapy: Insulin therapy (Moderate genetic risk)\n'
+    'Patient 1 - Engineered Microorganism: Engineered microorganism for insulin production\n'
+    'Patient 1 - Bioreactor Process: Bioreactor producing insulin\n'
+    'Patient 1 - Outcome: Favorable outcome (High genetic risk)\n\n'
+    'Patient 2 - Selected Therapy: Lifestyle modification for hypertension\n'
+    'Patient 2 - Engineered Microorganism: None\n'
+    'Patient 2 - Bioreactor Process: Bioreactor idle\n'
+    'Patient 2 - Outcome: None\n\n'
+)
+
+
+def database(columns=CATEGORY_COLUMNS):
+    builder = RecordBuilder(len(PATIENTS), GENES, genetics_dtype=np.float64, columns=columns)
+    for record in PATIENTS:
+        builder.append(record)
+    return builder.to_frame()
+
+
+def report(patient_database, mode, **options):
+    out = io.StringIO()
+    write_report(patient_database, mode, out, **options)
+    return out.getvalue()
+
+
+@pytest.mark.parametrize('block_size', [1, 10])
+def test_detail_and_brief_reports(block_size):
+    assert report(database(), 'detail', block_size=block_size) == DETAIL
+    assert report(database(), 'brief', block_size=block_size) == BRIEF
+
+
+def test_columns_a_version_does_not_produce_are_missing():
+    # 2.2 has no Dosage_Adjustment
+    columns = [column for column in CATEGORY_COLUMNS if column != 'Dosage_Adjustment']
+    detail = DETAIL
+    for dosage in ('Higher insulin dosage (High genetic risk)', 'Standard dosage'):
+        detail = detail.replace(f'Dosage Adjustment: {dosage}\n', '')
+    assert report(database(columns), 'detail') == detail
+    assert report(database(columns), 'brief') == BRIEF
+
+
+def test_summary_counts_every_category():
+    text = report(database(), 'summary')
+    assert text.startswith('Patients: 2\n\nCurrent_Health:\n')
+    assert '\nOutcome:\n  Favorable outcome (High genetic risk): 1\n  None: 1\n' in text
+    assert '  Good: 1\n  Poor: 1\n' in text and 'Fair' not in text  # Unused categories are left out
+
+
+def test_machine_readable_reports():
+    rows = pd.read_csv(io.StringIO(report(database(), 'csv', block_size=1)))
+    assert rows['Patient_ID'].tolist() == [1, 2] and rows['Medical_History'].tolist() == \
+        ['Diabetes, Allergy', 'Hypertension, Hypertension']
+    assert rows['BRCA1'].tolist() == [0.125, 0.5]
+
+    records = [json.loads(line) for line in report(database(), 'jsonl').splitlines()]
+    assert [record['Selected_Therapy'] for record in records] == [record['Selected_Therapy'] for record in PATIENTS]
+    assert records[1]['Outcome'] is None
+
+    assert report(database(), 'quiet') == ''
+    with pytest.raises(ValueError):
+        report(database(), 'html')
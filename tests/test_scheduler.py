@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from simplebiofactory.kinetics import kinetics_table
+from simplebiofactory.manufacturing import IDLE_PROCESS
+from simplebiofactory.scheduler import (DEFAULT_CHANGEOVER_HOURS, DEFAULT_DOSAGE_CHANGEOVER_HOURS, schedule_database,
+                                        schedule_orders)
+
+# Production scheduling: orders are pooled into runs per process and dosage, runs never overlap on a
+# reactor, and a reactor pays a changeover only when it switches group
+
+PROCESSES = [IDLE_PROCESS, 'Bioreactor producing insulin', 'Bioreactor producing antihistamine']
+DOSAGES = ['Standard dosage', 'Reduced dosage']
+INSULIN, ANTIHISTAMINE = 1, 2
+BATCH_HOURS = kinetics_table(PROCESSES)['batch_hours']
+
+
+def check_runs(schedule):
+    runs = schedule.runs
+    np.testing.assert_allclose(runs['End'] - runs['Start'],
+                               runs['Changeover'] + BATCH_HOURS[runs['Process'].cat.codes.to_numpy()])
+    for _, reactor_runs in runs.sort_values('Start').groupby('Reactor'):
+        assert (reactor_runs['Start'].to_numpy()[1:] >= reactor_runs['End'].to_numpy()[:-1]).all()
+
+
+def test_orders_are_pooled_into_runs_of_capacity():
+    processes = np.array([INSULIN] * 120 + [0] * 5 + [-1] * 3)
+    schedule = schedule_orders(processes, np.zeros(len(processes)), PROCESSES, DOSAGES, num_reactors=5, capacity=50)
+    check_runs(schedule)
+    assert len(schedule) == 3 and schedule.runs['Orders'].tolist() == [50, 50, 20]
+    assert schedule.order_runs.tolist() == [0] * 50 + [1] * 50 + [2] * 20 + [-1] * 8  # Idle and missing orders
+    assert schedule.runs['Changeover'].sum() == 0 and schedule.makespan == BATCH_HOURS[INSULIN]
+
+    start, end = schedule.order_times()
+    assert np.isnan(start[-8:]).all() and (end[:120] == BATCH_HOURS[INSULIN]).all()
+
+
+def test_switching_group_pays_a_changeover():
+    processes = [INSULIN, INSULIN, ANTIHISTAMINE]
+    dosages = [0, 1, 0]
+    schedule = schedule_orders(processes, dosages, PROCESSES, DOSAGES, num_reactors=1, capacity=1)
+    check_runs(schedule)
+    assert schedule.runs['Changeover'].tolist() == [0.0, DEFAULT_DOSAGE_CHANGEOVER_HOURS, DEFAULT_CHANGEOVER_HOURS]
+    assert schedule.makespan == (2 * BATCH_HOURS[INSULIN] + BATCH_HOURS[ANTIHISTAMINE]
+                                 + DEFAULT_DOSAGE_CHANGEOVER_HOURS + DEFAULT_CHANGEOVER_HOURS)
+    assert 0 < schedule.utilization < 1 and schedule.throughput == pytest.approx(3 / schedule.makespan)
+
+
+def test_every_order_gets_a_run_of_its_group():
+    rng = np.random.default_rng(0)
+    processes = rng.choice([INSULIN, ANTIHISTAMINE], 2000)
+    dosages = rng.integers(-1, len(DOSAGES), 2000)
+    schedule = schedule_orders(processes, dosages, PROCESSES, DOSAGES, num_reactors=4, capacity=50)
+    check_runs(schedule)
+    assert schedule.runs['Orders'].sum() == 2000
+    runs = schedule.runs.iloc[schedule.order_runs]
+    assert (runs['Process'].cat.codes.to_numpy() == processes).all()
+    assert (runs['Dosage'].cat.codes.to_numpy() == dosages).all()
+    # Changeovers exactly where a reactor switches group
+    for _, reactor_runs in schedule.runs.sort_values('Start').groupby('Reactor'):
+        groups = list(zip(reactor_runs['Process'].cat.codes, reactor_runs['Dosage'].cat.codes))
+        switched = [False] + [previous != group for previous, group in zip(groups, groups[1:])]
+        assert (reactor_runs['Changeover'] > 0).tolist() == switched
+
+
+def test_database_without_orders_has_an_empty_schedule():
+    database = pd.DataFrame({'Bioreactor_Process': [IDLE_PROCESS, IDLE_PROCESS]})  # No Dosage_Adjustment (2.2)
+    schedule = schedule_database(database, 3)
+    assert len(schedule) == 0 and schedule.order_runs.tolist() == [-1, -1]
+    assert (schedule.makespan, schedule.utilization, schedule.throughput) == (0.0, 0.0, 0.0)
+
+    database = pd.DataFrame({'Bioreactor_Process': [PROCESSES[INSULIN]] * 3})
+    assert schedule_database(database, 3, capacity=2).runs['Orders'].tolist() == [2, 1]
+    with pytest.raises(ValueError):
+        schedule_database(database, 0)
+    with pytest.raises(ValueError):
+        schedule_database(database, 1, capacity=0)
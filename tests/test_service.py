@@ -0,0 +1,90 @@
+import asyncio
+import json
+
+import pytest
+
+from simplebiofactory.service import Overloaded, TherapyService, sample_patients, serve
+
+# One malformed request fails on its own: the rest of its micro-batch is answered, and a TCP client
+# gets an error reply for it on the same connection
+
+
+def test_a_bad_request_fails_alone_in_its_batch():
+    patients = sample_patients('2.4', 5, seed=0)
+    bad = dict(patients[2], medical_history=['Migraine'])
+
+    async def run():
+        async with TherapyService('2.4', max_wait=0.05, seed=0) as service:
+            requests = [service.select(patient) for patient in patients[:2] + [bad] + patients[2:]]
+            results = await asyncio.gather(*requests, return_exceptions=True)
+            return results, service.batches
+
+    results, batches = asyncio.run(run())
+    assert batches == 1
+    assert isinstance(results[2], ValueError)
+    assert all(isinstance(result, dict) and result['therapy'] for result in results[:2] + results[3:])
+
+
+# 2.1's rules draw nothing at random, so batching must not change any result
+def test_batch_results_match_processing_the_patients_alone():
+    patients = sample_patients('2.1', 50, seed=1)
+    service = TherapyService('2.1', seed=0)
+    assert service.process(patients) == [service.process([patient])[0] for patient in patients]
+
+
+def test_try_select_raises_overloaded_when_the_queue_is_full():
+    patient = sample_patients('2.4', 1, seed=0)[0]
+
+    async def run():
+        service = TherapyService('2.4', max_queue=1)  # Not started, so the queue is never drained
+        waiting = asyncio.create_task(service.try_select(patient))
+        await asyncio.sleep(0)
+        try:
+            with pytest.raises(Overloaded):
+                await service.try_select(patient)
+        finally:
+            waiting.cancel()
+
+    asyncio.run(run())
+
+
+def test_tcp_replies_to_every_request():
+    patient = sample_patients('2.4', 1, seed=0)[0]
+    lines = [
+        json.dumps(dict(patient, id=1)),
+        '{not json',
+        json.dumps([1, 2]),
+        json.dumps({'id': 4, 'genetics': {}}),  # No medical_history
+        json.dumps(dict(patient, id=5, medical_history=['Migraine'])),
+        json.dumps(dict(patient, id=6)),
+    ]
+
+    async def run():
+        ready = asyncio.get_running_loop().create_future()
+        server = asyncio.create_task(serve('2.4', port=0, ready=ready, seed=0))
+        port = await ready
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        try:
+            writer.write(''.join(line + '\n' for line in lines).encode())
+            await writer.drain()
+            return [json.loads(await reader.readline()) for _ in lines]
+        finally:
+            writer.close()
+            await writer.wait_closed()
+            server.cancel()
+            try:
+                await server
+            except asyncio.CancelledError:
+                pass
+
+    replies = asyncio.run(run())
+    by_id = {}
+    errors = []
+    for reply in replies:
+        if 'error' in reply:
+            errors.append(reply)
+        by_id.setdefault(reply['id'], []).append(reply)
+    assert len(errors) == 4 and all(reply['error'] == 'bad_request' for reply in errors)
+    assert len(by_id[None]) == 2  # The lines that are not JSON objects have no id to echo
+    assert 'error' in by_id[4][0] and 'error' in by_id[5][0]
+    assert by_id[1][0]['therapy'] and by_id[6][0]['therapy']
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from simplebiofactory import api
+from simplebiofactory.records import genetics_matrix
+from simplebiofactory.storage import load_database, open_database, save_database
+
+pa = pytest.importorskip('pyarrow')  # Persistence is optional
+
+# Saved patient databases load back unchanged, in both formats and column by column
+
+SIZE = 300
+
+
+@pytest.fixture(scope='module')
+def database():
+    return api.simulate('2.4', SIZE, seed=2)
+
+
+def assert_same(loaded, database):
+    for column in database.columns:
+        if column == 'Medical_History':
+            assert [list(history) for history in loaded[column]] == [list(history) for history in database[column]]
+        else:
+            assert loaded[column].astype(object).tolist() == database[column].astype(object).tolist(), column
+
+
+@pytest.mark.parametrize('name', ['patients.arrow', 'patients.parquet'])
+def test_saved_database_loads_back(database, tmp_path, name):
+    save_database(database, tmp_path / name)
+    loaded = load_database(tmp_path / name)
+    assert list(loaded.columns) == list(database.columns)
+    assert_same(loaded, database)
+    assert loaded.attrs['genes'] == database.attrs['genes']
+    assert isinstance(loaded['Selected_Therapy'].dtype, pd.CategoricalDtype)
+    np.testing.assert_array_equal(genetics_matrix(loaded), genetics_matrix(database))
+
+
+def test_columns_are_read_alone(database, tmp_path):
+    path = tmp_path / 'patients.arrow'
+    save_database(database, path)
+    loaded = load_database(path, columns=['Patient_ID', 'TP53', 'Outcome'])
+    assert list(loaded.columns) == ['Patient_ID', 'TP53', 'Outcome'] and loaded.attrs['genes'] == ['TP53']
+    assert_same(loaded, database[['Patient_ID', 'TP53', 'Outcome']])
+
+    table = open_database(path)
+    assert table.num_rows == SIZE
+    assert table.schema.field('Medical_History').type == pa.list_(pa.dictionary(pa.int16(), pa.string()))
+
+
+def test_simulate_to_file_writes_the_database(database, tmp_path):
+    path = tmp_path / 'patients.parquet'
+    assert api.simulate_to_file('2.4', SIZE, path, seed=2) == SIZE
+    assert_same(load_database(path), database)